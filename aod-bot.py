@@ -3,32 +3,33 @@ import re
 import math
 import datetime
 import uuid
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import queue
 import hashlib
 import time
 import threading
-import google.generativeai as genai
 import json
-from PIL import Image
+import pickle
+import sqlite3
 import io
 from werkzeug.utils import secure_filename
 from zoneinfo import ZoneInfo
 from flask import Flask, request
-from google.cloud import vision
 from google.oauth2 import service_account
 import gspread.exceptions
 from telegram import (
     Bot, Update, KeyboardButton, ReplyKeyboardMarkup,
     ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 )
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError
 from telegram.ext import (
     Dispatcher, CommandHandler, MessageHandler,
-    CallbackQueryHandler, Filters, ConversationHandler
+    CallbackQueryHandler, Filters, ConversationHandler, BasePersistence
 )
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
 import requests
 from io import BytesIO
 
@@ -139,105 +140,1615 @@ EMPLOYEE_CHAT_IDS = {
     "mary": 8203671511
 }
 
-# Global variables for reminder tracking
-reminder_status = {}  # Format: {emp_id: {"last_reminder": datetime, "reminders_sent": count}}
-reminder_lock = threading.Lock()
-
-# Global variables for checklist reminder tracking
-checklist_reminder_status = {}  # Format: {slot: {"last_reminder": datetime}}
-checklist_reminder_lock = threading.Lock()
-
 # Global variables for power status reminder tracking
 power_status_reminders = {}  # Format: {outlet: {"user_chat_id": id, "emp_name": name, "off_time": datetime, "last_reminder": datetime}}
 power_status_lock = threading.Lock()
 
+# === Conversation Persistence ===
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", os.path.join(SCRIPT_DIR, "conversations.db"))
+CONVERSATION_STATE_MAX_AGE_HOURS = 12  # Older unfinished conversations are treated as ended
+
+class SQLiteConversationDict(dict):
+    """ConversationHandler.conversations backed by SQLitePersistence
+
+    Every lookup reads the stored state rather than a copy loaded at startup, so while
+    the old and new process overlap during a deploy, a conversation continues in
+    whichever one receives the next update. Writes reach the database through
+    update_conversation(), which PTB calls after each change.
+    """
+
+    def __init__(self, persistence, name):
+        super().__init__()
+        self._persistence = persistence
+        self._name = name
+
+    def get(self, key, default=None):
+        state = self._persistence.conversation_state(self._name, key)
+        return default if state is None else state
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        state = self.get(key)
+        if state is None:
+            raise KeyError(key)
+        return state
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __delitem__(self, key):
+        pass
+
+class SQLitePersistence(BasePersistence):
+    """Conversation state and user_data in SQLite, so a restart resumes half-finished flows
+
+    user_data is stored one row per key, and update_user_data() writes only the keys whose
+    pickled value changed. Answering a checklist question rewrites "answers" and
+    "current_q", not the whole dict. Before each handler runs, refresh_user_data() reloads
+    the user's rows if another process changed them. chat_data and bot_data are unused by
+    the bot and not stored.
+
+    This does not make the bot safe to run with several gunicorn workers: it needs
+    exactly one worker (--workers 1; scale with UPDATE_LANES threads instead). The write
+    spool, upload queue and reminder scheduler don't claim rows, so every worker would
+    apply the same Sheets writes, uploads and reminders, and late sign-ins and power
+    reminders are tracked in memory per process.
+    """
+
+    def __init__(self, path):
+        super().__init__(store_user_data=True, store_chat_data=False, store_bot_data=False)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " name TEXT NOT NULL,"
+            " conversation_key TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (name, conversation_key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data ("
+            " user_id INTEGER NOT NULL,"
+            " data_key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " PRIMARY KEY (user_id, data_key))"
+        )
+        self._conn.commit()
+        self._written = {}  # Format: {user_id: {data_key: pickled value}} as this process last read or wrote it
+
+    def get_user_data(self):
+        user_data = collections.defaultdict(dict)
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, data_key, value FROM user_data").fetchall()
+        for user_id, data_key, value in rows:
+            self._written.setdefault(user_id, {})[data_key] = value
+            user_data[user_id][data_key] = pickle.loads(value)
+        print(f"Loaded saved user data for {len(user_data)} user(s)")
+        return user_data
+
+    def get_chat_data(self):
+        return collections.defaultdict(dict)
+
+    def get_bot_data(self):
+        return {}
+
+    def get_conversations(self, name):
+        return SQLiteConversationDict(self, name)
+
+    def conversation_state(self, name, key):
+        """Stored state for a conversation key, or None if it ended or went stale"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM conversations WHERE name = ? AND conversation_key = ? AND updated_at > ?",
+                (name, json.dumps(list(key)), time.time() - CONVERSATION_STATE_MAX_AGE_HOURS * 3600)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_conversation(self, name, key, new_state):
+        with self._lock:
+            if new_state is None:
+                self._conn.execute(
+                    "DELETE FROM conversations WHERE name = ? AND conversation_key = ?",
+                    (name, json.dumps(list(key)))
+                )
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversations (name, conversation_key, state, updated_at) VALUES (?, ?, ?, ?)",
+                    (name, json.dumps(list(key)), json.dumps(new_state), time.time())
+                )
+            self._conn.commit()
+
+    def update_user_data(self, user_id, data):
+        values = {data_key: pickle.dumps(value) for data_key, value in data.items()}
+        with self._lock:
+            written = self._written.get(user_id, {})
+            changed = [(user_id, data_key, value) for data_key, value in values.items() if written.get(data_key) != value]
+            removed = [(user_id, data_key) for data_key in written if data_key not in values]
+            if not changed and not removed:
+                return
+            self._conn.executemany("INSERT OR REPLACE INTO user_data (user_id, data_key, value) VALUES (?, ?, ?)", changed)
+            self._conn.executemany("DELETE FROM user_data WHERE user_id = ? AND data_key = ?", removed)
+            self._conn.commit()
+            self._written[user_id] = values
+
+    def refresh_user_data(self, user_id, user_data):
+        with self._lock:
+            stored = dict(self._conn.execute(
+                "SELECT data_key, value FROM user_data WHERE user_id = ?", (user_id,)
+            ).fetchall())
+            if stored == self._written.get(user_id, {}):
+                return
+            self._written[user_id] = stored
+        # Another process moved this user's flow on since we last saw it
+        user_data.clear()
+        user_data.update({data_key: self.insert_bot(pickle.loads(value)) for data_key, value in stored.items()})
+
+    def update_chat_data(self, chat_id, data):
+        pass
+
+    def update_bot_data(self, data):
+        pass
+
+conversation_persistence = SQLitePersistence(CONVERSATION_DB_PATH)
+
 # === Flask + Telegram Setup ===
+WEBHOOK_QUEUE_SIZE = 200  # Updates accepted but not yet dispatched; beyond this the webhook answers 503
+UPDATE_LANES = int(os.getenv("UPDATE_LANES", "8"))  # Chats handled in parallel; handlers mostly wait on Sheets, Drive and OCR
 app = Flask(__name__)
 bot = Bot(token=BOT_TOKEN)
-dispatcher = Dispatcher(bot, None, workers=4)
+dispatcher = Dispatcher(bot, None, workers=4, persistence=conversation_persistence)
 
 # === Global Google Sheets Client ===
-try:
-    creds = ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE)
-    client = gspread.authorize(creds)
-    print("Google Sheets client initialized successfully")
-except Exception as e:
-    print(f"Failed to initialize Google Sheets client: {e}")
-    raise
-
-# === Google Vision API Setup ===
-try:
-    vision_creds = service_account.Credentials.from_service_account_file(CREDS_FILE)
-    vision_client = vision.ImageAnnotatorClient(credentials=vision_creds)
-    print("Google Vision API client initialized successfully")
-except Exception as e:
-    print(f"Warning: Google Vision API not initialized: {e}")
-    vision_client = None
-
-# === Google Gemini AI Setup ===
-try:
-    if GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel('gemini-2.5-flash')
-        print("Google Gemini AI initialized successfully")
-    else:
-        print("Warning: GEMINI_API_KEY not found. AI parsing will not be available.")
-        gemini_model = None
-except Exception as e:
-    print(f"Warning: Google Gemini AI not initialized: {e}")
-    gemini_model = None    
+SHEETS_TOKEN_REFRESH_MARGIN_SECONDS = 300  # Refresh the access token this long before it expires
 
-# === Google Drive Setup ===
-def setup_drive():
+class SheetsClientProvider:
+    """One authorized gspread client shared by every handler and worker thread
+
+    The client's AuthorizedSession keeps HTTP connections alive between calls. The access
+    token is refreshed ahead of expiry so no Sheets call pays for the token exchange, and
+    the client is rebuilt from the key file only after an auth failure.
+
+    Spreadsheet and Worksheet handles are memoized too, so a read or write goes straight
+    to the values API instead of re-fetching metadata (and, for SHEET_NAME, searching Drive
+    by title) first.
+    """
+
+    def __init__(self, creds_file, scope):
+        self.creds_file = creds_file
+        self.scope = scope
+        self._client = None
+        self._lock = threading.Lock()
+        self._master_key = None  # Key of SHEET_NAME, resolved by title once per process
+        self._spreadsheets = {}  # Format: {spreadsheet_key: Spreadsheet}
+        self._worksheets = {}  # Format: {(spreadsheet_key, tab_name): Worksheet}
+        self._handles_lock = threading.Lock()
+
+    def _build(self):
+        creds = service_account.Credentials.from_service_account_file(self.creds_file, scopes=self.scope)
+        self._client = gspread.authorize(creds)
+        self._refresh_token()
+        # Handles keep a reference to the client that opened them
+        self._drop_handles()
+
+    def _drop_handles(self):
+        with self._handles_lock:
+            self._spreadsheets.clear()
+            self._worksheets.clear()
+
+    def _refresh_token(self):
+        from google.auth.transport.requests import Request
+        self._client.auth.refresh(Request())
+
+    def get(self):
+        """Return the shared client, building it or refreshing its token as needed"""
+        with self._lock:
+            if self._client is None:
+                self._build()
+                return self._client
+            expiry = getattr(self._client.auth, "expiry", None)
+            if expiry is None or expiry - datetime.datetime.utcnow() < datetime.timedelta(seconds=SHEETS_TOKEN_REFRESH_MARGIN_SECONDS):
+                try:
+                    self._refresh_token()
+                except Exception as e:
+                    print(f"Sheets token refresh failed, rebuilding client: {e}")
+                    self._build()
+            return self._client
+
+    def reset(self):
+        """Drop the client so the next get() re-authorizes from the key file"""
+        with self._lock:
+            self._client = None
+        self._drop_handles()
+
+    def spreadsheet(self, spreadsheet_key=None):
+        """Memoized Spreadsheet handle; spreadsheet_key=None means SHEET_NAME"""
+        client = self.get()
+        with self._handles_lock:
+            if spreadsheet_key is None:
+                if self._master_key is None:
+                    handle = client.open(SHEET_NAME)
+                    self._master_key = handle.id
+                    self._spreadsheets[handle.id] = handle
+                spreadsheet_key = self._master_key
+            handle = self._spreadsheets.get(spreadsheet_key)
+            if handle is None:
+                handle = client.open_by_key(spreadsheet_key)
+                self._spreadsheets[spreadsheet_key] = handle
+            return handle
+
+    def worksheet(self, tab_name, spreadsheet_key=None):
+        """Memoized Worksheet handle for a tab; raises WorksheetNotFound if the tab is missing"""
+        spreadsheet = self.spreadsheet(spreadsheet_key)
+        cache_key = (spreadsheet.id, tab_name)
+        with self._handles_lock:
+            handle = self._worksheets.get(cache_key)
+            if handle is None:
+                handle = spreadsheet.worksheet(tab_name)
+                self._worksheets[cache_key] = handle
+            return handle
+
+    def forget_worksheet(self, sheet):
+        """Drop a memoized Worksheet so the next lookup re-reads the tab list"""
+        with self._handles_lock:
+            for cache_key, handle in list(self._worksheets.items()):
+                if handle is sheet:
+                    del self._worksheets[cache_key]
+
+    def note_error(self, error, sheet=None):
+        """Recover from a failed Sheets call; returns True if a retry may now succeed
+
+        Auth failures rebuild the client. A 400/404 on a memoized worksheet usually means
+        the tab was renamed or deleted, so its handle is dropped and looked up again.
+        """
+        from google.auth.exceptions import RefreshError
+        status = None
+        if isinstance(error, gspread.exceptions.APIError):
+            status = getattr(error.response, "status_code", None)
+        if isinstance(error, RefreshError) or status == 401:
+            print(f"Sheets auth error, client will be rebuilt: {error}")
+            self.reset()
+            return True
+        if status in (400, 404):
+            if sheet is not None:
+                print(f"Sheets call on '{sheet.title}' failed with {status}, dropping cached handle")
+                self.forget_worksheet(sheet)
+            else:
+                print(f"Sheets call failed with {status}, dropping cached worksheet handles")
+                with self._handles_lock:
+                    self._worksheets.clear()
+            return True
+        return False
+
+sheets_client_provider = SheetsClientProvider(CREDS_FILE, SCOPE)
+
+def get_sheets_client():
+    """Shared authorized gspread client"""
+    return sheets_client_provider.get()
+
+def get_worksheet(tab_name, spreadsheet_key=None):
+    """Memoized Worksheet for a tab; spreadsheet_key=None means the "AOD Master App" spreadsheet"""
+    return sheets_client_provider.worksheet(tab_name, spreadsheet_key)
+
+# === Sheets Read Cache ===
+# Seconds a tab's records stay fresh before the next read goes back to the Sheets API
+SHEET_CACHE_TTL = {
+    TAB_NAME_EMP_REGISTER: 300,
+    TAB_NAME_OUTLETS: 600,
+    TAB_NAME_SHIFTS: 600,
+    TAB_CHECKLIST: 300,
+    TAB_NAME_ROSTER: 60,
+    TAB_NAME_ACTIVITY: 300,
+    TAB_KITCHEN_QUESTIONS: 300,
+}
+SHEET_CACHE_DEFAULT_TTL = 60
+sheet_cache = {}  # Format: {(spreadsheet, tab): {"records": list, "fetched_at": float}}
+sheet_cache_generation = {}  # Format: {(spreadsheet, tab): int}, bumped on every invalidation
+sheet_cache_lock = threading.Lock()
+
+def get_cached_records(tab_name, spreadsheet_key=None, force=False):
+    """Return get_all_records() for a tab, served from the in-process cache while fresh
+
+    spreadsheet_key=None means the "AOD Master App" spreadsheet. Callers must treat
+    the returned list as read-only since it is shared between handlers.
+    """
+    cache_key = (spreadsheet_key or SHEET_NAME, tab_name)
+    ttl = SHEET_CACHE_TTL.get(tab_name, SHEET_CACHE_DEFAULT_TTL)
+
+    with sheet_cache_lock:
+        entry = sheet_cache.get(cache_key)
+        if not force and entry and time.monotonic() - entry["fetched_at"] < ttl:
+            return entry["records"]
+        generation = sheet_cache_generation.get(cache_key, 0)
+
+    for attempt in range(2):
+        sheet = None
+        try:
+            sheet = get_worksheet(tab_name, spreadsheet_key)
+            records = sheet.get_all_records()
+            break
+        except Exception as e:
+            # Retry once after a stale handle or expired session has been dropped
+            if not sheets_client_provider.note_error(e, sheet) or attempt:
+                raise
+
+    with sheet_cache_lock:
+        # Don't store a snapshot that was taken while the bot was writing to the tab
+        if sheet_cache_generation.get(cache_key, 0) == generation:
+            sheet_cache[cache_key] = {"records": records, "fetched_at": time.monotonic()}
+    return records
+
+def invalidate_sheet_cache(sheet):
+    """Drop cached records for a worksheet the bot has just written to"""
     try:
-        # Configure GoogleAuth with service account settings
-        gauth_settings = {
-            "client_config_backend": "service",
-            "service_config": {
-                "client_json_file_path": CREDS_FILE,
-            }
+        refs = {sheet.spreadsheet.id, sheet.spreadsheet.title}
+        tab_name = sheet.title
+    except Exception as e:
+        print(f"Could not resolve worksheet for cache invalidation: {e}")
+        return
+    with sheet_cache_lock:
+        for ref in refs:
+            cache_key = (ref, tab_name)
+            sheet_cache.pop(cache_key, None)
+            sheet_cache_generation[cache_key] = sheet_cache_generation.get(cache_key, 0) + 1
+
+def sheet_append_row(sheet, values, **kwargs):
+    """append_row that keeps the read cache consistent"""
+    try:
+        result = sheet.append_row(values, **kwargs)
+    except Exception as e:
+        sheets_client_provider.note_error(e, sheet)
+        raise
+    invalidate_sheet_cache(sheet)
+    return result
+
+def sheet_batch_update(sheet, data, **kwargs):
+    """batch_update that keeps the read cache consistent"""
+    try:
+        result = sheet.batch_update(data, **kwargs)
+    except Exception as e:
+        sheets_client_provider.note_error(e, sheet)
+        raise
+    invalidate_sheet_cache(sheet)
+    return result
+
+def sheet_append_rows(sheet, values, **kwargs):
+    """append_rows that keeps the read cache consistent"""
+    try:
+        result = sheet.append_rows(values, **kwargs)
+    except Exception as e:
+        sheets_client_provider.note_error(e, sheet)
+        raise
+    invalidate_sheet_cache(sheet)
+    return result
+
+def sheet_update(sheet, range_name, values, **kwargs):
+    """update that keeps the read cache consistent"""
+    try:
+        result = sheet.update(range_name, values, **kwargs)
+    except Exception as e:
+        sheets_client_provider.note_error(e, sheet)
+        raise
+    invalidate_sheet_cache(sheet)
+    return result
+
+def save_submission_rows(submission_id, responses_tab, response_rows, submissions_tab, summary_row, spreadsheet_key=None, check_existing=False):
+    """Write a checklist's response rows and its summary row as one unit
+
+    Each tab gets a single append_rows call. With check_existing (set when the write
+    spool retries the unit) a tab that already has submission_id in column A is skipped,
+    so rows that reached the sheet before an error are never appended twice.
+    """
+    for tab_name, rows in ((responses_tab, response_rows), (submissions_tab, [summary_row])):
+        if not rows:
+            continue
+        sheet = get_worksheet(tab_name, spreadsheet_key)
+        if check_existing and sheet.findall(str(submission_id), in_column=1):
+            print(f"Submission {submission_id} already in {tab_name}, skipping")
+            continue
+        sheet_append_rows(sheet, rows)
+
+def rows_not_in_sheet(sheet, rows):
+    """Drop the rows an earlier, seemingly failed append already wrote
+
+    When Sheets applies an append but the response is lost, the write spool retries it.
+    Rows are matched cell by cell against the sheet's displayed values (numbers compared
+    as numbers), each existing row cancelling at most one queued row. A value Sheets
+    reformats beyond that, such as a USER_ENTERED date, is not recognised and its row is
+    appended again, as it was before this check.
+    """
+    def normalize(row):
+        cells = []
+        for value in row:
+            cell = str(value).strip()
+            try:
+                cell = repr(float(cell.replace(",", "")))
+            except ValueError:
+                pass
+            cells.append(cell)
+        while cells and not cells[-1]:
+            cells.pop()
+        return tuple(cells)
+
+    existing = collections.Counter(normalize(row) for row in sheet.get_all_values())
+    remaining = []
+    for row in rows:
+        key = normalize(row)
+        if existing[key]:
+            existing[key] -= 1
+            print(f"Row already in {sheet.title}, not appending it again: {row[:3]}")
+        else:
+            remaining.append(row)
+    return remaining
+
+# === Sheets Write-Behind Queue ===
+WRITE_SPOOL_PATH = os.getenv("WRITE_SPOOL_PATH", os.path.join(SCRIPT_DIR, "write_spool.db"))
+WRITE_SPOOL_SCAN_LIMIT = 500  # Pending ops examined per writer pass
+WRITE_SPOOL_MAX_APPEND_ROWS = 200  # Rows coalesced into one append_rows call (or image links into one batch_update)
+WRITE_SPOOL_COALESCED_KINDS = ("append", "image_link")
+WRITE_SPOOL_MAX_BACKOFF_SECONDS = 300
+WRITE_SPOOL_MAX_ATTEMPTS = 8  # About 10 minutes of backoff before an op is moved to write_spool_failed
+WRITE_SPOOL_BARRIER_SECONDS = 15  # How long a read waits for pending writes to the same tab
+
+def is_permanent_write_error(error):
+    """True for write errors that retrying the same op can't fix: a missing tab, a payload Sheets rejects, a bad op"""
+    if isinstance(error, (gspread.exceptions.WorksheetNotFound, ValueError, TypeError, KeyError)):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        status = getattr(error.response, "status_code", None)
+        # 401 rebuilds the client, 408 and 429 are worth waiting out
+        return status is not None and 400 <= status < 500 and status not in (401, 408, 429)
+    return False
+
+class WriteSpool:
+    """Durable FIFO of Sheets writes drained by one background writer thread
+
+    Handlers enqueue typed ops and reply straight away. Ops stay in a local SQLite file
+    until the Sheets API has accepted them, so a restart does not lose them. Ops for one
+    worksheet are applied in enqueue order, and a run of appends to the same worksheet
+    goes out as a single append_rows call; a run of image links likewise becomes one
+    apply_image_links() call. Appends are not idempotent, so a retried append first drops
+    the rows the failed attempt may have written (rows_not_in_sheet()), as a retried
+    submission does through save_submission_rows(check_existing=True).
+
+    An op that fails WRITE_SPOOL_MAX_ATTEMPTS times, or fails with an error a retry can't
+    fix (is_permanent_write_error()), moves to the write_spool_failed table with its
+    payload and the manager is told, so it stops holding up the ops queued behind it.
+
+    Kinds:
+        append            {"row": [...], "value_input_option", "headers", "header_mode"}
+        batch_update      {"data": [...], "value_input_option"}
+        travel_allowance  keyword arguments for apply_travel_allowance()
+        submission        keyword arguments for save_submission_rows()
+        image_link        one link for apply_image_links()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS write_spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " spreadsheet_key TEXT,"
+            " tab TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT,"
+            " next_attempt_at REAL NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS write_spool_failed ("
+            " id INTEGER PRIMARY KEY,"
+            " spreadsheet_key TEXT,"
+            " tab TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " last_error TEXT,"
+            " failed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._verified_headers = set()  # Format: {(spreadsheet_key, tab)}, checked once per process
+        self.last_write_at = None
+        self.last_write_lag = None
+
+    def enqueue(self, kind, tab_name, payload, spreadsheet_key=None):
+        """Persist one write op; returns once it is on disk"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO write_spool (spreadsheet_key, tab, kind, payload, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (spreadsheet_key, tab_name, kind, json.dumps(payload), time.time())
+            )
+            self._conn.commit()
+            self._changed.notify_all()
+
+    def _pending_for(self, tab_name, spreadsheet_key):
+        return self._conn.execute(
+            "SELECT 1 FROM write_spool WHERE tab = ? AND spreadsheet_key IS ? LIMIT 1",
+            (tab_name, spreadsheet_key)
+        ).fetchone() is not None
+
+    def wait_until_written(self, tab_name, spreadsheet_key=None, timeout=WRITE_SPOOL_BARRIER_SECONDS):
+        """Block until nothing is pending for a tab, for handlers that read back their own writes"""
+        with self._changed:
+            done = self._changed.wait_for(lambda: not self._pending_for(tab_name, spreadsheet_key), timeout=timeout)
+        if not done:
+            print(f"Pending writes to {tab_name} not flushed after {timeout}s, reading anyway")
+        return done
+
+    def _next_batch(self):
+        """Oldest due op whose worksheet isn't backing off, plus the ops of the same kind queued right behind it"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, spreadsheet_key, tab, kind, payload, attempts, enqueued_at, next_attempt_at "
+                "FROM write_spool ORDER BY id LIMIT ?", (WRITE_SPOOL_SCAN_LIMIT,)
+            ).fetchall()
+
+        blocked = set()
+        batch = []
+        for op_id, key, tab, kind, payload, attempts, enqueued_at, next_attempt_at in rows:
+            target = (key, tab)
+            op = {"id": op_id, "spreadsheet_key": key, "tab": tab, "kind": kind,
+                  "payload": json.loads(payload), "attempts": attempts, "enqueued_at": enqueued_at}
+            if batch:
+                head = batch[0]
+                if target != (head["spreadsheet_key"], head["tab"]):
+                    continue
+                same_option = op["payload"].get("value_input_option") == head["payload"].get("value_input_option")
+                if kind != head["kind"] or kind not in WRITE_SPOOL_COALESCED_KINDS or not same_option or len(batch) >= WRITE_SPOOL_MAX_APPEND_ROWS:
+                    break
+                batch.append(op)
+                continue
+            if target in blocked:
+                continue
+            if next_attempt_at > now:
+                # Later ops for this worksheet wait behind the failing one to keep their order
+                blocked.add(target)
+                continue
+            batch = [op]
+            if kind not in WRITE_SPOOL_COALESCED_KINDS:
+                break
+        return batch
+
+    def _ensure_headers(self, sheet, target, payload):
+        headers = payload.get("headers")
+        if not headers or target in self._verified_headers:
+            return
+        from gspread.utils import rowcol_to_a1
+        current = sheet.row_values(1)
+        mode = payload.get("header_mode", "exact")
+        if (mode == "exact" and current != headers) or \
+           (mode == "short" and len(current) < len(headers)) or \
+           (mode == "missing" and not current):
+            print(f"Setting up {sheet.title} headers")
+            sheet_update(sheet, f"A1:{rowcol_to_a1(1, len(headers))}", [headers])
+        self._verified_headers.add(target)
+
+    def _apply(self, batch):
+        head = batch[0]
+        target = (head["spreadsheet_key"], head["tab"])
+        payload = head["payload"]
+        if head["kind"] == "submission":
+            save_submission_rows(spreadsheet_key=head["spreadsheet_key"], check_existing=head["attempts"] > 0, **payload)
+            return
+        sheet = get_worksheet(head["tab"], head["spreadsheet_key"])
+        self._ensure_headers(sheet, target, payload)
+        value_input_option = payload.get("value_input_option", "RAW")
+        if head["kind"] == "append":
+            rows = [op["payload"]["row"] for op in batch]
+            if any(op["attempts"] for op in batch):
+                rows = rows_not_in_sheet(sheet, rows)
+            if rows:
+                sheet_append_rows(sheet, rows, value_input_option=value_input_option)
+        elif head["kind"] == "batch_update":
+            sheet_batch_update(sheet, payload["data"], value_input_option=value_input_option)
+        elif head["kind"] == "travel_allowance":
+            apply_travel_allowance(sheet, **{k: v for k, v in payload.items() if k not in ("headers", "header_mode")})
+        elif head["kind"] == "image_link":
+            apply_image_links(sheet, [op["payload"] for op in batch])
+        else:
+            raise ValueError(f"Unknown write kind {head['kind']}")
+
+    def _finish(self, batch, error=None, give_up=False):
+        ids = [(op["id"],) for op in batch]
+        now = time.time()
+        with self._lock:
+            if error is None:
+                self._conn.executemany("DELETE FROM write_spool WHERE id = ?", ids)
+                self.last_write_at = now
+                self.last_write_lag = now - batch[0]["enqueued_at"]
+            elif give_up:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO write_spool_failed "
+                    "(id, spreadsheet_key, tab, kind, payload, enqueued_at, attempts, last_error, failed_at) "
+                    "SELECT id, spreadsheet_key, tab, kind, payload, enqueued_at, attempts + 1, ?, ? "
+                    "FROM write_spool WHERE id = ?",
+                    [(str(error)[:500], now, op_id) for (op_id,) in ids]
+                )
+                self._conn.executemany("DELETE FROM write_spool WHERE id = ?", ids)
+            else:
+                delay = min(5 * 2 ** batch[0]["attempts"], WRITE_SPOOL_MAX_BACKOFF_SECONDS)
+                self._conn.executemany(
+                    "UPDATE write_spool SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    [(str(error)[:500], now + delay, op_id) for (op_id,) in ids]
+                )
+            self._conn.commit()
+            self._changed.notify_all()
+
+    def write_next(self):
+        """Apply the next due batch; returns False if nothing was due"""
+        batch = self._next_batch()
+        if not batch:
+            return False
+        try:
+            self._apply(batch)
+        except Exception as e:
+            recovered = sheets_client_provider.note_error(e)
+            attempt = batch[0]["attempts"] + 1
+            print(f"Write of {len(batch)} {batch[0]['kind']} op(s) to {batch[0]['tab']} failed "
+                  f"(attempt {attempt}): {e}")
+            # A dropped worksheet handle or rebuilt client earns a permanent error one more try
+            give_up = attempt >= WRITE_SPOOL_MAX_ATTEMPTS or \
+                (is_permanent_write_error(e) and (not recovered or attempt > 1))
+            self._finish(batch, e, give_up)
+            if give_up:
+                self._report_failed(batch, e)
+            return True
+        self._finish(batch)
+        print(f"Wrote {len(batch)} {batch[0]['kind']} op(s) to {batch[0]['tab']}")
+        return True
+
+    def run(self):
+        """Writer thread: apply due ops forever, backing off per worksheet on errors"""
+        print(f"Write spool writer started ({WRITE_SPOOL_PATH})")
+        while True:
+            try:
+                if not self.write_next():
+                    with self._changed:
+                        # Woken by enqueue(); the timeout lets backed-off ops come due
+                        self._changed.wait(timeout=5)
+            except Exception as e:
+                print(f"Write spool error: {e}")
+                time.sleep(5)
+
+    def _report_failed(self, batch, error):
+        head = batch[0]
+        print(f"Gave up on {len(batch)} {head['kind']} op(s) to {head['tab']}, moved to write_spool_failed: {error}")
+        try:
+            bot.send_message(chat_id=MANAGER_CHAT_ID, text=(
+                f"⚠️ {len(batch)} {head['kind']} write(s) to the '{head['tab']}' sheet failed "
+                f"after {head['attempts'] + 1} attempt(s) and were set aside.\n"
+                f"Error: {str(error)[:300]}\n"
+                f"Ops {batch[0]['id']}-{batch[-1]['id']} are kept in write_spool_failed."
+            ))
+        except Exception as e:
+            print(f"Failed to tell the manager about failed writes: {e}")
+
+    def stats(self):
+        """Queue depth and lag figures for monitoring"""
+        now = time.time()
+        with self._lock:
+            depth, oldest, failing = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), SUM(attempts > 0) FROM write_spool"
+            ).fetchone()
+            failed, last_failed = self._conn.execute(
+                "SELECT COUNT(*), MAX(failed_at) FROM write_spool_failed"
+            ).fetchone()
+            last_error = self._conn.execute(
+                "SELECT tab, last_error FROM write_spool WHERE last_error IS NOT NULL ORDER BY id LIMIT 1"
+            ).fetchone()
+        return {
+            "depth": depth,
+            "failing": failing or 0,
+            "oldest_pending_seconds": round(now - oldest, 1) if oldest else 0,
+            "last_write_lag_seconds": round(self.last_write_lag, 1) if self.last_write_lag is not None else None,
+            "seconds_since_last_write": round(now - self.last_write_at, 1) if self.last_write_at else None,
+            "last_error": f"{last_error[0]}: {last_error[1]}" if last_error else None,
+            "failed": failed,
+            "seconds_since_last_failure": round(now - last_failed, 1) if last_failed else None,
         }
-        gauth = GoogleAuth(settings=gauth_settings)
-        gauth.ServiceAuth()
-        drive = GoogleDrive(gauth)
-        # Check or create tickets folder in Shared Drive
-        global TICKET_DRIVE_FOLDER_ID
-        folder_query = f"'{TICKET_DRIVE_FOLDER_ID}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        folder_list = drive.ListFile({
-            'q': folder_query,
-            'supportsAllDrives': True,
-            'includeItemsFromAllDrives': True
-        }).GetList()
-        if folder_list:
-            print(f"Found existing tickets folder with ID: {TICKET_DRIVE_FOLDER_ID}")
+
+write_spool = WriteSpool(WRITE_SPOOL_PATH)
+
+def queue_append_row(tab_name, row, spreadsheet_key=None, value_input_option="RAW", headers=None, header_mode="exact"):
+    """Queue one row for a background append_rows
+
+    headers, if given, are checked once per process before the first write, per header_mode:
+    "exact" rewrites a differing header row, "short" one with fewer columns, "missing" only an empty one.
+    """
+    payload = {"row": row, "value_input_option": value_input_option}
+    if headers:
+        payload.update({"headers": headers, "header_mode": header_mode})
+    write_spool.enqueue("append", tab_name, payload, spreadsheet_key)
+
+# === Employee Directory ===
+EMPLOYEE_DIRECTORY_REFRESH_SECONDS = 300
+
+class EmployeeDirectory:
+    """EmployeeRegister indexed by last-10-digit phone, Employee ID and lower-cased Short Name"""
+
+    def __init__(self, spreadsheet_key=None):
+        self.spreadsheet_key = spreadsheet_key
+        self._indexes = None  # (by_phone, by_emp_id, by_short_name), swapped atomically
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuild the indexes from a fresh read of the register"""
+        with self._refresh_lock:
+            records = get_cached_records(TAB_NAME_EMP_REGISTER, self.spreadsheet_key, force=True)
+            by_phone, by_emp_id, by_short_name = {}, {}, {}
+            for row in records:
+                phone = normalize_number(str(row.get("Phone Number", "")))
+                emp_id = str(row.get("Employee ID", "")).strip()
+                short_name = str(row.get("Short Name", "")).strip().lower()
+                # First row wins, same as the linear scans this replaces
+                if phone:
+                    by_phone.setdefault(phone, row)
+                if emp_id:
+                    by_emp_id.setdefault(emp_id, row)
+                if short_name:
+                    by_short_name.setdefault(short_name, row)
+            self._indexes = (by_phone, by_emp_id, by_short_name)
+            print(f"Employee directory loaded: {len(by_emp_id)} employees, {len(by_phone)} phone numbers")
+
+    def _get_indexes(self):
+        if self._indexes is None:
+            self.refresh()
+        return self._indexes
+
+    def by_phone(self, phone):
+        """Register row for a phone number in any format, or None"""
+        return self._get_indexes()[0].get(normalize_number(str(phone)))
+
+    def by_emp_id(self, emp_id):
+        """Register row for an Employee ID, or None"""
+        return self._get_indexes()[1].get(str(emp_id).strip())
+
+    def by_short_name(self, short_name):
+        """Register row for a Short Name (case-insensitive), or None"""
+        return self._get_indexes()[2].get(str(short_name).strip().lower())
+
+    def short_name(self, emp_id, default=""):
+        """Short Name for an Employee ID, falling back to default"""
+        row = self.by_emp_id(emp_id)
+        if not row:
+            return default
+        return row.get("Short Name", default)
+
+employee_directory = EmployeeDirectory()
+# The kitchen tracker verifies against the EmployeeRegister copy in the ticket spreadsheet
+kitchen_employee_directory = EmployeeDirectory(spreadsheet_key=TICKET_SHEET_ID)
+
+# === Outlet Registry ===
+OutletRecord = collections.namedtuple("OutletRecord", "code name lat lng applicable_checklist reminder_chat_id")
+
+class OutletRegistry:
+    """Outlets tab parsed into OutletRecords indexed by case-insensitive Outlet Code
+
+    Coordinates are parsed from "lat,lng" once per refresh. The reminder chat comes from a
+    "Reminder Chat ID" column when the tab has one, else from CHECKLIST_REMINDER_GROUPS by name.
+    """
+
+    def __init__(self):
+        self._outlets = None  # Format: {CODE: OutletRecord} in sheet order, swapped atomically
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuild the registry from a fresh read of the Outlets tab"""
+        with self._refresh_lock:
+            records = get_cached_records(TAB_NAME_OUTLETS, force=True)
+            groups_by_name = {name.strip().lower(): chat_id for name, chat_id in CHECKLIST_REMINDER_GROUPS.items()}
+            outlets = {}
+            for row in records:
+                code = str(row.get("Outlet Code", "")).strip()
+                if not code:
+                    continue
+                name = str(row.get("Outlet Name", "")).strip()
+                try:
+                    lat_str, lng_str = str(row.get("Outlet Location", "")).strip().split(",")
+                    lat, lng = float(lat_str), float(lng_str)
+                except ValueError:
+                    lat, lng = None, None
+                try:
+                    reminder_chat_id = int(str(row.get("Reminder Chat ID", "")).strip())
+                except ValueError:
+                    reminder_chat_id = groups_by_name.get(name.lower())
+                outlets.setdefault(code.upper(), OutletRecord(
+                    code, name, lat, lng,
+                    str(row.get("Applicable Checklist", "")).strip(),
+                    reminder_chat_id
+                ))
+            self._outlets = outlets
+            print(f"Outlet registry loaded: {len(outlets)} outlets")
+
+    def _get_outlets(self):
+        if self._outlets is None:
+            self.refresh()
+        return self._outlets
+
+    def get(self, outlet_code):
+        """OutletRecord for an Outlet Code in any case, or None"""
+        return self._get_outlets().get(str(outlet_code).strip().upper())
+
+    def codes(self):
+        """Outlet Codes in sheet order"""
+        return [outlet.code for outlet in self._get_outlets().values()]
+
+    def name(self, outlet_code, default=None):
+        """Outlet Name for a code, falling back to default (the code itself if not given)"""
+        outlet = self.get(outlet_code)
+        if outlet and outlet.name:
+            return outlet.name
+        return outlet_code if default is None else default
+
+outlet_registry = OutletRegistry()
+
+# === Roster Index ===
+ROSTER_REFRESH_SECONDS = 60
+ROSTER_FULL_REBUILD_SECONDS = 1800  # Picks up manual edits and deletions above the live window
+RosterEntry = collections.namedtuple("RosterEntry", "row_number outlet start_time signin signout shift")
+ROSTER_ENTRY_COLUMNS = {
+    "outlet": "Outlet",
+    "start_time": "Start Time",
+    "signin": "Sign-In Time",
+    "signout": "Sign-Out Time",
+    "shift": "Shift",
+}
+
+class RosterIndex:
+    """Roster tab parsed into {date: {emp_id: RosterEntry}}
+
+    Rows are read with get_all_values() so headers with empty cells never break parsing.
+    Refreshes only re-read the live window: everything from the first row dated yesterday
+    or later (or whose date doesn't parse), plus anything appended since the last read, so
+    a lookup costs the same however long the tab grows. The window comes from scanning
+    every row rather than assuming the tab is sorted; rows out of date order just make it
+    longer, and a rebuild logs how many there are.
+
+    Sheets reads run outside the lock and the parsed data is swapped in under it, so
+    lookups never wait on the network. A lookup that finds the data older than
+    ROSTER_REFRESH_SECONDS starts one background refresh and answers from what it has;
+    only a lookup before anything has loaded waits for the read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # One Sheets read at a time; lookups never take it
+        self._refreshing = False  # A lookup-triggered background refresh is running
+        self.sheet = None
+        self._columns = {}  # Format: {header: 0-based column index}
+        self._last_column = "A"
+        self._by_date = {}  # Format: {"dd/mm/YYYY": {emp_id: RosterEntry}}, buckets are replaced, never changed in place
+        self._row_keys = {}  # Format: {row_number: (date, emp_id)}
+        self._row_count = 1  # Sheet row number of the last row read (row 1 is the header)
+        self._window_start = 2  # First row whose date is yesterday or later
+        self._refreshed_at = None  # None until the first successful read
+        self._rebuilt_at = 0
+        self._writes = []  # Format: [(monotonic time, row_number, field, value)], re-applied over a refresh that raced them
+
+    @staticmethod
+    def _cell(row, columns, header):
+        idx = columns.get(header)
+        if idx is None or idx >= len(row):
+            return ""
+        return str(row[idx]).strip()
+
+    @staticmethod
+    def _own(by_date, owned, date_str):
+        """by_date's bucket for date_str, copied first so the published index is never modified"""
+        if date_str not in owned:
+            by_date[date_str] = dict(by_date.get(date_str, {}))
+            owned.add(date_str)
+        return by_date[date_str]
+
+    def _parse_rows(self, rows, first_row_number, columns, by_date, row_keys, owned):
+        """Index data rows; returns (first live row number or None, rows dated before the row above them)"""
+        cutoff = (datetime.datetime.now(INDIA_TZ) - datetime.timedelta(days=1)).date()
+        window_start = None
+        out_of_order = 0
+        previous = None
+        for row_number, row in enumerate(rows, start=first_row_number):
+            date_str = self._cell(row, columns, "Date")
+            emp_id = self._cell(row, columns, "Employee ID")
+            if not date_str or not emp_id:
+                continue
+            entry = RosterEntry(row_number, *(self._cell(row, columns, header) for header in ROSTER_ENTRY_COLUMNS.values()))
+            # First row wins for duplicate (date, employee) pairs, matching the old scans
+            self._own(by_date, owned, date_str).setdefault(emp_id, entry)
+            row_keys[row_number] = (date_str, emp_id)
+            try:
+                row_date = datetime.datetime.strptime(date_str, "%d/%m/%Y").date()
+            except ValueError:
+                row_date = None
+            if row_date and previous and row_date < previous:
+                out_of_order += 1
+            previous = row_date or previous
+            if window_start is None and (row_date is None or row_date >= cutoff):
+                window_start = row_number
+        return window_start, out_of_order
+
+    def _rebuild(self):
+        from gspread.utils import rowcol_to_a1
+        sheet = get_worksheet(TAB_NAME_ROSTER)
+        all_values = sheet.get_all_values()
+        headers = [h.strip() for h in all_values[0]] if all_values else []
+        columns = {header: idx for idx, header in enumerate(headers) if header}
+        by_date, row_keys = {}, {}
+        window_start, out_of_order = self._parse_rows(all_values[1:], 2, columns, by_date, row_keys, set())
+        row_count = max(len(all_values), 1)
+        print(f"Roster index rebuilt: {row_count - 1} rows, live window from row {window_start or row_count + 1}")
+        if out_of_order:
+            print(f"Roster has {out_of_order} row(s) out of date order; refreshes re-read from row {window_start}")
+        return {
+            "sheet": sheet,
+            "_columns": columns,
+            "_last_column": re.sub(r"\d", "", rowcol_to_a1(1, max(len(headers), 1))),
+            "_by_date": by_date,
+            "_row_keys": row_keys,
+            "_row_count": row_count,
+            "_window_start": window_start or row_count + 1,
+            "_rebuilt_at": time.monotonic(),
+        }
+
+    def _refresh_tail(self, sheet, columns, last_column, by_date, row_keys, row_count, window_start):
+        start = min(window_start, row_count + 1)
+        rows = sheet.get(f"A{start}:{last_column}")
+        by_date, row_keys, owned = dict(by_date), dict(row_keys), set()
+        # Forget the rows being re-read, then index them again in sheet order
+        for row_number in range(start, row_count + 1):
+            key = row_keys.pop(row_number, None)
+            if not key:
+                continue
+            entry = by_date.get(key[0], {}).get(key[1])
+            if entry and entry.row_number == row_number:
+                del self._own(by_date, owned, key[0])[key[1]]
+        new_window_start, _ = self._parse_rows(rows, start, columns, by_date, row_keys, owned)
+        row_count = max(row_count, start + len(rows) - 1)
+        return {
+            "_by_date": by_date,
+            "_row_keys": row_keys,
+            "_row_count": row_count,
+            "_window_start": new_window_start or row_count + 1,
+        }
+
+    def refresh(self, max_age=None):
+        """Re-read the live window, or the whole tab when a full rebuild is due
+
+        With max_age, skip the read if another thread refreshed within that many seconds.
+        """
+        with self._refresh_lock:
+            started = time.monotonic()
+            with self._lock:
+                if max_age is not None and self._refreshed_at is not None and started - self._refreshed_at < max_age:
+                    return
+                sheet = self.sheet
+                snapshot = (sheet, self._columns, self._last_column, self._by_date, self._row_keys,
+                            self._row_count, self._window_start)
+                rebuild = sheet is None or started - self._rebuilt_at >= ROSTER_FULL_REBUILD_SECONDS
+            try:
+                state = self._rebuild() if rebuild else self._refresh_tail(*snapshot)
+            except Exception as e:
+                sheets_client_provider.note_error(e, sheet)
+                with self._lock:
+                    self.sheet = None  # Reopen through the (possibly rebuilt) shared client next time
+                raise
+            with self._lock:
+                for name, value in state.items():
+                    setattr(self, name, value)
+                # Writes that finished before the read started are in the data already
+                self._writes = [write for write in self._writes if write[0] >= started]
+                for _, row_number, field, value in self._writes:
+                    self._patch(row_number, field, value)
+                self._refreshed_at = time.monotonic()
+
+    def _background_refresh(self):
+        try:
+            self.refresh(max_age=ROSTER_REFRESH_SECONDS)
+        except Exception as e:
+            print(f"Error refreshing roster index: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        with self._lock:
+            loaded = self._refreshed_at is not None
+            if loaded:
+                if self._refreshing or time.monotonic() - self._refreshed_at < ROSTER_REFRESH_SECONDS:
+                    return
+                self._refreshing = True
+        if loaded:
+            threading.Thread(target=self._background_refresh, name="roster-refresh", daemon=True).start()
         else:
-            folder_metadata = {
-                'title': TICKET_FOLDER,
-                'mimeType': 'application/vnd.google-apps.folder',
-                'parents': [{'id': TICKET_DRIVE_FOLDER_ID}],
-                'supportsAllDrives': True
-            }
-            folder = drive.CreateFile(folder_metadata)
-            folder.Upload(param={'supportsAllDrives': True})
-            TICKET_DRIVE_FOLDER_ID = folder['id']
-            print(f"Created tickets folder with ID: {TICKET_DRIVE_FOLDER_ID}")
-        # Verify checklist folder accessibility
+            # Nothing loaded yet, so there is nothing to answer from
+            self.refresh(max_age=ROSTER_REFRESH_SECONDS)
+
+    def entries_for(self, date_str, refresh=True):
+        """Snapshot of {emp_id: RosterEntry} for a dd/mm/YYYY date
+
+        refresh=False answers from whatever is loaded, possibly nothing, and never reads Sheets.
+        """
+        if refresh:
+            self._ensure_fresh()
+        with self._lock:
+            return dict(self._by_date.get(date_str, {}))
+
+    def entry(self, date_str, emp_id):
+        """RosterEntry for one employee on a dd/mm/YYYY date, or None"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._by_date.get(date_str, {}).get(str(emp_id).strip())
+
+    def dates(self):
+        """All dates that have at least one roster row"""
+        self._ensure_fresh()
+        with self._lock:
+            return [date_str for date_str, bucket in self._by_date.items() if bucket]
+
+    def _patch(self, row_number, field, value):
+        key = self._row_keys.get(row_number)
+        if not key:
+            return
+        bucket = self._by_date.get(key[0], {})
+        entry = bucket.get(key[1])
+        if entry and entry.row_number == row_number:
+            self._by_date[key[0]] = {**bucket, key[1]: entry._replace(**{field: value})}
+
+    def write_cell(self, row_number, column_name, value):
+        """Write one Roster cell and patch the indexed entry so reads see it immediately"""
+        if self.sheet is None:
+            self.refresh()
+        with self._lock:
+            sheet = self.sheet
+            column = self._columns[column_name] + 1
+        sheet.update_cell(row_number, column, value)
+        invalidate_sheet_cache(sheet)
+        field = next((f for f, header in ROSTER_ENTRY_COLUMNS.items() if header == column_name), None)
+        if field:
+            with self._lock:
+                self._writes.append((time.monotonic(), row_number, field, str(value)))
+                self._patch(row_number, field, str(value))
+
+roster_index = RosterIndex()
+background_refresh_indexes = [employee_directory, kitchen_employee_directory, outlet_registry, roster_index]
+
+def index_refresh_worker():
+    """Keep the in-memory indexes warm so contact handlers never wait on a full-tab read"""
+    while True:
+        for index in background_refresh_indexes:
+            try:
+                index.refresh()
+            except Exception as e:
+                print(f"Error refreshing {type(index).__name__}: {e}")
+        time.sleep(EMPLOYEE_DIRECTORY_REFRESH_SECONDS)
+
+# === Google Vision & Gemini Setup ===
+class LazyClient:
+    """A client built on first use instead of at import
+
+    get() returns None while the client can't be built, as the Vision and Gemini paths
+    already expect, and tries again on the next call after an error. warm() is the
+    strict variant for startup tasks: it raises instead, so /ready shows the failure.
+    """
+
+    def __init__(self, label, factory):
+        self.label = label
+        self._factory = factory
+        self._client = None
+        self._built = False
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._built:
+            return self._client
+        with self._lock:
+            if not self._built:
+                try:
+                    self._client = self._factory()
+                    self._built = True
+                    if self._client is not None:
+                        print(f"{self.label} initialized successfully")
+                except Exception as e:
+                    self._last_error = e
+                    print(f"Warning: {self.label} not initialized: {e}")
+            return self._client
+
+    def warm(self):
+        """Build the client now; raises if it can't be built or isn't configured"""
+        if self.get() is None:
+            raise Exception(f"{self.label} not available: {self._last_error or 'not configured'}")
+
+def build_vision_client():
+    import aod_ai
+    return aod_ai.build_vision_client(CREDS_FILE)
+
+def build_gemini_model():
+    if not GEMINI_API_KEY:
+        print("Warning: GEMINI_API_KEY not found. AI parsing will not be available.")
+        return None
+    import aod_ai
+    return aod_ai.build_gemini_model(GEMINI_API_KEY, 'gemini-2.5-flash')
+
+vision_client_provider = LazyClient("Google Vision API client", build_vision_client)
+gemini_model_provider = LazyClient("Google Gemini AI", build_gemini_model)
+
+def get_vision_client():
+    """Shared Vision client, or None if it isn't available"""
+    return vision_client_provider.get()
+
+def get_gemini_model():
+    """Shared Gemini model, or None if it isn't available"""
+    return gemini_model_provider.get()
+
+# === Google Drive Setup ===
+class DriveServiceFacade:
+    """drive_service without the import cost: aod_drive (pydrive2, oauth2client) loads on first use
+
+    Every attribute is forwarded to the one aod_drive.DriveService, built when it is first
+    needed, so callers use it exactly as they would the service itself.
+    """
+
+    def __init__(self, *args):
+        self._args = args
+        self._service = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        with self._lock:
+            if self._service is None:
+                from aod_drive import DriveService
+                self._service = DriveService(*self._args)
+        return getattr(self._service, name)
+
+drive_service = DriveServiceFacade(CREDS_FILE, DRIVE_FOLDER_ID, TICKET_DRIVE_FOLDER_ID, TICKET_FOLDER)
+
+# === Media Pipeline ===
+MEDIA_DOWNLOAD_ATTEMPTS = 3
+MEDIA_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DRIVE_UPLOAD_ATTEMPTS = 3
+
+def download_photo(file_id):
+    """Download a Telegram photo into memory; returns (BytesIO, md5 hex) or (None, None)
+
+    The MD5 is computed chunk by chunk as the bytes arrive, so the image is never re-read.
+    """
+    file = None
+    for attempt in range(3):
         try:
-            drive.ListFile({
-                'q': f"'{DRIVE_FOLDER_ID}' in parents",
+            file = bot.get_file(file_id)
+            print(f"File path: {file.file_path}, file_size: {file.file_size}")
+            break
+        except Exception as e:
+            print(f"Error getting file info (attempt {attempt + 1}): {e}")
+            if attempt == 2:
+                return None, None
+            time.sleep(2)
+
+    for attempt in range(MEDIA_DOWNLOAD_ATTEMPTS):
+        try:
+            buffer = BytesIO()
+            hash_md5 = hashlib.md5()
+            with requests.get(file.file_path, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(MEDIA_DOWNLOAD_CHUNK_BYTES):
+                    buffer.write(chunk)
+                    hash_md5.update(chunk)
+            if buffer.tell() == 0:
+                raise Exception("Downloaded file is empty")
+            buffer.seek(0)
+            print(f"Download successful on attempt {attempt + 1}. File size: {buffer.getbuffer().nbytes} bytes")
+            return buffer, hash_md5.hexdigest()
+        except Exception as e:
+            print(f"Download attempt {attempt + 1} failed with error: {e}")
+            if attempt < MEDIA_DOWNLOAD_ATTEMPTS - 1:
+                time.sleep(2 ** attempt)
+    return None, None
+
+def prepare_image(buffer):
+    """Decode, orient and shrink a downloaded photo; see aod_imaging.prepare_image()"""
+    import aod_imaging
+    return aod_imaging.prepare_image(buffer)
+
+def upload_image_to_drive(buffer, filename, folder_id):
+    """Resumable upload of an in-memory JPEG to a Drive folder; returns the file's link
+
+    Raises the last error if every attempt fails.
+    """
+    last_error = None
+    for attempt in range(DRIVE_UPLOAD_ATTEMPTS):
+        gfile = None
+        try:
+            print(f"Upload attempt {attempt + 1} to Google Drive")
+            gfile = drive_service.get().CreateFile({
+                'title': filename,
+                'parents': [{'id': folder_id}],
+                'mimeType': 'image/jpeg'
+            })
+            # SetContentFile() without the file: pydrive2 wraps gfile.content in a resumable MediaIoBaseUpload
+            buffer.seek(0)
+            gfile.content = buffer
+            gfile.dirty['content'] = True
+            gfile.Upload(param={
                 'supportsAllDrives': True,
-                'includeItemsFromAllDrives': True,
-                'maxResults': 1
-            }).GetList()
-            print(f"Checklist folder {DRIVE_FOLDER_ID} is accessible")
+                'supportsTeamDrives': True
+            })
+            print(f"Upload completed for attempt {attempt + 1}")
+
+            file_id = gfile.get('id')
+            if not file_id:
+                raise Exception("Upload completed but no file ID received")
+
+            # Files in a public folder inherit its sharing, so only the upload call is needed
+            if not drive_service.folder_is_public(folder_id):
+                try:
+                    drive_service.share_with_anyone(gfile)
+                    print("Permissions set successfully")
+                except Exception as perm_error:
+                    print(f"Permission setting failed: {perm_error}")
+
+            # files.insert returns the full resource, alternateLink included
+            image_url = gfile.get('alternateLink') or f"https://drive.google.com/file/d/{file_id}/view"
+            print(f"Upload successful! URL: {image_url}")
+            return image_url
+
         except Exception as e:
-            print(f"Warning: Checklist folder {DRIVE_FOLDER_ID} not accessible: {e}")
-        return drive
-    except Exception as e:
-        print(f"Failed to setup Google Drive: {e}")
-        raise
+            last_error = e
+            print(f"Upload attempt {attempt + 1} failed: {e}")
+            drive_service.note_error(e)
+            if gfile and gfile.get('id'):
+                try:
+                    gfile.Delete()
+                except:
+                    pass
+            if attempt < DRIVE_UPLOAD_ATTEMPTS - 1:
+                time.sleep(3 * (attempt + 1))
+    raise last_error
+
+# === Drive Upload Workers ===
+UPLOAD_JOBS_PATH = os.getenv("UPLOAD_JOBS_PATH", WRITE_SPOOL_PATH)
+UPLOAD_WORKERS = 4
+UPLOAD_JOB_PASSES = 3  # Each pass is a full upload_image_to_drive() with its own retries
+UPLOAD_JOB_RETENTION_DAYS = 7
+UPLOAD_FAILED_LINK = "Upload failed"  # Written into the link cell when a photo never reached Drive
+
+class UploadQueue:
+    """Drive uploads run on a worker pool while the conversation moves on
+
+    Handlers download the photo, submit it and keep the returned job ID with the answer.
+    Jobs are recorded in SQLite with the Telegram file_id, so after a restart they are
+    downloaded again and finished. Once the answer's row has been queued, backfill() names
+    the cell that should get the link; if the upload is still running, the link goes out
+    through the write spool when it completes. A job that fails every pass writes
+    UPLOAD_FAILED_LINK into the cell instead, so the row never just stays blank.
+    """
+
+    def __init__(self, path, workers=UPLOAD_WORKERS):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " image_hash TEXT,"
+            " filename TEXT NOT NULL,"
+            " folder_id TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " link TEXT,"
+            " target TEXT,"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+
+    def submit(self, buffer, image_hash, file_id, filename, folder_id):
+        """Record an upload job and hand the in-memory image to a worker; returns the job ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO upload_jobs (id, file_id, image_hash, filename, folder_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, file_id, image_hash, filename, folder_id, time.time())
+            )
+            self._conn.commit()
+        self._executor.submit(self._run, job_id, buffer)
+        print(f"Queued Drive upload {job_id} for {filename}")
+        return job_id
+
+    def link(self, job_id):
+        """The Drive link of a finished job, or "" while it is still uploading"""
+        with self._lock:
+            row = self._conn.execute("SELECT link FROM upload_jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+        return row[0] if row else ""
+
+    def backfill(self, job_id, tab_name, row_key, hash_column, link_column, spreadsheet_key=None):
+        """Have the job's link written into the row whose column A is row_key
+
+        Call this only after the row itself is queued: the write spool keeps per-tab order,
+        so the link never overtakes the row.
+        """
+        target = {"tab_name": tab_name, "spreadsheet_key": spreadsheet_key, "row_key": row_key,
+                  "hash_column": hash_column, "link_column": link_column}
+        with self._lock:
+            row = self._conn.execute("SELECT status, link, image_hash FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                print(f"Unknown upload job {job_id}")
+                return
+            status, link, image_hash = row
+            if status == "done":
+                self._queue_link(target, image_hash, link)
+            elif status == "failed":
+                self._queue_link(target, image_hash, UPLOAD_FAILED_LINK)
+            elif status == "pending":
+                self._conn.execute("UPDATE upload_jobs SET target = ? WHERE id = ?", (json.dumps(target), job_id))
+                self._conn.commit()
+
+    def _queue_link(self, target, image_hash, link):
+        write_spool.enqueue("image_link", target["tab_name"], {
+            "row_key": target["row_key"],
+            "image_hash": image_hash,
+            "hash_column": target["hash_column"],
+            "link_column": target["link_column"],
+            "link": link,
+        }, target["spreadsheet_key"])
+
+    def _run(self, job_id, buffer=None):
+        with self._lock:
+            file_id, filename, folder_id = self._conn.execute(
+                "SELECT file_id, filename, folder_id FROM upload_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        last_error = None
+        for attempt in range(UPLOAD_JOB_PASSES):
+            try:
+                if buffer is None:
+                    buffer, _ = download_photo(file_id)
+                    if buffer is None:
+                        raise Exception("Failed to download image from Telegram")
+                    buffer = prepare_image(buffer).jpeg
+                link = upload_image_to_drive(buffer, filename, folder_id)
+                break
+            except Exception as e:
+                last_error = e
+                print(f"Drive upload {job_id} pass {attempt + 1} failed: {e}")
+                if attempt < UPLOAD_JOB_PASSES - 1:
+                    time.sleep(30 * (attempt + 1))
+        else:
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE upload_jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?",
+                    (str(last_error)[:500], time.time(), job_id)
+                )
+                self._conn.commit()
+                target, image_hash = self._conn.execute(
+                    "SELECT target, image_hash FROM upload_jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                if target:
+                    self._queue_link(json.loads(target), image_hash, UPLOAD_FAILED_LINK)
+            print(f"Drive upload {job_id} gave up, {filename} is marked \"{UPLOAD_FAILED_LINK}\"")
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE upload_jobs SET status = 'done', link = ?, finished_at = ? WHERE id = ?",
+                (link, time.time(), job_id)
+            )
+            self._conn.commit()
+            target, image_hash = self._conn.execute(
+                "SELECT target, image_hash FROM upload_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if target:
+                self._queue_link(json.loads(target), image_hash, link)
+        print(f"Drive upload {job_id} done: {link}")
+
+    def resume(self):
+        """Re-queue jobs the last process left pending and drop old finished ones"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM upload_jobs WHERE status != 'pending' AND finished_at < ?",
+                (time.time() - UPLOAD_JOB_RETENTION_DAYS * 86400,)
+            )
+            self._conn.commit()
+            pending = [row[0] for row in self._conn.execute("SELECT id FROM upload_jobs WHERE status = 'pending'")]
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+        if pending:
+            print(f"Resumed {len(pending)} pending Drive upload(s)")
+
+    def stats(self):
+        """Job counts by status for monitoring"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM upload_jobs GROUP BY status").fetchall())
+        return {"pending": counts.get("pending", 0), "done": counts.get("done", 0), "failed": counts.get("failed", 0)}
+
+upload_queue = UploadQueue(UPLOAD_JOBS_PATH)
+
+IMAGE_LINK_ROW_CACHE_SECONDS = 600  # How long located rows are trusted before the columns are read again
+image_link_rows = {}  # Format: {(spreadsheet_id, tab, row_key): {"rows": {image_hash: [row numbers]}, "found_at": float}}
+image_link_rows_lock = threading.Lock()
+
+def apply_image_links(sheet, links):
+    """Fill the link cells for a run of image_link ops on one tab
+
+    Each link goes into every row with its key and image hash that has no link yet. A
+    submission's rows are located with one batch_get of the key, hash and link columns
+    when its first link arrives; the row numbers are kept, so the rest of its links are
+    written without reading the sheet again. All cells go out in one batch_update.
+    """
+    from gspread.utils import rowcol_to_a1
+    now = time.monotonic()
+    with image_link_rows_lock:
+        for cache_key in [k for k, v in image_link_rows.items() if now - v["found_at"] > IMAGE_LINK_ROW_CACHE_SECONDS]:
+            del image_link_rows[cache_key]
+        unknown = {str(link["row_key"]) for link in links if (sheet.spreadsheet.id, sheet.title, str(link["row_key"])) not in image_link_rows}
+
+    if unknown:
+        hash_column, link_column = links[0]["hash_column"], links[0]["link_column"]
+        columns = [rowcol_to_a1(1, column)[:-1] for column in (1, hash_column, link_column)]
+        key_col, hash_col, link_col = [[row[0] if row else "" for row in values]
+                                       for values in sheet.batch_get([f"{letter}:{letter}" for letter in columns])]
+        found = {row_key: {} for row_key in unknown}
+        for index, value in enumerate(key_col):
+            row_hash = hash_col[index] if index < len(hash_col) else ""
+            row_link = link_col[index] if index < len(link_col) else ""
+            if str(value) in found and row_hash and not row_link:
+                found[str(value)].setdefault(row_hash, []).append(index + 1)
+        with image_link_rows_lock:
+            for row_key, rows in found.items():
+                image_link_rows[(sheet.spreadsheet.id, sheet.title, row_key)] = {"rows": rows, "found_at": now}
+
+    data = []
+    filled = []
+    with image_link_rows_lock:
+        for link in links:
+            entry = image_link_rows.get((sheet.spreadsheet.id, sheet.title, str(link["row_key"])), {"rows": {}})
+            rows = entry["rows"].get(link["image_hash"], [])
+            if not rows:
+                # Not raised: a missing row would otherwise hold up every later write to this tab
+                print(f"No row without a link for {link['row_key']} / {link['image_hash']} in {sheet.title}")
+                continue
+            filled.append((entry, link["image_hash"]))
+            for row_number in rows:
+                data.append({"range": rowcol_to_a1(row_number, link["link_column"]), "values": [[link["link"]]]})
+    if not data:
+        return
+    sheet_batch_update(sheet, data)
+    with image_link_rows_lock:
+        # Only once the cells are written, so a failed call is retried against the same rows
+        for entry, image_hash in filled:
+            entry["rows"].pop(image_hash, None)
+
+# === Image Fingerprint Index ===
+IMAGE_INDEX_PATH = os.getenv("IMAGE_INDEX_PATH", WRITE_SPOOL_PATH)
+DUPLICATE_IMAGE_MAX_DISTANCE = 3  # dHash bits that may differ for two photos to count as the same
+NEAR_DUPLICATE_KINDS = ("ticket",)  # Kinds whose saved photos are matched by dHash too, not only by MD5
+IMAGE_INDEX_RETENTION_DAYS = 7  # Lookups only compare photos from the same day
+
+def image_dhash(image):
+    """64-bit difference hash of a PIL image; see aod_imaging.image_dhash()"""
+    import aod_imaging
+    return aod_imaging.image_dhash(image)
+
+def dhash_distance(first, second):
+    """Number of differing bits between two image_dhash() values"""
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+class ImageFingerprintIndex:
+    """MD5 and dHash of every accepted checklist and ticket photo, keyed by kind, outlet and date
+
+    Checklist and ticket photos are kept apart, so a fault photographed for the checklist
+    can still be raised as a ticket.
+
+    - Ticket photos keep the old Tickets-sheet rule: same date, outlet and submitter. Besides
+      an exact MD5 match, a dHash within DUPLICATE_IMAGE_MAX_DISTANCE catches a re-encoded
+      or resized copy.
+    - Checklist photos only match an earlier submission when the file is identical (MD5).
+      Slots photograph the same fixed scenes every day, so near matches are only flagged
+      within one checklist, where one photo shouldn't answer two questions.
+
+    The index only knows photos saved since it was created, and it starts empty on a host
+    without a persistent disk. covers() says whether it holds a whole day; when it
+    doesn't, the ticket check also reads the Tickets sheet.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(image_fingerprints)")}
+        if columns and "kind" not in columns:
+            # Rows from before checklist and ticket photos were told apart; the index starts over
+            self._conn.execute("DROP TABLE image_fingerprints")
+            self._conn.execute("DROP TABLE IF EXISTS image_fingerprints_meta")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_fingerprints ("
+            " kind TEXT NOT NULL,"
+            " outlet TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " submitted_by TEXT NOT NULL DEFAULT '',"
+            " md5 TEXT NOT NULL,"
+            " dhash TEXT,"
+            " source TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS image_fingerprints_day ON image_fingerprints (kind, outlet, date)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS image_fingerprints_meta (created_at REAL NOT NULL)")
+        row = self._conn.execute("SELECT created_at FROM image_fingerprints_meta").fetchone()
+        if row is None:
+            row = (time.time(),)
+            self._conn.execute("INSERT INTO image_fingerprints_meta (created_at) VALUES (?)", row)
+        self.created_at = row[0]
+        self._conn.execute(
+            "DELETE FROM image_fingerprints WHERE created_at < ?",
+            (time.time() - IMAGE_INDEX_RETENTION_DAYS * 86400,)
+        )
+        self._conn.commit()
+
+    def covers(self, date):
+        """Whether every photo saved on date (YYYY-MM-DD, India time) is in the index"""
+        try:
+            day_start = datetime.datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=INDIA_TZ).timestamp()
+        except ValueError:
+            return False
+        return self.created_at <= day_start
+
+    def find_duplicate(self, kind, outlet, date, md5, dhash, pending=(), submitted_by=""):
+        """Source of an earlier photo matching this one, or None
+
+        kind is "checklist" or "ticket". pending holds (md5, dhash, source) for photos of
+        the current conversation that are not in the index yet; those are always matched
+        by dHash as well as MD5.
+        """
+        with self._lock:
+            stored = self._conn.execute(
+                "SELECT md5, dhash, source FROM image_fingerprints WHERE kind = ? AND outlet = ? AND date = ? AND submitted_by = ?",
+                (kind, outlet, date, submitted_by)
+            ).fetchall()
+        near_stored = kind in NEAR_DUPLICATE_KINDS
+        for other_md5, other_dhash, source in stored:
+            if other_md5 == md5 or (near_stored and dhash and other_dhash and dhash_distance(dhash, other_dhash) <= DUPLICATE_IMAGE_MAX_DISTANCE):
+                return source
+        for other_md5, other_dhash, source in pending:
+            if other_md5 == md5 or (dhash and other_dhash and dhash_distance(dhash, other_dhash) <= DUPLICATE_IMAGE_MAX_DISTANCE):
+                return source
+        return None
+
+    def add(self, kind, outlet, date, md5, dhash, source, submitted_by=""):
+        """Record an accepted photo"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO image_fingerprints (kind, outlet, date, submitted_by, md5, dhash, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, outlet, date, submitted_by, md5, dhash, source, time.time())
+            )
+            self._conn.commit()
 
-drive = setup_drive()
+image_index = ImageFingerprintIndex(IMAGE_INDEX_PATH)
+
+def find_ticket_with_image(date, outlet, submitted_by, image_hash):
+    """Ticket ID of a Tickets row with this date, outlet, submitter and image hash, or None
+
+    The sheet check the index replaced, still used for days the index doesn't cover.
+    """
+    try:
+        for record in get_cached_records(TAB_TICKETS, TICKET_SHEET_ID):
+            if (
+                str(record.get("Date", "")) == date and
+                str(record.get("Outlet", "")) == outlet and
+                str(record.get("Submitted By", "")) == submitted_by and
+                str(record.get("Image Hash", "")) == image_hash
+            ):
+                return str(record.get("Ticket ID", "")) or TAB_TICKETS
+    except Exception as e:
+        print(f"Error checking duplicates in Tickets sheet: {e}")
+    return None
 
 # === States ===
 ASK_ACTION, ASK_PHONE, ASK_LOCATION = range(3)
@@ -256,9 +1767,125 @@ KITCHEN_CL_ASK_CONTACT = 110
 KITCHEN_CL_ASK_QUESTION = 111
 KITCHEN_CL_ASK_IMAGE = 112
 
+# === Broadcast Engine ===
+BROADCAST_WORKERS = 8
+BROADCAST_GLOBAL_RATE = 25  # Messages per second across all chats; Telegram allows about 30
+BROADCAST_PER_CHAT_INTERVAL_SECONDS = 3  # Groups are limited to 20 messages a minute
+BROADCAST_MAX_ATTEMPTS = 3
+BroadcastResult = collections.namedtuple("BroadcastResult", "label chat_id ok latency attempts error")
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class BroadcastEngine:
+    """Sends one message to many chats concurrently within Telegram's global and per-chat limits
+
+    Each send waits for a per-chat slot and a global token, retries RetryAfter and network
+    errors, and records its latency so callers can report per-chat results.
+    """
+
+    def __init__(self, workers=BROADCAST_WORKERS, rate=BROADCAST_GLOBAL_RATE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broadcast")
+        self._bucket = TokenBucket(rate, rate)
+        self._next_slot = {}  # Format: {chat_id: monotonic time the chat may be sent to again}
+        self._slot_lock = threading.Lock()
+
+    def _wait_for_chat(self, chat_id):
+        with self._slot_lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_slot.get(chat_id, 0))
+            self._next_slot[chat_id] = send_at + BROADCAST_PER_CHAT_INTERVAL_SECONDS
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def _send_one(self, label, chat_id, text):
+        started = time.monotonic()
+        error = ""
+        for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+            self._wait_for_chat(chat_id)
+            self._bucket.acquire()
+            try:
+                bot.send_message(chat_id=chat_id, text=text)
+                return BroadcastResult(label, chat_id, True, time.monotonic() - started, attempt, "")
+            except RetryAfter as e:
+                error = f"rate limited ({e.retry_after}s)"
+                time.sleep(e.retry_after)
+            except (TimedOut, NetworkError) as e:
+                error = str(e)
+                time.sleep(2 ** attempt)
+            except Exception as e:
+                error = str(e)
+                break
+        return BroadcastResult(label, chat_id, False, time.monotonic() - started, attempt, error)
+
+    def broadcast(self, targets, text, on_complete=None):
+        """Send text to every {label: chat_id} in targets
+
+        Without on_complete this blocks and returns the BroadcastResults in targets order.
+        With it, the call returns at once and on_complete(results) runs on a worker thread
+        after the last send finishes.
+        """
+        futures = [self._executor.submit(self._send_one, label, chat_id, text) for label, chat_id in targets.items()]
+        if on_complete is None:
+            return [future.result() for future in futures]
+
+        remaining = [len(futures)]
+        remaining_lock = threading.Lock()
+
+        def _done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                on_complete([future.result() for future in futures])
+            except Exception as e:
+                print(f"Error in broadcast completion callback: {e}")
+
+        if not futures:
+            on_complete([])
+        for future in futures:
+            future.add_done_callback(_done)
+        return None
+
+broadcast_engine = BroadcastEngine()
+
 # === Checklist Reminder Functions ===
+def get_checklist_reminder_targets():
+    """{outlet name: group chat ID} from CHECKLIST_REMINDER_GROUPS plus any chat IDs set in the Outlets tab"""
+    targets = dict(CHECKLIST_REMINDER_GROUPS)
+    try:
+        known_chat_ids = set(targets.values())
+        for code in outlet_registry.codes():
+            outlet = outlet_registry.get(code)
+            if outlet.reminder_chat_id and outlet.reminder_chat_id not in known_chat_ids:
+                targets[outlet.name or outlet.code] = outlet.reminder_chat_id
+                known_chat_ids.add(outlet.reminder_chat_id)
+    except Exception as e:
+        print(f"Could not read reminder chats from the outlet registry: {e}")
+    return targets
+
 def send_checklist_reminder_to_groups(slot):
-    """Send checklist reminders to all outlet groups"""
+    """Broadcast a checklist reminder to all outlet groups; the manager summary follows when every send finishes"""
     try:
         current_time = datetime.datetime.now(INDIA_TZ).strftime("%H:%M")
         current_date = datetime.datetime.now(INDIA_TZ).strftime("%d/%m/%Y")
@@ -279,84 +1906,43 @@ def send_checklist_reminder_to_groups(slot):
             f"Use https://t.me/attaodbot to access the bot and fill your checklist.\n"
             f"⚠️ Please ensure all staff complete their checklist on time."
         )
-        
-        successful_sends = 0
-        failed_sends = 0
-        
-        for outlet_name, chat_id in CHECKLIST_REMINDER_GROUPS.items():
+
+        def send_summary(results):
+            successful_sends = sum(1 for r in results if r.ok)
+            failed_sends = len(results) - successful_sends
+            for r in results:
+                if r.ok:
+                    print(f"Sent {slot} checklist reminder to {r.label} (Chat ID: {r.chat_id}) in {r.latency:.1f}s")
+                else:
+                    print(f"Failed to send {slot} checklist reminder to {r.label} (Chat ID: {r.chat_id}): {r.error}")
+            print(f"Checklist reminder summary: {successful_sends} successful, {failed_sends} failed")
+
+            # Send summary to manager
             try:
-                bot.send_message(chat_id=chat_id, text=message)
-                print(f"Sent {slot} checklist reminder to {outlet_name} (Chat ID: {chat_id})")
-                successful_sends += 1
-                time.sleep(0.1)  # Small delay to avoid rate limiting
+                summary_message = (
+                    f"📊 {slot} Checklist Reminder Summary\n"
+                    f"✅ Successful: {successful_sends}\n"
+                    f"❌ Failed: {failed_sends}\n"
+                    f"⏰ Sent at: {current_time}\n"
+                )
+                if results:
+                    summary_message += "\n"
+                    for r in results:
+                        retries = f", {r.attempts} attempts" if r.attempts > 1 else ""
+                        if r.ok:
+                            summary_message += f"✅ {r.label}: {r.latency:.1f}s{retries}\n"
+                        else:
+                            summary_message += f"❌ {r.label}: {r.error}{retries}\n"
+                bot.send_message(chat_id=MANAGER_CHAT_ID, text=summary_message)
             except Exception as e:
-                print(f"Failed to send {slot} checklist reminder to {outlet_name} (Chat ID: {chat_id}): {e}")
-                failed_sends += 1
-        
-        print(f"Checklist reminder summary: {successful_sends} successful, {failed_sends} failed")
-        
-        # Send summary to manager
-        try:
-            summary_message = (
-                f"📊 {slot} Checklist Reminder Summary\n"
-                f"✅ Successful: {successful_sends}\n"
-                f"❌ Failed: {failed_sends}\n"
-                f"⏰ Sent at: {current_time}"
-            )
-            bot.send_message(chat_id=MANAGER_CHAT_ID, text=summary_message)
-        except Exception as e:
-            print(f"Failed to send summary to manager: {e}")
+                print(f"Failed to send summary to manager: {e}")
+
+        # Returns immediately so the reminder scheduler isn't held up by the broadcast
+        broadcast_engine.broadcast(get_checklist_reminder_targets(), message, on_complete=send_summary)
             
     except Exception as e:
         print(f"Error in send_checklist_reminder_to_groups: {e}")
 
-def check_and_send_checklist_reminders():
-    """Check if it's time to send checklist reminders"""
-    try:
-        now = datetime.datetime.now(INDIA_TZ)
-        current_time = now.time()
-        current_date = now.strftime("%Y-%m-%d")
-        
-        # Define reminder times (start of each slot)
-        morning_start = datetime.time(9, 0)   # 9:00 AM
-        midday_start = datetime.time(16, 0)   # 4:00 PM  
-        closing_start = datetime.time(23, 0)  # 11:00 PM
-        
-        # Check which slot we should remind for
-        slot_to_remind = None
-        
-        # Check Morning slot (send reminder at 9:00 AM)
-        if current_time.hour == morning_start.hour and current_time.minute == morning_start.minute:
-            slot_to_remind = "Morning"
-        
-        # Check Mid Day slot (send reminder at 4:00 PM)
-        elif current_time.hour == midday_start.hour and current_time.minute == midday_start.minute:
-            slot_to_remind = "Mid Day"
-        
-        # Check Closing slot (send reminder at 11:00 PM)
-        elif current_time.hour == closing_start.hour and current_time.minute == closing_start.minute:
-            slot_to_remind = "Closing"
-        
-        if slot_to_remind:
-            with checklist_reminder_lock:
-                # Check if we already sent reminder for this slot today
-                reminder_key = f"{slot_to_remind}_{current_date}"
-                last_reminder = checklist_reminder_status.get(reminder_key)
-                
-                # Only send if we haven't sent today or it's been more than 23 hours
-                should_send = (
-                    last_reminder is None or 
-                    now - last_reminder >= datetime.timedelta(hours=23)
-                )
-                
-                if should_send:
-                    send_checklist_reminder_to_groups(slot_to_remind)
-                    checklist_reminder_status[reminder_key] = now
-                    print(f"Sent {slot_to_remind} checklist reminders")
-                    
-    except Exception as e:
-        print(f"Error in check_and_send_checklist_reminders: {e}")
-
 def check_and_send_power_reminders():
     """Check if any outlets need power ON reminders (every 30 minutes after OFF)"""
     try:
@@ -410,11 +1996,7 @@ def send_daily_late_signin_summary():
         now = datetime.datetime.now(INDIA_TZ)
         current_date = now.strftime("%Y-%m-%d")
 
-        # Check if we should send the summary (once per day at 9:00 AM)
-        # Allow sending during the first 5 minutes of the 9 AM hour to avoid missing the window
-        if now.hour != 9 or now.minute >= 5:
-            return
-
+        # The reminder scheduler fires this at LATE_SIGNIN_SUMMARY_TIME
         # Prevent duplicate sends on the same day
         if last_daily_summary_date == current_date:
             return
@@ -476,18 +2058,11 @@ def send_daily_late_signin_summary():
         print(f"Error in send_daily_late_signin_summary: {e}")
 
 def save_power_status(emp_id, emp_name, outlet, outlet_name, status, reason=""):
-    """Save power status to Google Sheet"""
+    """Queue power status for the Google Sheet"""
     try:
-        sheet = client.open_by_key(POWER_STATUS_SHEET_ID).worksheet(TAB_POWER_STATUS)
-        
-        # Verify headers (column 3 empty, outlet name in column 4)
-        headers = sheet.row_values(1)
+        # Headers are verified by the writer (column 3 empty, outlet name in column 4)
         expected_headers = ["Timestamp", "Status", "", "Outlet Name"]
         
-        if not headers or headers != expected_headers:
-            print("Setting up Power Status sheet headers")
-            sheet.update('A1:D1', [expected_headers])
-        
         # Create timestamp as string
         now = datetime.datetime.now(INDIA_TZ)
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
@@ -499,9 +2074,10 @@ def save_power_status(emp_id, emp_name, outlet, outlet_name, status, reason=""):
             outlet_name     # Column 4: Outlet Name
         ]
         
-        # Append the row
-        sheet.append_row(row_data, value_input_option='USER_ENTERED')
-        print(f"Saved power status: {outlet} - {status} at {timestamp}")
+        # Queue the row
+        queue_append_row(TAB_POWER_STATUS, row_data, POWER_STATUS_SHEET_ID,
+                         value_input_option='USER_ENTERED', headers=expected_headers)
+        print(f"Queued power status: {outlet} - {status} at {timestamp}")
         return True
         
     except Exception as e:
@@ -513,11 +2089,9 @@ def save_power_status(emp_id, emp_name, outlet, outlet_name, status, reason=""):
 def get_outlet_name(outlet_code):
     """Get full outlet name from outlet code"""
     try:
-        sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-        records = sheet.get_all_records()
-        for row in records:
-            if str(row.get("Outlet Code")).strip().upper() == outlet_code.strip().upper():
-                return str(row.get("Outlet Name", "")).strip()
+        outlet = outlet_registry.get(outlet_code)
+        if outlet:
+            return outlet.name
         return outlet_code  # Return code if name not found
     except:
         return outlet_code
@@ -545,14 +2119,10 @@ def power_handle_contact(update: Update, context):
     emp_id = ""
     short_name = emp_name
     try:
-        emp_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-        emp_records = emp_sheet.get_all_records()
-        for row in emp_records:
-            row_phone = normalize_number(str(row.get("Phone Number", "")))
-            if row_phone == phone:
-                emp_id = str(row.get("Employee ID", ""))
-                short_name = str(row.get("Short Name", ""))
-                break
+        row = employee_directory.by_phone(phone)
+        if row:
+            emp_id = str(row.get("Employee ID", ""))
+            short_name = str(row.get("Short Name", ""))
     except:
         pass
     
@@ -684,25 +2254,8 @@ def kitchen_handle_contact(update: Update, context):
             # Always go directly to activity list (simplified flow)
             return show_kitchen_activities(update, context)
         
-        # Get employee data from EmployeeRegister sheet
-        sheet = client.open_by_key(TICKET_SHEET_ID).worksheet(TAB_NAME_EMP_REGISTER)
-        all_data = sheet.get_all_records()
-        
-        # Find employee by phone number with flexible matching
-        employee = None
-        for row in all_data:
-            emp_phone = str(row.get('Phone Number', '')).strip()
-            
-            # Normalize employee phone number (extract last 10 digits)
-            emp_phone_normalized = re.sub(r'\D', '', emp_phone)[-10:]
-            
-            print(f"Comparing: {normalized_phone} with {emp_phone_normalized} (from {emp_phone})")
-            
-            # Match by last 10 digits
-            if emp_phone_normalized == normalized_phone:
-                employee = row
-                print(f"✅ Match found: {row.get('Short Name', 'Unknown')}")
-                break
+        # Find employee by the last 10 digits of their registered phone number
+        employee = kitchen_employee_directory.by_phone(normalized_phone)
         
         if not employee:
             print(f"❌ No employee found for phone: {phone} (normalized: {normalized_phone})")
@@ -712,6 +2265,7 @@ def kitchen_handle_contact(update: Update, context):
                 reply_markup=ReplyKeyboardRemove()
             )
             return ConversationHandler.END
+        print(f"✅ Match found: {employee.get('Short Name', 'Unknown')}")
         
         # Check if employee is in Kitchen department
         department = str(employee.get('Department', '')).strip().lower()
@@ -754,8 +2308,7 @@ def show_kitchen_activities(update: Update, context):
         active_activity = get_active_kitchen_activity(employee_code, employee_name)
         
         # Get activities from Activity sheet
-        sheet = client.open_by_key(ACTIVITY_TRACKER_SHEET_ID).worksheet(TAB_NAME_ACTIVITY)
-        all_data = sheet.get_all_records()
+        all_data = get_cached_records(TAB_NAME_ACTIVITY, ACTIVITY_TRACKER_SHEET_ID)
         
         # Find activities where employee has "Yes"
         # Try by Employee Code first, then by Employee Name
@@ -870,8 +2423,9 @@ def kitchen_handle_activity_selection(update: Update, context):
         if selected_activity == "✅ Finished":
             return kitchen_stop_activity(update, context)
         
-        # Get the activity backend sheet
-        sheet = client.open_by_key(ACTIVITY_TRACKER_SHEET_ID).worksheet(TAB_NAME_ACTIVITY_BACKEND)
+        # Get the activity backend sheet once earlier start/stop writes have landed
+        write_spool.wait_until_written(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
+        sheet = get_worksheet(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
         all_data = sheet.get_all_values()
         
         # Check for active activity
@@ -919,14 +2473,17 @@ def kitchen_handle_activity_selection(update: Update, context):
             start_time_str = all_data[active_row_number - 1][start_time_idx].replace("'", "")
             duration = calculate_duration(start_time_str, end_time)
             
-            # Stop the previous activity using batch_update
+            # Stop the previous activity using batch_update (queued ahead of the new row)
             from gspread.utils import rowcol_to_a1
             end_time_cell = rowcol_to_a1(active_row_number, end_time_idx + 1)
             duration_cell = rowcol_to_a1(active_row_number, duration_idx + 1)
-            sheet.batch_update([
-                {'range': end_time_cell, 'values': [[end_time]]},
-                {'range': duration_cell, 'values': [[duration]]}
-            ], value_input_option='USER_ENTERED')
+            write_spool.enqueue("batch_update", TAB_NAME_ACTIVITY_BACKEND, {
+                "data": [
+                    {'range': end_time_cell, 'values': [[end_time]]},
+                    {'range': duration_cell, 'values': [[duration]]}
+                ],
+                "value_input_option": 'USER_ENTERED'
+            }, ACTIVITY_TRACKER_SHEET_ID)
             
             print(f"✅ Stopped previous activity: {active_activity_name} (Duration: {duration})")
         
@@ -956,7 +2513,7 @@ def kitchen_handle_activity_selection(update: Update, context):
             ]
         
         # ⭐ CRITICAL: Use USER_ENTERED to let Google Sheets format date/time properly
-        sheet.append_row(new_row, value_input_option='USER_ENTERED')
+        queue_append_row(TAB_NAME_ACTIVITY_BACKEND, new_row, ACTIVITY_TRACKER_SHEET_ID, value_input_option='USER_ENTERED')
         
         # Build success message
         success_message = [f"✅ *Activity Started!*\n"]
@@ -982,6 +2539,7 @@ def kitchen_handle_activity_selection(update: Update, context):
         return ConversationHandler.END
         
     except Exception as e:
+        sheets_client_provider.note_error(e)
         print(f"Error in kitchen_handle_activity_selection: {e}")
         import traceback
         traceback.print_exc()
@@ -1003,7 +2561,8 @@ def kitchen_stop_activity(update: Update, context):
         employee_name = context.user_data['kitchen_employee_name']
         employee_code = context.user_data['kitchen_employee_code']
         
-        sheet = client.open_by_key(ACTIVITY_TRACKER_SHEET_ID).worksheet(TAB_NAME_ACTIVITY_BACKEND)
+        write_spool.wait_until_written(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
+        sheet = get_worksheet(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
         all_data = sheet.get_all_values()
 
         headers = [h.strip() for h in all_data[0]]  # Strip whitespace from headers
@@ -1059,10 +2618,13 @@ def kitchen_stop_activity(update: Update, context):
         from gspread.utils import rowcol_to_a1
         end_time_cell = rowcol_to_a1(row_number, end_time_idx + 1)
         duration_cell = rowcol_to_a1(row_number, duration_idx + 1)
-        sheet.batch_update([
-            {'range': end_time_cell, 'values': [[end_time]]},
-            {'range': duration_cell, 'values': [[duration]]}
-        ], value_input_option='USER_ENTERED')
+        write_spool.enqueue("batch_update", TAB_NAME_ACTIVITY_BACKEND, {
+            "data": [
+                {'range': end_time_cell, 'values': [[end_time]]},
+                {'range': duration_cell, 'values': [[duration]]}
+            ],
+            "value_input_option": 'USER_ENTERED'
+        }, ACTIVITY_TRACKER_SHEET_ID)
         
         activity_name = row_to_update[activity_idx]
         
@@ -1080,6 +2642,7 @@ def kitchen_stop_activity(update: Update, context):
         return ConversationHandler.END
         
     except Exception as e:
+        sheets_client_provider.note_error(e)
         print(f"Error in kitchen_stop_activity: {e}")
         import traceback
         traceback.print_exc()
@@ -1104,7 +2667,8 @@ def get_active_kitchen_activity(employee_code, employee_name):
         employee_name: Employee Short Name (e.g., 'Admin')
     """
     try:
-        sheet = client.open_by_key(ACTIVITY_TRACKER_SHEET_ID).worksheet(TAB_NAME_ACTIVITY_BACKEND)
+        write_spool.wait_until_written(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
+        sheet = get_worksheet(TAB_NAME_ACTIVITY_BACKEND, ACTIVITY_TRACKER_SHEET_ID)
         all_data = sheet.get_all_values()
 
         if len(all_data) < 2:
@@ -1152,6 +2716,7 @@ def get_active_kitchen_activity(employee_code, employee_name):
         return None
         
     except Exception as e:
+        sheets_client_provider.note_error(e)
         print(f"Error in get_active_kitchen_activity: {e}")
         import traceback
         traceback.print_exc()
@@ -1211,8 +2776,7 @@ def calculate_running_duration(start_time_str):
 def get_kitchen_checklist_questions(employee_code):
     """Get questions assigned to an employee from the Kitchen Checklist sheet"""
     try:
-        sheet = client.open_by_key(KITCHEN_CHECKLIST_SHEET_ID).worksheet(TAB_KITCHEN_QUESTIONS)
-        records = sheet.get_all_records()
+        records = get_cached_records(TAB_KITCHEN_QUESTIONS, KITCHEN_CHECKLIST_SHEET_ID)
 
         questions = []
         for row in records:
@@ -1383,8 +2947,6 @@ def kcl_handle_image_upload(update: Update, context):
             update.message.reply_text("❌ Image too large (max 10MB allowed).")
             return KITCHEN_CL_ASK_IMAGE
 
-        file = photo.get_file()
-
         emp_name = context.user_data.get("kcl_emp_name", "User")
         q_num = context.user_data["kcl_current_q"] + 1
         current_date = datetime.datetime.now(INDIA_TZ).strftime("%Y-%m-%d")
@@ -1392,60 +2954,16 @@ def kcl_handle_image_upload(update: Update, context):
 
         safe_emp_name = sanitize_filename(emp_name)
         filename = f"kitchen_checklist/{safe_emp_name}_Q{q_num}_{current_date}_{timestamp_suffix}.jpg"
-        local_filename = f"kcl_{safe_emp_name}_Q{q_num}_{current_date}_{timestamp_suffix}.jpg"
-        local_path = os.path.join("/tmp", local_filename)
-
-        os.makedirs("/tmp", exist_ok=True)
-        file.download(custom_path=local_path)
-
-        # Compute hash
-        hash_md5 = hashlib.md5()
-        with open(local_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        image_hash = hash_md5.hexdigest()
-
-        # Upload to Google Drive with retry logic
-        progress_msg = update.message.reply_text("⏳ Uploading image...")
-
-        max_retries = 3
-        upload_success = False
-        last_error = None
-
-        for attempt in range(max_retries):
-            try:
-                gfile = drive.CreateFile({
-                    'title': filename,
-                    'parents': [{'id': DRIVE_FOLDER_ID}],
-                    'supportsAllDrives': True
-                })
-                gfile.SetContentFile(local_path)
-                gfile.Upload(param={'supportsAllDrives': True})
-
-                try:
-                    gfile.InsertPermission({'type': 'anyone', 'value': 'anyone', 'role': 'reader'})
-                except:
-                    pass
-
-                upload_success = True
-                break
-            except Exception as upload_error:
-                last_error = upload_error
-                print(f"Upload attempt {attempt + 1} failed: {upload_error}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # Wait before retry
-
-        if not upload_success:
-            raise last_error
 
-        file_id = gfile.get('id')
-        image_url = f"https://drive.google.com/file/d/{file_id}/view"
+        # Download into memory, hashing as it arrives
+        image_buffer, image_hash = download_photo(photo.file_id)
+        if image_buffer is None:
+            raise Exception("Failed to download image from Telegram")
+        prepared = prepare_image(image_buffer)
 
-        # Clean up
-        if os.path.exists(local_path):
-            os.remove(local_path)
-
-        progress_msg.edit_text("✅ Image uploaded!")
+        # Drive upload runs in the background; the link is filled in once it lands
+        upload_job = upload_queue.submit(prepared.jpeg, image_hash, photo.file_id, filename, drive_service.folder_id("checklist"))
+        update.message.reply_text("✅ Image received!")
 
         # Reset fail count on success
         context.user_data["kcl_image_fail_count"] = 0
@@ -1455,15 +2973,16 @@ def kcl_handle_image_upload(update: Update, context):
         context.user_data["kcl_answers"].append({
             "question": q_data["question"],
             "answer": "Image uploaded",
-            "image_link": image_url,
-            "image_hash": image_hash
+            "image_link": "",
+            "image_hash": image_hash,
+            "upload_job": upload_job
         })
 
         context.user_data["kcl_current_q"] += 1
         return kcl_ask_next_question(update, context)
 
     except Exception as e:
-        print(f"Error uploading kitchen checklist image: {e}")
+        print(f"Error receiving kitchen checklist image: {e}")
         import traceback
         traceback.print_exc()
 
@@ -1471,21 +2990,14 @@ def kcl_handle_image_upload(update: Update, context):
         fail_count = context.user_data.get("kcl_image_fail_count", 0) + 1
         context.user_data["kcl_image_fail_count"] = fail_count
 
-        # Clean up local file if it exists
-        try:
-            if 'local_path' in locals() and os.path.exists(local_path):
-                os.remove(local_path)
-        except:
-            pass
-
         if fail_count >= 2:
             update.message.reply_text(
-                f"❌ Upload failed ({fail_count} attempts).\n\n"
+                f"❌ Download failed ({fail_count} attempts).\n\n"
                 f"Type 'skip' to skip this image and continue, or try uploading again."
             )
         else:
             update.message.reply_text(
-                f"❌ Error uploading image. Please try again.\n"
+                f"❌ Error receiving image. Please try again.\n"
                 f"(Attempt {fail_count}/2 before skip option is available)"
             )
         return KITCHEN_CL_ASK_IMAGE
@@ -1494,27 +3006,28 @@ def kcl_handle_image_upload(update: Update, context):
 def kcl_save_submission(update: Update, context):
     """Save the completed kitchen checklist submission"""
     try:
-        # Save individual responses
-        responses_sheet = client.open_by_key(KITCHEN_CHECKLIST_SHEET_ID).worksheet(TAB_KITCHEN_RESPONSES)
+        # Links of uploads that already finished go in directly, the rest are back-filled
         for answer in context.user_data["kcl_answers"]:
-            responses_sheet.append_row([
-                context.user_data["kcl_submission_id"],
-                context.user_data["kcl_date"],
-                context.user_data["kcl_emp_code"],
-                context.user_data["kcl_emp_name"],
-                answer["question"],
-                answer["answer"],
-                answer.get("image_link", ""),
-                answer.get("image_hash", "")
-            ])
+            if answer.get("upload_job"):
+                answer["image_link"] = upload_queue.link(answer["upload_job"])
 
-        # Save submission summary
-        submissions_sheet = client.open_by_key(KITCHEN_CHECKLIST_SHEET_ID).worksheet(TAB_KITCHEN_SUBMISSIONS)
+        # Individual responses
+        response_rows = [[
+            context.user_data["kcl_submission_id"],
+            context.user_data["kcl_date"],
+            context.user_data["kcl_emp_code"],
+            context.user_data["kcl_emp_name"],
+            answer["question"],
+            answer["answer"],
+            answer.get("image_link", ""),
+            answer.get("image_hash", "")
+        ] for answer in context.user_data["kcl_answers"]]
 
+        # Submission summary
         all_image_hashes = [a.get("image_hash", "") for a in context.user_data["kcl_answers"] if a.get("image_hash")]
         image_hashes_str = ", ".join(all_image_hashes) if all_image_hashes else ""
 
-        submissions_sheet.append_row([
+        summary_row = [
             context.user_data["kcl_submission_id"],
             context.user_data["kcl_date"],
             context.user_data["kcl_emp_code"],
@@ -1522,7 +3035,19 @@ def kcl_save_submission(update: Update, context):
             context.user_data["kcl_timestamp"],
             len(context.user_data["kcl_answers"]),
             image_hashes_str
-        ])
+        ]
+
+        write_spool.enqueue("submission", TAB_KITCHEN_RESPONSES, {
+            "submission_id": context.user_data["kcl_submission_id"],
+            "responses_tab": TAB_KITCHEN_RESPONSES,
+            "response_rows": response_rows,
+            "submissions_tab": TAB_KITCHEN_SUBMISSIONS,
+            "summary_row": summary_row,
+        }, KITCHEN_CHECKLIST_SHEET_ID)
+        for answer in context.user_data["kcl_answers"]:
+            if answer.get("upload_job") and not answer["image_link"]:
+                upload_queue.backfill(answer["upload_job"], TAB_KITCHEN_RESPONSES, context.user_data["kcl_submission_id"],
+                                      hash_column=8, link_column=7, spreadsheet_key=KITCHEN_CHECKLIST_SHEET_ID)
 
         # Check for any errors (temperature out of range)
         has_error = any(a.get("answer") == "Error (Out of Range)" for a in context.user_data["kcl_answers"])
@@ -1567,15 +3092,11 @@ def kcl_save_submission(update: Update, context):
 def get_employee_info_by_phone(phone):
     """Get employee name and code by phone number"""
     try:
-        emp_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-        records = emp_sheet.get_all_records()
-
-        for row in records:
-            row_phone = normalize_number(str(row.get("Phone Number", "")))
-            if row_phone == phone:
-                emp_name = str(row.get("Short Name", "")).strip()
-                emp_code = str(row.get("Employee ID", "")).strip()
-                return emp_name, emp_code
+        row = employee_directory.by_phone(phone)
+        if row:
+            emp_name = str(row.get("Short Name", "")).strip()
+            emp_code = str(row.get("Employee ID", "")).strip()
+            return emp_name, emp_code
 
         return None, None
     except Exception as e:
@@ -1602,86 +3123,22 @@ def get_employee_chat_id(emp_id, short_name):
     print(f"No chat ID found for employee: {emp_id} ({short_name})")
     return None
 
-def check_and_send_reminders():
-    """Check if any employee needs a sign-in reminder and send it"""
+def send_due_signin_reminder(roster_date, emp_id, planned_start, number):
+    """Send one planned sign-in reminder if the employee still hasn't signed in"""
     try:
-        now = datetime.datetime.now(INDIA_TZ)
-        current_time = now.time()
-        current_date = now.strftime("%d/%m/%Y")
-        
-        # Get today's roster
-        gc = gspread.authorize(ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE))
-        roster_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_ROSTER)
-        emp_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-        
-        roster_records = roster_sheet.get_all_records()
-        emp_records = emp_sheet.get_all_records()
-        
-        # Create employee ID to name mapping
-        emp_id_to_name = {
-            str(row.get("Employee ID")).strip(): row.get("Short Name", "")
-            for row in emp_records if row.get("Employee ID")
-        }
-        
-        for row in roster_records:
-            if str(row.get("Date", "")).strip() != current_date:
-                continue
-                
-            emp_id = str(row.get("Employee ID", "")).strip()
-            short_name = emp_id_to_name.get(emp_id, "")
-            outlet = str(row.get("Outlet", "")).strip()
-            start_time_str = str(row.get("Start Time", "")).strip()
-            signin_time = str(row.get("Sign-In Time", "")).strip()
-            
-            # Skip if no start time, weekly off, or already signed in
-            if not start_time_str or start_time_str == "N/A" or outlet.lower() == "wo" or signin_time:
-                continue
-                
-            try:
-                start_time = datetime.datetime.strptime(start_time_str, "%H:%M:%S").time()
-            except ValueError:
-                print(f"Invalid start time format for {emp_id}: {start_time_str}")
-                continue
-            
-            # Calculate reminder time (start time + 10 minutes)
-            start_datetime = datetime.datetime.combine(now.date(), start_time)
-            reminder_time = (start_datetime + datetime.timedelta(minutes=10)).time()
-            
-            # Check if it's time for a reminder (within 1 minute window)
-            if current_time >= reminder_time:
-                # Check if we need to send a reminder
-                with reminder_lock:
-                    emp_status = reminder_status.get(emp_id, {})
-                    last_reminder = emp_status.get("last_reminder")
-                    reminders_sent = emp_status.get("reminders_sent", 0)
-                    
-                    # Send reminder if:
-                    # 1. Never sent before, OR
-                    # 2. Last reminder was more than 10 minutes ago
-                    should_send = (
-                        last_reminder is None or 
-                        now - last_reminder >= datetime.timedelta(minutes=10)
-                    )
-                    
-                    # Stop sending after 6 reminders (1 hour)
-                    if reminders_sent >= 6:
-                        should_send = False
-                    
-                    if should_send:
-                        chat_id = get_employee_chat_id(emp_id, short_name)
-                        if chat_id:
-                            send_signin_reminder(chat_id, short_name, outlet, start_time_str)
-                            
-                            # Update reminder status
-                            reminder_status[emp_id] = {
-                                "last_reminder": now,
-                                "reminders_sent": reminders_sent + 1
-                            }
-                            
-                            print(f"Sent reminder {reminders_sent + 1} to {short_name} ({emp_id})")
-                        
+        # The roster index is patched on sign-in, so this sees sign-ins from the last few seconds
+        entry = roster_index.entry(roster_date, emp_id)
+        if not entry or entry.signin or entry.start_time != planned_start or entry.outlet.lower() == "wo":
+            return
+
+        short_name = employee_directory.short_name(emp_id)
+        chat_id = get_employee_chat_id(emp_id, short_name)
+        if chat_id:
+            send_signin_reminder(chat_id, short_name, entry.outlet, entry.start_time)
+            print(f"Sent reminder {number} to {short_name} ({emp_id})")
+
     except Exception as e:
-        print(f"Error in check_and_send_reminders: {e}")
+        print(f"Error in send_due_signin_reminder: {e}")
 
 def send_signin_reminder(chat_id, emp_name, outlet, start_time):
     """Send sign-in reminder to an employee"""
@@ -1702,48 +3159,252 @@ def send_signin_reminder(chat_id, emp_name, outlet, start_time):
     except Exception as e:
         print(f"Failed to send reminder to {emp_name} (Chat ID: {chat_id}): {e}")
 
-def reminder_worker():
-    """Background worker that runs reminder checks every minute"""
-    print("Sign-in, checklist, power status, and late sign-in summary service started")
-    while True:
+# === Reminder Scheduler ===
+SIGNIN_REMINDER_OFFSETS_MINUTES = [10, 20, 30, 40, 50, 60]  # After shift start, six reminders at most
+CHECKLIST_REMINDER_TIMES = {
+    "Morning": datetime.time(9, 0),
+    "Mid Day": datetime.time(16, 0),
+    "Closing": datetime.time(23, 0),
+}
+LATE_SIGNIN_SUMMARY_TIME = datetime.time(9, 0)
+POWER_REMINDER_CHECK_SECONDS = 60
+REMINDER_PLAN_SECONDS = ROSTER_REFRESH_SECONDS
+REMINDER_GRACE_SECONDS = 300  # Deadlines missed by less than this (e.g. across a restart) still fire
+REMINDER_LOG_PATH = os.getenv("REMINDER_LOG_PATH", WRITE_SPOOL_PATH)
+REMINDER_JOB_WORKERS = 4
+
+class ReminderScheduler:
+    """Min-heap of timed jobs; one thread sleeps until the next deadline and hands jobs to a pool
+
+    Keyed jobs are deduplicated, so re-planning after every roster refresh only adds
+    deadlines that are new. A keyed job is also recorded in SQLite as it fires, so
+    re-planning inside REMINDER_GRACE_SECONDS, even after a restart, never sends it a
+    second time. Jobs with key=None (the recurring ones) are always queued. Jobs run on
+    a small pool, so a slow send or Sheets read doesn't hold up the other deadlines.
+    """
+
+    def __init__(self, path):
+        self._heap = []  # Format: [(fire_at epoch, seq, key, func, args)]
+        self._planned = {}  # Format: {key: fire_at epoch}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fired_reminders ("
+            " job_key TEXT PRIMARY KEY,"
+            " fired_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._executor = ThreadPoolExecutor(max_workers=REMINDER_JOB_WORKERS, thread_name_prefix="reminder")
+
+    def _has_fired(self, key):
+        return self._conn.execute(
+            "SELECT 1 FROM fired_reminders WHERE job_key = ?", (json.dumps(list(key)),)
+        ).fetchone() is not None
+
+    def schedule(self, fire_at, key, func, *args):
+        """Run func(*args) at the aware datetime fire_at unless key is already planned or has fired"""
+        fire_ts = fire_at.timestamp()
+        with self._cond:
+            if key is not None:
+                if key in self._planned or self._has_fired(key):
+                    return False
+                self._planned[key] = fire_ts
+            heapq.heappush(self._heap, (fire_ts, next(self._seq), key, func, args))
+            self._cond.notify()
+        return True
+
+    def forget_before(self, cutoff):
+        """Drop dedupe keys and fired records for deadlines older than cutoff"""
+        cutoff_ts = cutoff.timestamp()
+        with self._cond:
+            for key in [k for k, ts in self._planned.items() if ts < cutoff_ts]:
+                del self._planned[key]
+            self._conn.execute("DELETE FROM fired_reminders WHERE fired_at < ?", (cutoff_ts,))
+            self._conn.commit()
+
+    def _run_job(self, key, func, args):
         try:
-            # Check sign-in reminders
-            check_and_send_reminders()
+            func(*args)
+        except Exception as e:
+            print(f"Error in scheduled job {key or func.__name__}: {e}")
+
+    def run(self):
+        """Scheduler thread: pop and run jobs as their deadlines arrive"""
+        print("Sign-in, checklist, power status, and late sign-in summary scheduler started")
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                fire_ts, _, key, func, args = heapq.heappop(self._heap)
+                if key is not None:
+                    # Recorded before sending: a reminder may be lost in a crash, but never repeated
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO fired_reminders (job_key, fired_at) VALUES (?, ?)",
+                        (json.dumps(list(key)), fire_ts)
+                    )
+                    self._conn.commit()
+            self._executor.submit(self._run_job, key, func, args)
+
+reminder_scheduler = ReminderScheduler(REMINDER_LOG_PATH)
+
+def plan_reminders():
+    """Queue today's sign-in deadlines, checklist slots and the late summary, then re-run after the next roster refresh"""
+    now = datetime.datetime.now(INDIA_TZ)
+    earliest = now - datetime.timedelta(seconds=REMINDER_GRACE_SECONDS)
+    try:
+        reminder_scheduler.forget_before(now - datetime.timedelta(days=2))
+
+        for day in (now.date(), now.date() + datetime.timedelta(days=1)):
+            day_str = day.strftime("%Y-%m-%d")
+            for slot, slot_time in CHECKLIST_REMINDER_TIMES.items():
+                fire_at = datetime.datetime.combine(day, slot_time, tzinfo=INDIA_TZ)
+                if fire_at >= earliest:
+                    reminder_scheduler.schedule(fire_at, ("checklist", day_str, slot), send_checklist_reminder_to_groups, slot)
+            fire_at = datetime.datetime.combine(day, LATE_SIGNIN_SUMMARY_TIME, tzinfo=INDIA_TZ)
+            if fire_at >= earliest:
+                reminder_scheduler.schedule(fire_at, ("late_summary", day_str), send_daily_late_signin_summary)
+
+        # Sign-in reminders: start + 10 minutes, then every 10 minutes, up to 6 times.
+        # The key includes the start time so an edited roster plans fresh deadlines.
+        # Planned from the loaded index only; index_refresh_worker keeps it current.
+        current_date = now.strftime("%d/%m/%Y")
+        for emp_id, entry in roster_index.entries_for(current_date, refresh=False).items():
+            if not entry.start_time or entry.start_time == "N/A" or entry.outlet.lower() == "wo" or entry.signin:
+                continue
+            try:
+                start_time = datetime.datetime.strptime(entry.start_time, "%H:%M:%S").time()
+            except ValueError:
+                print(f"Invalid start time format for {emp_id}: {entry.start_time}")
+                continue
+            start_at = datetime.datetime.combine(now.date(), start_time, tzinfo=INDIA_TZ)
+            for number, offset in enumerate(SIGNIN_REMINDER_OFFSETS_MINUTES, start=1):
+                fire_at = start_at + datetime.timedelta(minutes=offset)
+                if fire_at >= earliest:
+                    reminder_scheduler.schedule(
+                        fire_at, ("signin", current_date, emp_id, entry.start_time, number),
+                        send_due_signin_reminder, current_date, emp_id, entry.start_time, number
+                    )
+    except Exception as e:
+        print(f"Error in plan_reminders: {e}")
+    finally:
+        reminder_scheduler.schedule(now + datetime.timedelta(seconds=REMINDER_PLAN_SECONDS), None, plan_reminders)
 
-            # Check checklist reminders
-            check_and_send_checklist_reminders()
+def power_reminder_job():
+    """Recurring power ON reminder check; only touches in-memory state"""
+    try:
+        check_and_send_power_reminders()
+    finally:
+        reminder_scheduler.schedule(
+            datetime.datetime.now(INDIA_TZ) + datetime.timedelta(seconds=POWER_REMINDER_CHECK_SECONDS),
+            None, power_reminder_job
+        )
 
-            # Check power status reminders
-            check_and_send_power_reminders()
+# Start the reminder scheduler thread
+reminder_scheduler.schedule(datetime.datetime.now(INDIA_TZ), None, plan_reminders)
+reminder_scheduler.schedule(
+    datetime.datetime.now(INDIA_TZ) + datetime.timedelta(seconds=POWER_REMINDER_CHECK_SECONDS),
+    None, power_reminder_job
+)
+# === AI Result Cache ===
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", WRITE_SPOOL_PATH)
+AI_CACHE_MAX_ENTRIES = 2000  # Least recently used results beyond this are evicted
+
+class AiResultCache:
+    """Vision and Gemini results keyed by the image bytes they were computed from
+
+    Kinds: "ocr" (text_annotations description), "gemini" (raw response text, stored only
+    once it has parsed into a usable result) and "order" (the validated
+    extract_order_details_with_ai() result). The prompt key hashes the prompt text and
+    model name, so editing a prompt or switching models misses the cache. Only
+    successful results are stored. The table is bounded to
+    AI_CACHE_MAX_ENTRIES by evicting the least recently used rows.
+    """
 
-            # Check and send daily late sign-in summary (9:00 AM daily)
-            send_daily_late_signin_summary()
+    def __init__(self, path, max_entries=AI_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_results ("
+            " kind TEXT NOT NULL,"
+            " image_key TEXT NOT NULL,"
+            " prompt_key TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (kind, image_key, prompt_key))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def prompt_key(*parts):
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get(self, kind, image_key, prompt_key=""):
+        """Cached result decoded from JSON, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM ai_results WHERE kind = ? AND image_key = ? AND prompt_key = ?",
+                (kind, image_key, prompt_key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ai_results SET last_used = ? WHERE kind = ? AND image_key = ? AND prompt_key = ?",
+                (time.time(), kind, image_key, prompt_key)
+            )
+            self._conn.commit()
+        print(f"AI cache hit: {kind} {image_key[:12]}")
+        return json.loads(row[0])
+
+    def put(self, kind, image_key, result, prompt_key=""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_results (kind, image_key, prompt_key, result, last_used) VALUES (?, ?, ?, ?, ?)",
+                (kind, image_key, prompt_key, json.dumps(result), time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM ai_results WHERE rowid IN "
+                "(SELECT rowid FROM ai_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
 
-            time.sleep(60)  # Check every minute
-        except Exception as e:
-            print(f"Error in reminder_worker: {e}")
-            time.sleep(60)
+    def delete(self, kind, image_key, prompt_key=""):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM ai_results WHERE kind = ? AND image_key = ? AND prompt_key = ?",
+                (kind, image_key, prompt_key)
+            )
+            self._conn.commit()
 
+ai_cache = AiResultCache(AI_CACHE_PATH)
 
-# Start the reminder worker thread
-reminder_thread = threading.Thread(target=reminder_worker, daemon=True)
-reminder_thread.start()
+def gemini_prompt_key(prompt):
+    """Cache key for a Gemini prompt; changes when the prompt text or the model does"""
+    return AiResultCache.prompt_key(getattr(get_gemini_model(), "model_name", ""), prompt)
 
 # === Allowance Functions ===
 def extract_text_from_image(image_bytes):
-    """Extract text from image using Google Vision API"""
+    """Extract text from image using Google Vision API; identical bytes are answered from ai_cache"""
     try:
+        vision_client = get_vision_client()
         if vision_client is None:
             print("Vision API not initialized")
             return ""
         
-        image = vision.Image(content=image_bytes)
-        response = vision_client.text_detection(image=image)
-        texts = response.text_annotations
+        image_key = hashlib.sha256(image_bytes).hexdigest()
+        cached = ai_cache.get("ocr", image_key)
+        if cached is not None:
+            return cached
+        
+        import aod_ai
+        texts = aod_ai.text_annotations(vision_client, image_bytes)
         
         if texts:
             full_text = texts[0].description
             print(f"Extracted text: {full_text}")
+            ai_cache.put("ocr", image_key, full_text)
             return full_text
         else:
             print("No text found in image")
@@ -2002,37 +3663,64 @@ def validate_ai_amount_with_ocr(ai_amount, ocr_text):
     return (False, "low", ai_amount)
 
 
-def extract_order_details_with_ai(image_bytes, order_type="Blinkit", skip_validation=False):
-    """
-    Use Google Gemini AI to extract order details from image with optional validation
-    Returns: dict with 'total_amount', 'items', 'confidence'
+RECEIPT_EXTRACTION_DEADLINE_SECONDS = 45  # Overall budget for the Vision and Gemini calls on one receipt
+ai_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai")
+
+class ReceiptExtraction:
+    """Vision OCR and Gemini requests for one receipt, started together
+
+    The constructor submits the OCR and every given prompt at once, so the handler waits
+    for max(Vision, Gemini) rather than their sum. The single OCR result serves validation,
+    the regex fallback and the backup text. Waits stop at the shared deadline: a late OCR
+    reads as no text, a late Gemini reply raises TimeoutError like any failed call.
     """
-    try:
-        if not gemini_model:
-            print("⚠️ Gemini AI not available, falling back to regex extraction")
-            return extract_order_details_fallback(image_bytes, order_type)
-        
-        print(f"\n=== AI EXTRACTION STARTED ({order_type}) ===")
-        
-        # STEP 1: Extract text using Vision API for validation (only if validation enabled)
-        ocr_text = ""
-        if not skip_validation:
-            print("Step 1: Extracting text with Vision API for validation...")
-            ocr_text = extract_text_from_image(image_bytes)
-            
-            if not ocr_text:
-                print("⚠️ Vision API couldn't extract text, proceeding with AI only")
-            else:
-                print(f"Vision API extracted {len(ocr_text)} characters")
-        else:
-            print("Step 1: Validation skipped for Blinkit/Instamart orders")
-        
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Create prompt based on order type
-        if order_type == "Blinkit":
-            prompt = """
+
+    def __init__(self, prepared, prompts=(), deadline_seconds=RECEIPT_EXTRACTION_DEADLINE_SECONDS):
+        self.prepared = prepared
+        self.deadline = time.monotonic() + deadline_seconds
+        with prepared.jpeg.getbuffer() as view:
+            self.image_key = hashlib.sha256(view).hexdigest()
+        self._ocr = ai_executor.submit(extract_text_from_image, prepared.ocr_bytes)
+        self._gemini = {}  # Format: {prompt: Future of the response text}
+        for prompt in prompts:
+            self._start_gemini(prompt)
+
+    def _remaining(self):
+        return max(0, self.deadline - time.monotonic())
+
+    def _start_gemini(self, prompt):
+        if prompt not in self._gemini and get_gemini_model() and self.prepared.image is not None:
+            self._gemini[prompt] = ai_executor.submit(self._generate, prompt)
+
+    def _generate(self, prompt):
+        prompt_key = gemini_prompt_key(prompt)
+        cached = ai_cache.get("gemini", self.image_key, prompt_key)
+        if cached is not None:
+            return cached
+        return get_gemini_model().generate_content([prompt, self.prepared.image]).text
+
+    def keep_gemini(self, prompt):
+        """Cache the Gemini text for a prompt, once the caller has found it usable"""
+        ai_cache.put("gemini", self.image_key, self._gemini[prompt].result(), gemini_prompt_key(prompt))
+
+    def forget_gemini(self, prompt):
+        """Drop the cached Gemini text for a prompt, so the next upload asks again"""
+        ai_cache.delete("gemini", self.image_key, gemini_prompt_key(prompt))
+
+    def ocr_text(self):
+        """Vision OCR text, or "" if it failed or missed the deadline"""
+        try:
+            return self._ocr.result(timeout=self._remaining())
+        except Exception as e:
+            print(f"Vision OCR unavailable: {e!r}")
+            return ""
+
+    def gemini(self, prompt):
+        """Gemini response text for a prompt, started now unless the constructor already did"""
+        self._start_gemini(prompt)
+        return self._gemini[prompt].result(timeout=self._remaining())
+
+BLINKIT_ORDER_PROMPT = """
 You are analyzing a food delivery or grocery order screenshot (Blinkit, Instamart, Swiggy, etc.).
 
 CRITICAL: Extract ONLY the information that is CLEARLY VISIBLE in the image. DO NOT guess or make up any numbers.
@@ -2063,16 +3751,20 @@ STRICT Rules:
 If you cannot extract the information with certainty, return:
 {"error": "Could not extract order details"}
 """
-        else:  # Travel/Going/Coming
-            prompt = """
-You are analyzing a payment receipt screenshot (auto, cab, UPI payment, etc.).
+
+TRAVEL_RECEIPT_PROMPT = """
+You are analyzing a travel payment receipt screenshot (auto, cab, Uber, Ola, Rapido, UPI payment, etc.).
 
 CRITICAL: Extract ONLY the information that is CLEARLY VISIBLE in the image. DO NOT guess or make up any numbers.
 
-Please extract the payment amount and return it as a JSON object:
+Please extract the payment amount, the pickup and drop locations, and the trip date, and return them as a JSON object:
 
 {
-  "total_amount": <payment amount in rupees as a number>
+  "total_amount": <payment amount in rupees as a number>,
+  "start_location": "<pickup/starting location, or null if not shown>",
+  "end_location": "<drop/ending location, or null if not shown>",
+  "date": "<trip date in YYYY-MM-DD format, or null if not shown>",
+  "confidence": "<high, medium or low: how sure you are of total_amount>"
 }
 
 STRICT Rules:
@@ -2080,22 +3772,62 @@ STRICT Rules:
 2. DO NOT round numbers - extract EXACTLY as shown (e.g., if it says 94, return 94, NOT 100)
 3. Look for keywords like: fare, total, paid, amount, charge
 4. Return the largest meaningful amount if multiple amounts are present
-5. Return ONLY valid JSON, no additional text
-6. If you're unsure about the amount, return an error instead of guessing
+5. For locations, look for keywords like: pickup, from, start, origin, source and drop, to, destination, end
+6. Extract full location names/addresses when available; otherwise use area/landmark names. Be concise but complete
+7. For date: Look for the trip date, booking date, or payment date. Convert it to YYYY-MM-DD format (e.g., "2025-01-09")
+8. If the date shows a different year format, correct it (e.g., "09 Jan 26" should be "2026-01-09")
+9. Return ONLY valid JSON, no additional text
+10. If you're unsure about the amount, return an error instead of guessing
 
 If you cannot extract the amount with certainty, return:
 {"error": "Could not extract amount"}
 """
+
+def order_details_prompt(order_type):
+    """Gemini prompt for extract_order_details_with_ai(): items for Blinkit orders, fare, route and date for travel receipts"""
+    return BLINKIT_ORDER_PROMPT if order_type == "Blinkit" else TRAVEL_RECEIPT_PROMPT
+
+def extract_order_details_with_ai(extraction, order_type="Blinkit", skip_validation=False):
+    """
+    Use Google Gemini AI to extract order details from a ReceiptExtraction with optional validation
+    Returns: dict with 'total_amount', 'items', 'confidence'
+    """
+    try:
+        if not get_gemini_model() or extraction.prepared.image is None:
+            print("⚠️ Gemini AI not available, falling back to regex extraction")
+            return extract_order_details_fallback(extraction, order_type)
         
-        # STEP 2: Generate content with AI
+        print(f"\n=== AI EXTRACTION STARTED ({order_type}) ===")
+        
+        # A re-upload of the same receipt gets the earlier validated result
+        order_key = AiResultCache.prompt_key(gemini_prompt_key(order_details_prompt(order_type)), skip_validation)
+        cached = ai_cache.get("order", extraction.image_key, order_key)
+        if cached is not None:
+            return cached
+        
+        # STEP 1: Vision OCR for validation (only if validation enabled); it runs alongside Gemini
+        ocr_text = ""
+        if not skip_validation:
+            print("Step 1: Waiting for Vision API text for validation...")
+            ocr_text = extraction.ocr_text()
+            
+            if not ocr_text:
+                print("⚠️ Vision API couldn't extract text, proceeding with AI only")
+            else:
+                print(f"Vision API extracted {len(ocr_text)} characters")
+        else:
+            print("Step 1: Validation skipped for Blinkit/Instamart orders")
+        
+        # STEP 2: Gemini response for the prompt matching the order type
         print("Step 2: Extracting with Gemini AI...")
-        response = gemini_model.generate_content([prompt, image])
+        prompt = order_details_prompt(order_type)
+        response_text = extraction.gemini(prompt)
         
         print(f"AI Response received")
-        print(f"Response text: {response.text[:500]}")
+        print(f"Response text: {response_text[:500]}")
         
         # Parse JSON response
-        response_text = response.text.strip()
+        response_text = response_text.strip()
         
         # Remove markdown code blocks if present
         if response_text.startswith("```json"):
@@ -2103,19 +3835,38 @@ If you cannot extract the amount with certainty, return:
         elif response_text.startswith("```"):
             response_text = response_text.replace("```", "").strip()
         
-        result = json.loads(response_text)
+        try:
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            extraction.forget_gemini(prompt)
+            raise
+        
+        if not isinstance(result, dict):
+            print("❌ AI response is not a JSON object")
+            extraction.forget_gemini(prompt)
+            return None
         
         if "error" in result:
             print(f"❌ AI could not extract data: {result['error']}")
+            extraction.forget_gemini(prompt)
             return None
         
         # Validate and format result
-        if "total_amount" not in result:
-            print("❌ No total_amount in AI response")
+        amount = result.get("total_amount")
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+            print(f"❌ No numeric total_amount in AI response: {amount!r}")
+            extraction.forget_gemini(prompt)
             return None
         
+        # Only a reply that got this far is worth answering a re-upload with
+        extraction.keep_gemini(prompt)
         ai_amount = result["total_amount"]
         
+        # The model's own confidence is kept apart from the OCR validation verdict below
+        if "confidence" in result:
+            result["ai_confidence"] = result.pop("confidence")
+            print(f"Gemini confidence: {result['ai_confidence']}")
+        
         # STEP 3: Validation (only if not skipped)
         if not skip_validation:
             print(f"Step 3: STRICT validation of AI amount (₹{ai_amount})...")
@@ -2158,11 +3909,12 @@ If you cannot extract the amount with certainty, return:
         if order_type == "Blinkit" and result.get("items"):
             print(f"   Items extracted: {len(result['items'])}")
         
+        ai_cache.put("order", extraction.image_key, result, order_key)
         return result
         
     except json.JSONDecodeError as e:
         print(f"❌ Failed to parse AI response as JSON: {e}")
-        print(f"Response was: {response.text}")
+        print(f"Response was: {response_text}")
         return None
     except Exception as e:
         print(f"❌ Error in AI extraction: {e}")
@@ -2170,13 +3922,13 @@ If you cannot extract the amount with certainty, return:
         traceback.print_exc()
         return None
 
-def extract_order_details_fallback(image_bytes, order_type):
+def extract_order_details_fallback(extraction, order_type):
     """
     Fallback to Vision API + regex if Gemini AI is not available
     """
     try:
         print("Using fallback Vision API extraction")
-        extracted_text = extract_text_from_image(image_bytes)
+        extracted_text = extraction.ocr_text()
         
         if not extracted_text:
             return None
@@ -2326,175 +4078,113 @@ def format_items_for_sheet(items):
     
     return " | ".join(formatted) 
 
-def extract_travel_locations_with_ai(image_bytes):
-    """
-    Use Google Gemini AI to extract start and end locations, and date from travel receipt
-    Returns: dict with 'start_location', 'end_location', and 'date'
-    """
-    try:
-        if not gemini_model:
-            print("⚠️ Gemini AI not available for location extraction")
-            return None
-
-        print(f"\n=== AI LOCATION & DATE EXTRACTION STARTED ===")
-
-        image = Image.open(io.BytesIO(image_bytes))
-
-        prompt = """
-You are analyzing a travel/transportation receipt (auto, cab, Uber, Ola, Rapido, etc.).
-
-Please extract the pickup and drop locations, and the trip date, and return them as a JSON object:
-
-{
-  "start_location": "<pickup/starting location>",
-  "end_location": "<drop/ending location>",
-  "date": "<trip date in YYYY-MM-DD format>"
-}
-
-Rules:
-1. Look for keywords like: pickup, from, start, origin, source
-2. Look for keywords like: drop, to, destination, end
-3. Extract full location names/addresses when available
-4. If exact addresses are present, use them; otherwise use area/landmark names
-5. For date: Look for the trip date, booking date, or payment date. Convert it to YYYY-MM-DD format (e.g., "2025-01-09")
-6. If the date shows a different year format, correct it (e.g., "09 Jan 26" should be "2026-01-09")
-7. Return ONLY valid JSON, no additional text
-8. Be concise but complete with location names
-
-If you cannot extract the information, return:
-{"error": "Could not extract travel details"}
-"""
-
-        response = gemini_model.generate_content([prompt, image])
-
-        print(f"AI Location & Date Response received")
-
-        response_text = response.text.strip()
-
-        if response_text.startswith("```json"):
-            response_text = response_text.replace("```json", "").replace("```", "").strip()
-        elif response_text.startswith("```"):
-            response_text = response_text.replace("```", "").strip()
-
-        result = json.loads(response_text)
-
-        if "error" in result:
-            print(f"❌ AI could not extract travel details: {result['error']}")
-            return None
-
-        if "start_location" not in result or "end_location" not in result:
-            print("❌ Incomplete location data in AI response")
-            return None
-
-        print(f"✅ AI Extraction successful!")
-        print(f"   Start: {result['start_location']}")
-        print(f"   End: {result['end_location']}")
-        if "date" in result:
-            print(f"   Date: {result['date']}")
-
-        return result
-
-    except Exception as e:
-        print(f"❌ Error in AI extraction: {e}")
-        return None
+# Going Ref / Coming Ref hold the Travel ID of the op that wrote each amount, so a retried op finds its own write
+TRAVEL_ALLOWANCE_HEADERS = ["Travel ID", "Date", "Employee ID", "Outlet", "Going Amount", "Coming Amount", "Going Ref", "Coming Ref"]
 
 def save_travel_allowance(emp_id, emp_name, outlet, trip_type, amount, travel_date=None):
-    """Save travel allowance (Going/Coming) to Travel Allowance sheet
-    - Going and Coming for same trip go in same row
-    - Multiple trips create multiple rows
+    """Queue travel allowance (Going/Coming) for the Travel Allowance sheet
     - travel_date: Optional date string in YYYY-MM-DD format. If not provided, uses current date.
+    The row matching itself happens in apply_travel_allowance() when the writer runs.
     """
     try:
-        sheet = client.open_by_key(TRAVEL_SHEET_ID).worksheet(TAB_NAME_TRAVEL)
-
-        # Verify and clean headers
-        expected_headers = ["Travel ID", "Date", "Employee ID", "Outlet", "Going Amount", "Coming Amount"]
-
-        # Set headers (this will also overwrite any existing headers)
-        sheet.update('A1:F1', [expected_headers])
-
-        # Get current date and time
         now = datetime.datetime.now(INDIA_TZ)
-        current_date = travel_date if travel_date else now.strftime("%Y-%m-%d")
-        timestamp = now.strftime("%H%M%S")
-
-        # Get all values to check for existing rows
-        all_values = sheet.get_all_values()
-
-        # Find the FIRST row for this employee/date where the trip_type column is empty
-        # This ensures consecutive uploads fill in order (Going1, Going2, Coming1→fills Row1, Coming2→fills Row2)
-        target_row_index = None
-
-        for idx, row_values in enumerate(all_values[1:], start=2):  # start=2 because row 1 is headers
-            if len(row_values) >= 3:
-                date_val = str(row_values[1]).strip() if len(row_values) > 1 else ""  # Column B (Date)
-                emp_id_val = str(row_values[2]).strip() if len(row_values) > 2 else ""  # Column C (Employee ID)
-
-                if date_val == current_date and emp_id_val == emp_id:
-                    # Found a row for this employee on this date
-                    # Check if the trip_type column is empty
-                    if trip_type == "Going":
-                        going_val = str(row_values[4]).strip() if len(row_values) > 4 else ""  # Column E
-                        if not going_val:  # Going column is empty - use this row
-                            target_row_index = idx
-                            break  # Take the FIRST empty slot
-                    else:  # Coming
-                        coming_val = str(row_values[5]).strip() if len(row_values) > 5 else ""  # Column F
-                        if not coming_val:  # Coming column is empty - use this row
-                            target_row_index = idx
-                            break  # Take the FIRST empty slot
-
-        if target_row_index:
-            # Update existing row with empty slot
-            if trip_type == "Going":
-                col = "E"  # Going Amount column
-            else:  # Coming
-                col = "F"  # Coming Amount column
-
-            cell_address = f"{col}{target_row_index}"
-            sheet.update(cell_address, [[amount]])
-            print(f"Updated existing row {target_row_index}: {trip_type} = ₹{amount}")
-        else:
-            # Create new row (no empty slot found)
-            travel_id = f"TRV-{current_date}-{emp_id}-{timestamp}"
-
-            going_amount = amount if trip_type == "Going" else ""
-            coming_amount = amount if trip_type == "Coming" else ""
-
-            row_data = [
-                travel_id,
-                current_date,
-                emp_id,
-                outlet,
-                going_amount,
-                coming_amount
-            ]
-
-            sheet.append_row(row_data)
-            print(f"Created new travel row: {travel_id} - {trip_type}: ₹{amount}")
-
+        write_spool.enqueue("travel_allowance", TAB_NAME_TRAVEL, {
+            "emp_id": emp_id,
+            "outlet": outlet,
+            "trip_type": trip_type,
+            "amount": amount,
+            "current_date": travel_date if travel_date else now.strftime("%Y-%m-%d"),
+            "timestamp": now.strftime("%H%M%S"),
+            # The old code rewrote the header row on every save
+            "headers": TRAVEL_ALLOWANCE_HEADERS,
+        }, TRAVEL_SHEET_ID)
+        print(f"Queued travel allowance: {emp_id} - {trip_type}: ₹{amount}")
         return True
-        
+
     except Exception as e:
         print(f"Error saving to Travel Allowance sheet: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+def apply_travel_allowance(sheet, emp_id, outlet, trip_type, amount, current_date, timestamp):
+    """Write one Going/Coming amount to the Travel Allowance sheet (runs on the write spool)
+    - Going and Coming for same trip go in same row
+    - Multiple trips create multiple rows
+    """
+    # Get all values to check for existing rows
+    all_values = sheet.get_all_values()
+
+    # The Travel ID is fixed by the queued op and written next to the amount (Going Ref/Coming Ref),
+    # so a retry after a lost response finds its own write, whether it added a row or filled one in
+    travel_id = f"TRV-{current_date}-{emp_id}-{timestamp}"
+    for row_values in all_values[1:]:
+        cells = [str(value).strip() for value in row_values]
+        if (cells and cells[0] == travel_id) or travel_id in cells[6:8]:
+            print(f"Travel amount {travel_id} already written, skipping")
+            return
+
+    # Find the FIRST row for this employee/date where the trip_type column is empty
+    # This ensures consecutive uploads fill in order (Going1, Going2, Coming1→fills Row1, Coming2→fills Row2)
+    target_row_index = None
+
+    for idx, row_values in enumerate(all_values[1:], start=2):  # start=2 because row 1 is headers
+        if len(row_values) >= 3:
+            date_val = str(row_values[1]).strip() if len(row_values) > 1 else ""  # Column B (Date)
+            emp_id_val = str(row_values[2]).strip() if len(row_values) > 2 else ""  # Column C (Employee ID)
+
+            if date_val == current_date and emp_id_val == emp_id:
+                # Found a row for this employee on this date
+                # Check if the trip_type column is empty
+                if trip_type == "Going":
+                    going_val = str(row_values[4]).strip() if len(row_values) > 4 else ""  # Column E
+                    if not going_val:  # Going column is empty - use this row
+                        target_row_index = idx
+                        break  # Take the FIRST empty slot
+                else:  # Coming
+                    coming_val = str(row_values[5]).strip() if len(row_values) > 5 else ""  # Column F
+                    if not coming_val:  # Coming column is empty - use this row
+                        target_row_index = idx
+                        break  # Take the FIRST empty slot
+
+    if target_row_index:
+        # Update existing row with empty slot
+        if trip_type == "Going":
+            col, ref_col = "E", "G"  # Going Amount, Going Ref
+        else:  # Coming
+            col, ref_col = "F", "H"  # Coming Amount, Coming Ref
+
+        # One request, so the amount never lands without its ref
+        sheet_batch_update(sheet, [
+            {"range": f"{col}{target_row_index}", "values": [[amount]]},
+            {"range": f"{ref_col}{target_row_index}", "values": [[travel_id]]},
+        ])
+        print(f"Updated existing row {target_row_index}: {trip_type} = ₹{amount}")
+    else:
+        # Create new row (no empty slot found)
+        going_amount = amount if trip_type == "Going" else ""
+        coming_amount = amount if trip_type == "Coming" else ""
+
+        row_data = [
+            travel_id,
+            current_date,
+            emp_id,
+            outlet,
+            going_amount,
+            coming_amount,
+            travel_id if trip_type == "Going" else "",
+            travel_id if trip_type == "Coming" else ""
+        ]
+
+        sheet_append_row(sheet, row_data)
+        print(f"Created new travel row: {travel_id} - {trip_type}: ₹{amount}")
+
 def save_blinkit_order(emp_id, emp_name, outlet, amount, items_list, extracted_text):
-    """Save Blinkit order to allowance sheet"""
+    """Queue Blinkit order for the allowance sheet"""
     try:
-        sheet = client.open_by_key(ALLOWANCE_SHEET_ID).worksheet(TAB_NAME_ALLOWANCE)
-        
-        headers = sheet.row_values(1)
         expected_headers = ["Date", "Time", "Employee ID", "Employee Name", "Outlet", 
                            "Order Type", "Amount", "Items Ordered", "Extracted Text"]
         
-        if not headers:
-            sheet.update('A1:I1', [expected_headers])
-        elif len(headers) < 9:
-            sheet.update('A1:I1', [expected_headers])
-        
         now = datetime.datetime.now(INDIA_TZ)
         row_data = [
             now.strftime("%Y-%m-%d"),
@@ -2508,8 +4198,10 @@ def save_blinkit_order(emp_id, emp_name, outlet, amount, items_list, extracted_t
             extracted_text[:500]
         ]
         
-        sheet.append_row(row_data)
-        print(f"Saved Blinkit order: {emp_name} - ₹{amount}")
+        # Header row is only rewritten when it is missing columns
+        queue_append_row(TAB_NAME_ALLOWANCE, row_data, ALLOWANCE_SHEET_ID,
+                         headers=expected_headers, header_mode="short")
+        print(f"Queued Blinkit order: {emp_name} - ₹{amount}")
         print(f"Items: {items_list[:200]}")
         return True
         
@@ -2548,33 +4240,17 @@ def send_attendance_report(update: Update, context, mode="signin_only"):
         else:
             report_date = (now - datetime.timedelta(days=1) if now.hour < 4 else now).strftime("%d/%m/%Y")
 
-        gc = gspread.authorize(ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE))
-        roster_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_ROSTER)
-        emp_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-
-        roster = roster_sheet.get_all_records()
-        emp_register = emp_sheet.get_all_records()
-
-        emp_id_to_name = {
-            str(row.get("Employee ID")).strip(): row.get("Short Name", "Unnamed")
-            for row in emp_register if row.get("Employee ID")
-        }
-
         outlet_records = {}
-        for row in roster:
-            if str(row.get("Date", "")).strip() != report_date:
-                continue
-
-            emp_id = str(row.get("Employee ID", "")).strip()
-            short_name = emp_id_to_name.get(emp_id, emp_id)
-            outlet = row.get("Outlet", "").strip()
+        for emp_id, entry in roster_index.entries_for(report_date).items():
+            short_name = employee_directory.short_name(emp_id, emp_id)
+            outlet = entry.outlet
             
             if outlet.lower() == "wo":
                 continue
 
-            signin = str(row.get("Sign-In Time", "")).strip()
-            signout = str(row.get("Sign-Out Time", "")).strip()
-            start_time_str = str(row.get("Start Time", "")).strip() or "N/A"
+            signin = entry.signin
+            signout = entry.signout
+            start_time_str = entry.start_time or "N/A"
 
             if mode == "signin_only" and not signin:
                 if start_time_str != "N/A":
@@ -2643,26 +4319,7 @@ def getroster(update: Update, context):
     try:
         fired_employees = ["Mon", "Ruth", "Tongminthang", "Sameer", "jenny"]
         
-        gc = gspread.authorize(ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE))
-        roster_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_ROSTER)
-        outlet_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-        shift_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_SHIFTS)
-        emp_sheet = gc.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-
-        roster = roster_sheet.get_all_records()
-        outlet_records = outlet_sheet.get_all_records()
-        shift_records = shift_sheet.get_all_records()
-        emp_register = emp_sheet.get_all_records()
-
-        emp_id_to_name = {
-            str(row.get("Employee ID")).strip(): row.get("Short Name", "Unnamed")
-            for row in emp_register if row.get("Employee ID")
-        }
-
-        outlet_code_to_name = {
-            str(row.get("Outlet Code")).strip().lower(): str(row.get("Outlet Name")).strip()
-            for row in outlet_records if row.get("Outlet Code") and row.get("Outlet Name")
-        }
+        shift_records = get_cached_records(TAB_NAME_SHIFTS)
 
         shift_id_to_name = {
             str(row.get("Shift ID")).strip(): str(row.get("Shift Name")).strip()
@@ -2670,8 +4327,7 @@ def getroster(update: Update, context):
         }
 
         all_dates = []
-        for row in roster:
-            date_str = str(row.get("Date", "")).strip()
+        for date_str in roster_index.dates():
             if date_str:
                 try:
                     date_obj = datetime.datetime.strptime(date_str, "%d/%m/%Y")
@@ -2686,26 +4342,22 @@ def getroster(update: Update, context):
         all_dates.sort(key=lambda x: x[0])
         latest_date_obj, target_date = all_dates[-1]
         
-        outlet_groups = {}
-
-        for row in roster:
-            if str(row.get("Date", "")).strip() != target_date:
-                continue
+        outlet_groups = {}
 
-            emp_id = str(row.get("Employee ID", "")).strip()
-            name = emp_id_to_name.get(emp_id, emp_id)
+        for emp_id, entry in roster_index.entries_for(target_date).items():
+            name = employee_directory.short_name(emp_id, emp_id)
             
             if name in fired_employees:
                 continue
                 
-            outlet_code = str(row.get("Outlet", "")).strip()
-            shift_id = str(row.get("Shift", "")).strip()
+            outlet_code = entry.outlet
+            shift_id = entry.shift
             shift_name = shift_id_to_name.get(shift_id,'')
 
             if outlet_code.lower() == "wo":
                 outlet_name = "Weekly Off"
             else:
-                outlet_name = outlet_code_to_name.get(outlet_code.lower(), outlet_code)
+                outlet_name = outlet_registry.name(outlet_code)
 
             if outlet_name not in outlet_groups:
                 outlet_groups[outlet_name] = []
@@ -2854,16 +4506,7 @@ def checklist_completion_status(update: Update, context):
         import traceback
         traceback.print_exc()
 
-def get_phone_to_empid_map():
-    creds = ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE)
-    sheet = gspread.authorize(creds).open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-    records = sheet.get_all_records()
-    return {
-        re.sub(r"\D", "", str(row.get("Phone Number", "")))[-10:]: str(row.get("Employee ID", "")).strip()
-        for row in records if row.get("Phone Number") and row.get("Employee ID")
-    }
-
-def get_outlet_row_by_emp_id(emp_id):
+def get_roster_entry_by_emp_id(emp_id):
     now = datetime.datetime.now(ZoneInfo("Asia/Kolkata"))
     if now.hour < 4:
         target_date = (now - datetime.timedelta(days=1)).strftime("%d/%m/%Y")
@@ -2871,83 +4514,25 @@ def get_outlet_row_by_emp_id(emp_id):
         target_date = now.strftime("%d/%m/%Y")
 
     try:
-        creds = ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE)
-        sheet = gspread.authorize(creds).open(SHEET_NAME).worksheet(TAB_NAME_ROSTER)
-        
-        # Try to get records, if header has empty cells, use alternative method
-        try:
-            records = sheet.get_all_records()
-        except gspread.exceptions.GSpreadException as e:
-            if "empty cells" in str(e):
-                # Alternative: use get_all_values and manually parse
-                all_values = sheet.get_all_values()
-                if len(all_values) < 2:
-                    print("Roster sheet has insufficient data")
-                    return None, None, None, None, None
-                
-                headers = [h.strip() for h in all_values[0]]  # Strip whitespace from headers
-                # Find the indices of the columns we need
-                try:
-                    emp_id_idx = headers.index("Employee ID")
-                    date_idx = headers.index("Date")
-                    outlet_idx = headers.index("Outlet")
-                    signin_idx = headers.index("Sign-In Time")
-                    signout_idx = headers.index("Sign-Out Time")
-                except ValueError as ve:
-                    print(f"Required column not found in headers: {ve}")
-                    return None, None, None, None, None
-                
-                # Search through data rows
-                for idx, row in enumerate(all_values[1:], start=2):
-                    if len(row) > max(emp_id_idx, date_idx) and \
-                       str(row[emp_id_idx]).strip() == emp_id and \
-                       str(row[date_idx]).strip() == target_date:
-                        outlet = str(row[outlet_idx]).strip() if len(row) > outlet_idx else ""
-                        signin = row[signin_idx] if len(row) > signin_idx else ""
-                        signout = row[signout_idx] if len(row) > signout_idx else ""
-                        return outlet, signin, signout, idx, sheet
-                
-                print(f"No matching record found for emp_id {emp_id} on date {target_date}")
-                return None, None, None, None, None
-            else:
-                raise
-
-        # Normal path when no header issues
-        for idx, row in enumerate(records, start=2):
-            if str(row.get("Employee ID")).strip() == emp_id and str(row.get("Date")).strip() == target_date:
-                return str(row.get("Outlet")).strip(), row.get("Sign-In Time"), row.get("Sign-Out Time"), idx, sheet
-                
-        print(f"No matching record found for emp_id {emp_id} on date {target_date}")
-        return None, None, None, None, None
-        
+        entry = roster_index.entry(target_date, emp_id)
+        if entry is None:
+            print(f"No matching record found for emp_id {emp_id} on date {target_date}")
+        return entry
     except Exception as e:
-        print(f"Error in get_outlet_row_by_emp_id: {e}")
+        print(f"Error in get_roster_entry_by_emp_id: {e}")
         import traceback
         traceback.print_exc()
-        return None, None, None, None, None
+        return None
 
 def get_outlet_coordinates(outlet_code):
-    creds = ServiceAccountCredentials.from_json_keyfile_name(CREDS_FILE, SCOPE)
-    sheet = gspread.authorize(creds).open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-    records = sheet.get_all_records()
-    for row in records:
-        if str(row.get("Outlet Code")).strip().lower() == outlet_code.lower():
-            try:
-                lat_str, lng_str = str(row.get("Outlet Location")).strip().split(",")
-                return float(lat_str), float(lng_str)
-            except:
-                return None, None
-    return None, None
-
-def update_sheet(sheet, row, column_name, timestamp):
-    col_index = sheet.row_values(1).index(column_name) + 1
-    sheet.update_cell(row, col_index, timestamp)
+    outlet = outlet_registry.get(outlet_code)
+    if not outlet:
+        return None, None
+    return outlet.lat, outlet.lng
 
 def get_employee_info(phone):
     try:
         phone = normalize_number(phone)
-        emp_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-        emp_records = emp_sheet.get_all_records()
         
         # FIXED: For early morning hours (after midnight), use yesterday's roster
         now = datetime.datetime.now(INDIA_TZ)
@@ -2958,22 +4543,17 @@ def get_employee_info(phone):
             target_date = now.strftime("%d/%m/%Y")
             print(f"Normal hours, using today's roster: {target_date}")
         
-        for row in emp_records:
-            row_phone = normalize_number(str(row.get("Phone Number", "")))
-            if row_phone == phone:
-                emp_name = sanitize_filename(str(row.get("Full Name", "Unknown")))
-                emp_id = str(row.get("Employee ID", ""))
-                roster_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_ROSTER)
-                roster_records = roster_sheet.get_all_records()
-                for record in roster_records:
-                    if record.get("Employee ID") == emp_id and record.get("Date") == target_date:
-                        outlet_code = record.get("Outlet")
-                        outlets_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-                        outlets_records = outlets_sheet.get_all_records()
-                        if not any(str(row.get("Outlet Code")).strip().upper() == outlet_code.upper() for row in outlets_records):
-                            bot.send_message(chat_id=MANAGER_CHAT_ID, text=f"Invalid outlet code {outlet_code} in Roster for {emp_name}")
-                            return "Unknown", ""
-                        return emp_name, outlet_code
+        row = employee_directory.by_phone(phone)
+        if row:
+            emp_name = sanitize_filename(str(row.get("Full Name", "Unknown")))
+            emp_id = str(row.get("Employee ID", ""))
+            entry = roster_index.entry(target_date, emp_id)
+            if entry:
+                outlet_code = entry.outlet
+                if outlet_registry.get(outlet_code) is None:
+                    bot.send_message(chat_id=MANAGER_CHAT_ID, text=f"Invalid outlet code {outlet_code} in Roster for {emp_name}")
+                    return "Unknown", ""
+                return emp_name, outlet_code
         return "Unknown", ""
     except Exception as e:
         print(f"Failed to fetch employee info: {e}")
@@ -2981,16 +4561,13 @@ def get_employee_info(phone):
 
 def get_applicable_checklist_for_outlet(outlet_code):
     try:
-        sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-        records = sheet.get_all_records()
-        for row in records:
-            if str(row.get("Outlet Code")).strip().upper() == outlet_code.strip().upper():
-                applicable_checklist = str(row.get("Applicable Checklist", "")).strip()
-                if not applicable_checklist:
-                    print(f"No Applicable Checklist for outlet code {outlet_code}, using default 'Generic'")
-                    return "Generic"
-                print(f"Found applicable checklist '{applicable_checklist}' for outlet code '{outlet_code}'")
-                return applicable_checklist
+        outlet = outlet_registry.get(outlet_code)
+        if outlet:
+            if not outlet.applicable_checklist:
+                print(f"No Applicable Checklist for outlet code {outlet_code}, using default 'Generic'")
+                return "Generic"
+            print(f"Found applicable checklist '{outlet.applicable_checklist}' for outlet code '{outlet_code}'")
+            return outlet.applicable_checklist
         print(f"No matching outlet code {outlet_code} in Outlets, using default 'Generic'")
         bot.send_message(chat_id=MANAGER_CHAT_ID, text=f"No matching outlet code {outlet_code} in Outlets sheet")
         return "Generic"
@@ -2998,79 +4575,79 @@ def get_applicable_checklist_for_outlet(outlet_code):
         print(f"Failed to fetch applicable checklist for outlet {outlet_code}: {e}")
         return "Generic"
 
-def get_filtered_questions(outlet_code, slot):
-    try:
-        current_day = datetime.datetime.now(INDIA_TZ).strftime("%A")
-        outlets_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-        outlets_records = outlets_sheet.get_all_records()
-        applicable_checklist = None
-        for row in outlets_records:
-            if str(row.get("Outlet Code", "")).strip().lower() == outlet_code.lower():
-                applicable_checklist = str(row.get("Applicable Checklist", "")).strip()
-                break
-        if not applicable_checklist:
-            return []
+# === Checklist Question Matrix ===
+CHECKLIST_WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+CHECKLIST_QUESTION_COLUMNS = {"Time_Slot", "Days", "Question_Text", "Image Required"}
+
+class ChecklistQuestionMatrix:
+    """ChecklistQuestions compiled into {(Applicable Checklist, TIME_SLOT, weekday): [questions]}
+
+    Every column other than the fixed question columns is treated as a checklist type whose
+    "Yes" rows apply to it. The matrix is only recompiled when the cached records change.
+    """
 
-        sheet = client.open(SHEET_NAME).worksheet(TAB_CHECKLIST)
-        records = sheet.get_all_records()
-        filtered_questions = []
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = None  # The records list the matrix was compiled from
+        self._fingerprint = None
+        self._matrix = {}  # Format: {(checklist, slot, weekday): [{"question": str, "image_required": bool}]}
 
+    def _compile(self, records):
+        matrix = {}
         for row in records:
-            row_slot = str(row.get("Time_Slot", "")).strip()
-            outlet_value = str(row.get(applicable_checklist, "")).strip().lower()
+            question_text = str(row.get("Question_Text", "")).strip()
+            row_slot = str(row.get("Time_Slot", "")).strip().upper()
+            if not question_text or not row_slot:
+                continue
             days_value = str(row.get("Days", "")).strip()
-            
-            if row_slot.upper() == slot.strip().upper() and outlet_value == "yes":
-                if days_value and days_value.lower() != "all":
-                    applicable_days = [day.strip() for day in days_value.split(",")]
-                    if current_day not in applicable_days:
-                        continue
-                question_text = row.get("Question_Text", "").strip()
-                if not question_text:
+            if days_value and days_value.lower() != "all":
+                days = [day.strip() for day in days_value.split(",")]
+            else:
+                days = CHECKLIST_WEEKDAYS
+            question = {
+                "question": question_text,
+                "image_required": str(row.get("Image Required", "")).strip().lower() == "yes"
+            }
+            for column, value in row.items():
+                if column in CHECKLIST_QUESTION_COLUMNS or str(value).strip().lower() != "yes":
                     continue
-                filtered_questions.append({
-                    "question": question_text,
-                    "image_required": str(row.get("Image Required", "")).strip().lower() == "yes"
-                })
-        if not filtered_questions:
+                for day in days:
+                    matrix.setdefault((column, row_slot, day), []).append(question)
+        return matrix
+
+    def _ensure_current(self):
+        records = get_cached_records(TAB_CHECKLIST)
+        with self._lock:
+            if records is self._records:
+                return
+            fingerprint = hashlib.md5(json.dumps(records, sort_keys=True, default=str).encode()).hexdigest()
+            if fingerprint != self._fingerprint:
+                self._matrix = self._compile(records)
+                self._fingerprint = fingerprint
+                print(f"Checklist question matrix compiled: {len(self._matrix)} (checklist, slot, day) entries")
+            self._records = records
+
+    def questions(self, applicable_checklist, slot, weekday):
+        """Ready question list for a checklist type, slot and weekday name"""
+        self._ensure_current()
+        questions = self._matrix.get((applicable_checklist, slot.strip().upper(), weekday), [])
+        return [dict(q) for q in questions]
+
+checklist_question_matrix = ChecklistQuestionMatrix()
+
+def get_filtered_questions(outlet_code, slot):
+    try:
+        current_day = datetime.datetime.now(INDIA_TZ).strftime("%A")
+        outlet = outlet_registry.get(outlet_code)
+        applicable_checklist = outlet.applicable_checklist if outlet else None
+        if not applicable_checklist:
             return []
-        return filtered_questions
+
+        return checklist_question_matrix.questions(applicable_checklist, slot, current_day)
         
     except Exception as e:
-        time.sleep(1)
-        try:
-            current_day = datetime.datetime.now(INDIA_TZ).strftime("%A")
-            outlets_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-            outlets_records = outlets_sheet.get_all_records()
-            applicable_checklist = None
-            for row in outlets_records:
-                if str(row.get("Outlet Code", "")).strip().lower() == outlet_code.lower():
-                    applicable_checklist = str(row.get("Applicable Checklist", "")).strip()
-                    break
-            if not applicable_checklist:
-                return []
-            sheet = client.open(SHEET_NAME).worksheet(TAB_CHECKLIST)
-            records = sheet.get_all_records()
-            filtered_questions = []
-            for row in records:
-                row_slot = str(row.get("Time_Slot", "")).strip()
-                outlet_value = str(row.get(applicable_checklist, "")).strip().lower()
-                days_value = str(row.get("Days", "")).strip()
-                if row_slot.upper() == slot.strip().upper() and outlet_value == "yes":
-                    if days_value and days_value.lower() != "all":
-                        applicable_days = [day.strip() for day in days_value.split(",")]
-                        if current_day not in applicable_days:
-                            continue
-                    question_text = row.get("Question_Text", "").strip()
-                    if not question_text:
-                        continue
-                    filtered_questions.append({
-                        "question": question_text,
-                        "image_required": str(row.get("Image Required", "")).strip().lower() == "yes"
-                    })
-            return filtered_questions
-        except Exception:
-            return []
+        print(f"Failed to load checklist questions for {outlet_code} {slot}: {e}")
+        return []
 
 # === Bot Handlers ===
 def start(update: Update, context):
@@ -3158,9 +4735,7 @@ def aod019_checklist_option_handler(update: Update, context):
 
         try:
             # Get all available outlets
-            outlets_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-            outlets_records = outlets_sheet.get_all_records()
-            outlet_codes = [str(row.get("Outlet Code", "")).strip() for row in outlets_records if row.get("Outlet Code")]
+            outlet_codes = outlet_registry.codes()
 
             if not outlet_codes:
                 query.message.reply_text("❌ No outlets found in system.", reply_markup=ReplyKeyboardRemove())
@@ -3191,11 +4766,15 @@ def handle_phone(update: Update, context):
         update.message.reply_text("❌ Please send your phone number using the button.")
         return ASK_PHONE
     phone = normalize_number(update.message.contact.phone_number)
-    emp_id = get_phone_to_empid_map().get(phone)
+    row = employee_directory.by_phone(phone)
+    emp_id = str(row.get("Employee ID", "")).strip() if row else ""
     if not emp_id:
         update.message.reply_text("❌ Number not registered.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
-    outlet, signin, signout, row, sheet = get_outlet_row_by_emp_id(emp_id)
+    entry = get_roster_entry_by_emp_id(emp_id)
+    outlet = entry.outlet if entry else ""
+    signin = entry.signin if entry else ""
+    signout = entry.signout if entry else ""
     if not outlet:
         update.message.reply_text("❌ No outlet found for your ID or not scheduled today.", reply_markup=ReplyKeyboardRemove())
         return ConversationHandler.END
@@ -3210,7 +4789,13 @@ def handle_phone(update: Update, context):
         if signout:
             update.message.reply_text("✅ Already signed out today.", reply_markup=ReplyKeyboardRemove())
             return ConversationHandler.END
-    context.user_data.update({"emp_id": emp_id, "outlet_code": outlet, "sheet": sheet, "row": row})
+    # Everything handle_location needs is kept here so the location step is network-free
+    outlet_lat, outlet_lng = get_outlet_coordinates(outlet)
+    context.user_data.update({
+        "emp_id": emp_id, "outlet_code": outlet, "row": entry.row_number,
+        "start_time": entry.start_time, "signin_time": signin,
+        "outlet_lat": outlet_lat, "outlet_lng": outlet_lng
+    })
     loc_button = KeyboardButton("📍 Send Location", request_location=True)
     markup = ReplyKeyboardMarkup([[loc_button]], one_time_keyboard=True, resize_keyboard=True)
     update.message.reply_text(f"Your Outlet for today is: {outlet}. Please share your location:", reply_markup=markup)
@@ -3222,7 +4807,7 @@ def handle_location(update: Update, context):
         return ASK_LOCATION
 
     user_lat, user_lng = update.message.location.latitude, update.message.location.longitude
-    outlet_lat, outlet_lng = get_outlet_coordinates(context.user_data["outlet_code"])
+    outlet_lat, outlet_lng = context.user_data.get("outlet_lat"), context.user_data.get("outlet_lng")
 
     if not outlet_lat:
         update.message.reply_text("❌ No coordinates set for this outlet.", reply_markup=ReplyKeyboardRemove())
@@ -3238,20 +4823,12 @@ def handle_location(update: Update, context):
     column = "Sign-In Time" if action == "signin" else "Sign-Out Time"
 
     emp_id = context.user_data["emp_id"]
-    emp_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-    emp_records = emp_sheet.get_all_records()
-    emp_name = "Unknown"
-    for row in emp_records:
-        if str(row.get("Employee ID", "")).strip() == emp_id:
-            emp_name = row.get("Short Name", "Unknown")
-            break
+    emp_name = employee_directory.short_name(emp_id, "Unknown")
 
 
 
     if action == "signout":
-        sign_in_str = context.user_data["sheet"].cell(
-            context.user_data["row"], context.user_data["sheet"].row_values(1).index("Sign-In Time") + 1
-        ).value
+        sign_in_str = context.user_data.get("signin_time", "")
         try:
             sign_in_time = datetime.datetime.strptime(sign_in_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=ZoneInfo("Asia/Kolkata"))
         except:
@@ -3266,9 +4843,7 @@ def handle_location(update: Update, context):
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
 
         try:
-            start_time_str = context.user_data["sheet"].cell(
-                context.user_data["row"], context.user_data["sheet"].row_values(1).index("Start Time") + 1
-            ).value
+            start_time_str = context.user_data.get("start_time", "")
             if start_time_str and start_time_str != "N/A":
                 try:
                     today_str = now.strftime("%Y-%m-%d")
@@ -3297,7 +4872,7 @@ def handle_location(update: Update, context):
         except Exception as e:
             print(f"Error checking start time for late sign-in: {e}")
 
-    update_sheet(context.user_data["sheet"], context.user_data["row"], column, timestamp)
+    roster_index.write_cell(context.user_data["row"], column, timestamp)
 
     update.message.reply_text(
         f"✅ {action.replace('sign', 'Sign ').title()} successful.\n📍 Distance: {int(dist)} meters.",
@@ -3342,11 +4917,7 @@ def cl_admin_handle_outlet(update: Update, context):
 
     # Verify outlet exists
     try:
-        outlets_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_OUTLETS)
-        outlets_records = outlets_sheet.get_all_records()
-        valid_outlets = [str(row.get("Outlet Code", "")).strip() for row in outlets_records if row.get("Outlet Code")]
-
-        if selected_outlet not in valid_outlets:
+        if selected_outlet not in outlet_registry.codes():
             update.message.reply_text("❌ Invalid outlet selection. Please use /start to try again.", reply_markup=ReplyKeyboardRemove())
             return ConversationHandler.END
 
@@ -3494,24 +5065,24 @@ def cl_ask_next_question(update: Update, context):
         
         try:
             # ============================================
-            # STEP 1: Save to ChecklistResponses (individual Q&A)
+            # STEP 1: Rows for ChecklistResponses (individual Q&A)
             # ============================================
-            responses_sheet = client.open(SHEET_NAME).worksheet(TAB_RESPONSES)
+            # Links of uploads that already finished go in directly, the rest are back-filled
             for answer in context.user_data["answers"]:
-                responses_sheet.append_row([
-                    context.user_data["submission_id"],
-                    answer["question"],
-                    answer["answer"],
-                    answer.get("image_link", ""),
-                    answer.get("image_hash", "")
-                ])
-            print(f"✓ Saved {len(context.user_data['answers'])} responses to ChecklistResponses")
+                if answer.get("upload_job"):
+                    answer["image_link"] = upload_queue.link(answer["upload_job"])
+
+            response_rows = [[
+                context.user_data["submission_id"],
+                answer["question"],
+                answer["answer"],
+                answer.get("image_link", ""),
+                answer.get("image_hash", "")
+            ] for answer in context.user_data["answers"]]
             
             # ============================================
-            # STEP 2: Save to ChecklistSubmissions (ONE summary row)
+            # STEP 2: ONE summary row for ChecklistSubmissions, written together with the responses
             # ============================================
-            submissions_sheet = client.open(SHEET_NAME).worksheet(TAB_SUBMISSIONS)
-            
             # Collect all image hashes for this submission
             all_image_hashes = []
             for answer in context.user_data["answers"]:
@@ -3521,8 +5092,7 @@ def cl_ask_next_question(update: Update, context):
             # Create comma-separated string of image hashes
             image_hashes_str = ", ".join(all_image_hashes) if all_image_hashes else ""
             
-            # Write ONE summary row to ChecklistSubmissions
-            submissions_sheet.append_row([
+            summary_row = [
                 context.user_data["submission_id"],                # Column A: Submission ID
                 context.user_data["date"],                         # Column B: Date
                 context.user_data["slot"],                         # Column C: Time Slot
@@ -3530,8 +5100,23 @@ def cl_ask_next_question(update: Update, context):
                 context.user_data["emp_name"].replace("_", " "),   # Column E: Submitted By
                 context.user_data["timestamp"],                    # Column F: Timestamp
                 image_hashes_str                                   # Column G: Image Hash(es)
-            ])
-            print(f"✓ Saved submission summary to ChecklistSubmissions with ID: {context.user_data['submission_id']}")
+            ]
+
+            write_spool.enqueue("submission", TAB_RESPONSES, {
+                "submission_id": context.user_data["submission_id"],
+                "responses_tab": TAB_RESPONSES,
+                "response_rows": response_rows,
+                "submissions_tab": TAB_SUBMISSIONS,
+                "summary_row": summary_row,
+            })
+            for answer in context.user_data["answers"]:
+                if answer.get("upload_job") and not answer["image_link"]:
+                    upload_queue.backfill(answer["upload_job"], TAB_RESPONSES, context.user_data["submission_id"],
+                                          hash_column=5, link_column=4)
+                if answer.get("image_hash"):
+                    image_index.add("checklist", context.user_data["outlet"], context.user_data["date"], answer["image_hash"],
+                                    answer.get("image_dhash"), context.user_data["submission_id"])
+            print(f"✓ Queued {len(response_rows)} responses and submission summary with ID: {context.user_data['submission_id']}")
 
             # ============================================
             # STEP 3: Check for temperature errors and notify group
@@ -3646,10 +5231,6 @@ def cl_handle_image_upload(update: Update, context):
         update.message.reply_text("❌ Please upload a photo.")
         return CHECKLIST_ASK_IMAGE
     
-    progress_msg = None
-    local_path = None
-    gfile = None
-    
     try:
         photo = update.message.photo[-1]
         print(f"Photo file_id: {photo.file_id}, file_size: {photo.file_size}")
@@ -3658,19 +5239,6 @@ def cl_handle_image_upload(update: Update, context):
             update.message.reply_text("❌ Image too large (max 10MB allowed).")
             return CHECKLIST_ASK_IMAGE
         
-        file = None
-        for attempt in range(3):
-            try:
-                file = photo.get_file()
-                print(f"File path: {file.file_path}, file_size: {file.file_size}")
-                break
-            except Exception as e:
-                print(f"Error getting file info (attempt {attempt + 1}): {e}")
-                if attempt == 2:
-                    update.message.reply_text("❌ Error accessing image file. Please try uploading again.")
-                    return CHECKLIST_ASK_IMAGE
-                time.sleep(2)
-        
         emp_name = context.user_data.get("emp_name", "User")
         q_num = context.user_data["current_q"] + 1
         current_date = datetime.datetime.now(INDIA_TZ).strftime("%Y-%m-%d")
@@ -3678,170 +5246,35 @@ def cl_handle_image_upload(update: Update, context):
         
         safe_emp_name = sanitize_filename(emp_name)
         filename = f"checklist/{safe_emp_name}_Q{q_num}_{current_date}_{timestamp_suffix}.jpg"
-        local_filename = f"{safe_emp_name}_Q{q_num}_{current_date}_{timestamp_suffix}.jpg"
-        local_path = os.path.join("/tmp", local_filename)
-        
-        print(f"Downloading to: {local_path}")
         
-        os.makedirs("/tmp", exist_ok=True)
-        if os.path.exists(local_path):
-            os.remove(local_path)
-        
-        download_success = False
-        for attempt in range(3):
-            try:
-                print(f"Download attempt {attempt + 1}")
-                file.download(custom_path=local_path)
-                
-                if os.path.exists(local_path):
-                    file_size = os.path.getsize(local_path)
-                    if file_size > 0:
-                        print(f"Download successful on attempt {attempt + 1}. File size: {file_size} bytes")
-                        download_success = True
-                        break
-                    else:
-                        print(f"Download attempt {attempt + 1} failed: File is empty")
-                        if os.path.exists(local_path):
-                            os.remove(local_path)
-                else:
-                    print(f"Download attempt {attempt + 1} failed: File not created")
-                    
-                time.sleep(2 ** attempt)
-                
-            except Exception as e:
-                print(f"Download attempt {attempt + 1} failed with error: {e}")
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                time.sleep(2 ** attempt)
-        
-        if not download_success:
+        # Download into memory, hashing as it arrives
+        image_buffer, image_hash = download_photo(photo.file_id)
+        if image_buffer is None:
             update.message.reply_text("❌ Failed to download image after multiple attempts. Please try again.")
             return CHECKLIST_ASK_IMAGE
-        
-        try:
-            hash_md5 = hashlib.md5()
-            with open(local_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            image_hash = hash_md5.hexdigest()
-            print(f"Image hash computed: {image_hash}")
-        except Exception as e:
-            print(f"Error computing hash: {e}")
-            if os.path.exists(local_path):
-                os.remove(local_path)
-            update.message.reply_text("❌ Error processing image. Please try again.")
+        print(f"Image hash computed: {image_hash}")
+        
+        # Decode once: upright bounded JPEG for Drive, grayscale copy for OCR
+        prepared = prepare_image(image_buffer)
+
+        # Duplicate check against today's checklist photos for this outlet, including this checklist's own
+        image_dhash_hex = image_dhash(prepared.image)
+        pending = [(a["image_hash"], a.get("image_dhash"), context.user_data["submission_id"])
+                   for a in context.user_data["answers"][:-1] if a.get("image_hash")]
+        duplicate_of = image_index.find_duplicate("checklist", context.user_data["outlet"], context.user_data["date"],
+                                                  image_hash, image_dhash_hex, pending)
+        if duplicate_of:
+            print(f"Duplicate image detected (matches {duplicate_of})")
+            update.message.reply_text("❌ Duplicate image detected. Please retake the photo.")
             return CHECKLIST_ASK_IMAGE
         
-        # ============================================
-        # 🔥 REMOVED: Duplicate image check
-        # This was checking ChecklistSubmissions which creates circular logic
-        # If you need duplicate detection, implement it differently
-        # ============================================
-        
-        progress_msg = update.message.reply_text("⏳ Uploading image to Google Drive...")
-        
-        upload_success = False
-        image_url = None
-        
-        for attempt in range(3):
-            try:
-                print(f"Upload attempt {attempt + 1} to Google Drive")
-                if attempt > 0:
-                    global drive
-                    try:
-                        drive = setup_drive()
-                    except Exception as drive_error:
-                        print(f"Failed to recreate drive connection: {drive_error}")
-                        continue
-                
-                if not os.path.exists(local_path) or os.path.getsize(local_path) == 0:
-                    raise Exception("Local file is missing or empty")
-                
-                gfile = drive.CreateFile({
-                    'title': filename,
-                    'parents': [{'id': DRIVE_FOLDER_ID}],
-                    'supportsAllDrives': True
-                })
-                
-                gfile.SetContentFile(local_path)
-                gfile.Upload(param={'supportsAllDrives': True,
-                                   'supportsTeamDrives': True,
-                                    'enforceSingleParent': True })
-                print(f"Upload completed for attempt {attempt + 1}")
-                
-                if not gfile.get('id'):
-                    raise Exception("Upload completed but no file ID received")
-                
-                try:
-                    gfile.InsertPermission({
-                        'type': 'anyone',
-                        'value': 'anyone',
-                        'role': 'reader'
-                    })
-                    print("Permissions set successfully")
-                except Exception as perm_error:
-                    print(f"Permission setting failed: {perm_error}")
-                
-                file_id = gfile.get('id')
-                if not file_id:
-                    raise Exception("No file ID available")
-                
-                url_candidates = []
-                try:
-                    if gfile.get('alternateLink'):
-                        url_candidates.append(gfile['alternateLink'])
-                except:
-                    pass
-                try:
-                    if gfile.get('webViewLink'):
-                        url_candidates.append(gfile['webViewLink'])
-                except:
-                    pass
-                try:
-                    if gfile.get('webContentLink'):
-                        url_candidates.append(gfile['webContentLink'])
-                except:
-                    pass
-                
-                url_candidates.extend([
-                    f"https://drive.google.com/file/d/{file_id}/view",
-                    f"https://drive.google.com/open?id={file_id}"
-                ])
-                
-                for url in url_candidates:
-                    if url and url.startswith('http'):
-                        image_url = url
-                        break
-                
-                if image_url:
-                    print(f"Upload successful! URL: {image_url}")
-                    upload_success = True
-                    break
-                else:
-                    raise Exception("No valid URL could be generated")
-                    
-            except Exception as e:
-                print(f"Upload attempt {attempt + 1} failed: {e}")
-                if gfile and gfile.get('id'):
-                    try:
-                        gfile.Delete()
-                    except:
-                        pass
-                gfile = None
-                if attempt < 2:
-                    time.sleep(3 * (attempt + 1))
-        
-        if not upload_success or not image_url:
-            cleanup_file_safely(local_path)
-            try:
-                progress_msg.edit_text("❌ Failed to upload image to Google Drive after multiple attempts.")
-            except:
-                update.message.reply_text("❌ Failed to upload image to Google Drive after multiple attempts.")
-            return CHECKLIST_ASK_IMAGE
+        # Drive upload runs in the background; the link is back-filled into ChecklistResponses
+        upload_job = upload_queue.submit(prepared.jpeg, image_hash, photo.file_id, filename, drive_service.folder_id("checklist"))
         
-        # Store image link and hash in the current answer
-        context.user_data["answers"][-1]["image_link"] = image_url
+        # Store upload job and hashes in the current answer
+        context.user_data["answers"][-1]["upload_job"] = upload_job
         context.user_data["answers"][-1]["image_hash"] = image_hash
+        context.user_data["answers"][-1]["image_dhash"] = image_dhash_hex
 
         # ============================================
         # Temperature validation for chiller images
@@ -3850,12 +5283,8 @@ def cl_handle_image_upload(update: Update, context):
         if "chiller" in current_question:
             print("🌡️ Chiller question detected, performing temperature OCR validation")
             try:
-                # Read image bytes for OCR
-                with open(local_path, "rb") as img_file:
-                    image_bytes = img_file.read()
-
-                # Extract text using Google Vision API
-                ocr_text = extract_text_from_image(image_bytes)
+                # Extract text using Google Vision API from the grayscale copy
+                ocr_text = extract_text_from_image(prepared.ocr_bytes)
 
                 if ocr_text:
                     # Extract temperature from OCR text
@@ -3891,31 +5320,19 @@ def cl_handle_image_upload(update: Update, context):
         # Now we only write to ChecklistSubmissions when ALL questions are complete
         # ============================================
 
-        cleanup_file_safely(local_path)
-
-        # Update progress message based on temperature validation result
-        try:
-            if "chiller" in current_question and context.user_data["answers"][-1]["answer"] != "error":
-                # For chiller with valid temperature, the specific message was already sent
-                progress_msg.edit_text("✅ Image uploaded and validated successfully!")
-            elif "chiller" in current_question and context.user_data["answers"][-1]["answer"] == "error":
-                # For chiller with error, the error message was already sent
-                progress_msg.edit_text("✅ Image uploaded (temperature out of range)")
-            else:
-                # For non-chiller images
-                progress_msg.edit_text("✅ Image uploaded successfully!")
-        except:
-            # Fallback if progress_msg.edit_text fails
-            pass
+        # Acknowledge based on temperature validation result
+        if "chiller" in current_question and context.user_data["answers"][-1]["answer"] != "error":
+            # For chiller with valid temperature, the specific message was already sent
+            update.message.reply_text("✅ Image received and validated!")
+        elif "chiller" in current_question and context.user_data["answers"][-1]["answer"] == "error":
+            # For chiller with error, the error message was already sent
+            update.message.reply_text("✅ Image received (temperature out of range)")
+        else:
+            # For non-chiller images
+            update.message.reply_text("✅ Image received!")
         
     except Exception as e:
         print(f"Unexpected error in image upload: {e}")
-        cleanup_file_safely(local_path)
-        if gfile and gfile.get('id'):
-            try:
-                gfile.Delete()
-            except:
-                pass
         update.message.reply_text("❌ Unexpected error during image upload. Please contact admin if the issue persists.")
         return CHECKLIST_ASK_IMAGE
     
@@ -4056,16 +5473,14 @@ def ticket_handle_issue(update: Update, context):
     print("Handling ticket issue submission")
     issue_text = update.message.text or update.message.caption or ""
     photo = update.message.photo[-1] if update.message.photo else None
-    local_path = None
-    gfile = None
-    image_url = ""
+    upload_job = None
     image_hash = ""
+    image_dhash_hex = None
 
     if not issue_text and not photo:
         update.message.reply_text("❌ Please provide a description or upload a photo with a caption.")
         return TICKET_ASK_ISSUE
 
-    progress_msg = None
     if photo:
         try:
             print(f"Photo file_id: {photo.file_id}, file_size: {photo.file_size}")
@@ -4073,224 +5488,49 @@ def ticket_handle_issue(update: Update, context):
                 update.message.reply_text("❌ Image too large (max 10MB allowed).")
                 return TICKET_ASK_ISSUE
 
-            file = None
-            for attempt in range(3):
-                try:
-                    file = photo.get_file()
-                    print(f"File path: {file.file_path}, file_size: {file.file_size}")
-                    break
-                except Exception as e:
-                    print(f"Error getting file info (attempt {attempt + 1}): {e}")
-                    if attempt == 2:
-                        update.message.reply_text("❌ Error accessing image file. Please try uploading again.")
-                        return TICKET_ASK_ISSUE
-                    time.sleep(2)
-
             emp_name = context.user_data.get("emp_name", "User")
             current_date = context.user_data["date"]
             timestamp_suffix = int(time.time())
             safe_emp_name = sanitize_filename(emp_name)
             filename = f"tickets/{safe_emp_name}_Ticket_{context.user_data['ticket_id']}_{current_date}_{timestamp_suffix}.jpg"
-            local_filename = f"{safe_emp_name}_Ticket_{context.user_data['ticket_id']}_{current_date}_{timestamp_suffix}.jpg"
-            local_path = os.path.join("/tmp", local_filename)
-
-            print(f"Downloading to: {local_path}")
-            os.makedirs("/tmp", exist_ok=True)
-            if os.path.exists(local_path):
-                os.remove(local_path)
-
-            download_success = False
-            for attempt in range(3):
-                try:
-                    print(f"Download attempt {attempt + 1}")
-                    file.download(custom_path=local_path)
-                    if os.path.exists(local_path):
-                        file_size = os.path.getsize(local_path)
-                        if file_size > 0:
-                            print(f"Download successful on attempt {attempt + 1}. File size: {file_size} bytes")
-                            download_success = True
-                            break
-                        else:
-                            print(f"Download attempt {attempt + 1} failed: File is empty")
-                            if os.path.exists(local_path):
-                                os.remove(local_path)
-                    else:
-                        print(f"Download attempt {attempt + 1} failed: File not created")
-                    time.sleep(2 ** attempt)
-                except Exception as e:
-                    print(f"Download attempt {attempt + 1} failed with error: {e}")
-                    if os.path.exists(local_path):
-                        os.remove(local_path)
-                    time.sleep(2 ** attempt)
 
-            if not download_success:
+            # Download into memory, hashing as it arrives
+            image_buffer, image_hash = download_photo(photo.file_id)
+            if image_buffer is None:
                 update.message.reply_text("❌ Failed to download image after multiple attempts. Please try again.")
                 return TICKET_ASK_ISSUE
+            print(f"Image hash computed: {image_hash}")
 
-            try:
-                hash_md5 = hashlib.md5()
-                with open(local_path, "rb") as f:
-                    for chunk in iter(lambda: f.read(4096), b""):
-                        hash_md5.update(chunk)
-                image_hash = hash_md5.hexdigest()
-                print(f"Image hash computed: {image_hash}")
-            except Exception as e:
-                print(f"Error computing hash: {e}")
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-                update.message.reply_text("❌ Error processing image. Please try again.")
-                return TICKET_ASK_ISSUE
-
-            # Check for duplicates in Tickets sheet
-            try:
-                ticket_sheet = client.open_by_key(TICKET_SHEET_ID).worksheet(TAB_TICKETS)
-                records = ticket_sheet.get_all_records()
-                for record in records:
-                    if (
-                        str(record.get("Date", "")) == context.user_data["date"] and
-                        str(record.get("Outlet", "")) == context.user_data["outlet"] and
-                        str(record.get("Submitted By", "")) == context.user_data["emp_name"].replace("_", " ") and
-                        str(record.get("Image Hash", "")) == image_hash
-                    ):
-                        print("Duplicate image detected")
-                        if os.path.exists(local_path):
-                            os.remove(local_path)
-                        update.message.reply_text("❌ Duplicate image detected. Please retake the photo.")
-                        return TICKET_ASK_ISSUE
-            except Exception as e:
-                print(f"Error checking duplicates in Tickets sheet: {e}")
-
-            progress_msg = update.message.reply_text("⏳ Uploading image to Google Drive...")
-
-            upload_success = False
-            image_url = None
-
-            for attempt in range(3):
-                try:
-                    print(f"Upload attempt {attempt + 1} to Google Drive")
-                    if attempt > 0:
-                        global drive
-                        try:
-                            drive = setup_drive()
-                        except Exception as drive_error:
-                            print(f"Failed to recreate drive connection: {drive_error}")
-                            continue
-
-                    if not os.path.exists(local_path) or os.path.getsize(local_path) == 0:
-                        raise Exception("Local file is missing or empty")
-
-                    gfile = drive.CreateFile({
-                        'title': filename,
-                        'parents': [{'id': TICKET_DRIVE_FOLDER_ID}],
-                        'supportsAllDrives': True
-                    })
-
-                    gfile.SetContentFile(local_path)
-                    gfile.Upload(param={
-                        'supportsAllDrives': True,
-                        'supportsTeamDrives': True
-                    })
-                    print(f"Upload completed for attempt {attempt + 1}")
-
-                    if not gfile.get('id'):
-                        raise Exception("Upload completed but no file ID received")
-
-                    try:
-                        gfile.InsertPermission({
-                            'type': 'anyone',
-                            'value': 'anyone',
-                            'role': 'reader'
-                        })
-                        print("Permissions set successfully")
-                    except Exception as perm_error:
-                        print(f"Permission setting failed: {perm_error}")
-
-                    file_id = gfile.get('id')
-                    if not file_id:
-                        raise Exception("No file ID available")
-
-                    url_candidates = []
-                    try:
-                        if gfile.get('alternateLink'):
-                            url_candidates.append(gfile['alternateLink'])
-                    except:
-                        pass
-                    try:
-                        if gfile.get('webViewLink'):
-                            url_candidates.append(gfile['webViewLink'])
-                    except:
-                        pass
-                    try:
-                        if gfile.get('webContentLink'):
-                            url_candidates.append(gfile['webContentLink'])
-                    except:
-                        pass
-
-                    url_candidates.extend([
-                        f"https://drive.google.com/file/d/{file_id}/view",
-                        f"https://drive.google.com/open?id={file_id}"
-                    ])
-
-                    for url in url_candidates:
-                        if url and url.startswith('http'):
-                            image_url = url
-                            break
-
-                    if image_url:
-                        print(f"Upload successful! URL: {image_url}")
-                        upload_success = True
-                        break
-                    else:
-                        raise Exception("No valid URL could be generated")
-
-                except Exception as e:
-                    print(f"Upload attempt {attempt + 1} failed: {e}")
-                    if gfile and gfile.get('id'):
-                        try:
-                            gfile.Delete()
-                        except:
-                            pass
-                    gfile = None
-                    if attempt < 2:
-                        time.sleep(3 * (attempt + 1))
-
-            if not upload_success or not image_url:
-                cleanup_file_safely(local_path)
-                try:
-                    progress_msg.edit_text("❌ Failed to upload image to Google Drive after multiple attempts.")
-                except:
-                    update.message.reply_text("❌ Failed to upload image to Google Drive after multiple attempts.")
+            prepared = prepare_image(image_buffer)
+
+            # Duplicate check against this employee's tickets for the outlet today
+            image_dhash_hex = image_dhash(prepared.image)
+            submitted_by = context.user_data["emp_name"].replace("_", " ")
+            duplicate_of = image_index.find_duplicate("ticket", context.user_data["outlet"], context.user_data["date"],
+                                                      image_hash, image_dhash_hex, submitted_by=submitted_by)
+            if not duplicate_of and not image_index.covers(context.user_data["date"]):
+                duplicate_of = find_ticket_with_image(context.user_data["date"], context.user_data["outlet"],
+                                                      submitted_by, image_hash)
+            if duplicate_of:
+                print(f"Duplicate image detected (matches {duplicate_of})")
+                update.message.reply_text("❌ Duplicate image detected. Please retake the photo.")
                 return TICKET_ASK_ISSUE
 
-            cleanup_file_safely(local_path)
-
-            try:
-                progress_msg.edit_text("✅ Image uploaded successfully!")
-            except:
-                update.message.reply_text("✅ Image uploaded successfully!")
+            # Drive upload runs in the background; the link is back-filled into Tickets
+            upload_job = upload_queue.submit(prepared.jpeg, image_hash, photo.file_id, filename, drive_service.folder_id("tickets"))
 
         except Exception as e:
             print(f"Unexpected error in ticket image upload: {e}")
-            cleanup_file_safely(local_path)
-            if gfile and gfile.get('id'):
-                try:
-                    gfile.Delete()
-                except:
-                    pass
             update.message.reply_text("❌ Unexpected error during image upload. Please contact admin if the issue persists.")
             return TICKET_ASK_ISSUE
 
     # Save ticket to Tickets tab with detailed categorization and assignment
     try:
-        ticket_sheet = client.open_by_key(TICKET_SHEET_ID).worksheet(TAB_TICKETS)
-        headers = ticket_sheet.row_values(1)
-        if not headers:
-            headers = [
-                "Ticket ID", "Date", "Outlet", "Submitted By", "Issue Description", 
-                "Image Link", "Image Hash", "Status", "Assigned To", "Action Taken", 
-                "Category"
-            ]
-            ticket_sheet.update('A1:L1', [headers])
+        headers = [
+            "Ticket ID", "Date", "Outlet", "Submitted By", "Issue Description", 
+            "Image Link", "Image Hash", "Status", "Assigned To", "Action Taken", 
+            "Category"
+        ]
         
         # Determine final ticket display information
         ticket_category = context.user_data.get("ticket_category", "")
@@ -4312,7 +5552,7 @@ def ticket_handle_issue(update: Update, context):
             context.user_data["outlet"],
             context.user_data["emp_name"].replace("_", " "),
             issue_text,
-            image_url,
+            upload_queue.link(upload_job) if upload_job else "",
             image_hash,
             "Open",
             assigned_to,  # Auto-assigned based on category
@@ -4320,18 +5560,16 @@ def ticket_handle_issue(update: Update, context):
             category_for_sheet,  # Category (subcategory if present, else main category)
         ]
         
-        for attempt in range(3):
-            try:
-                ticket_sheet.append_row(row_data)
-                print(f"Successfully saved ticket {context.user_data['ticket_id']} to Tickets tab")
-                break
-            except Exception as e:
-                print(f"Error saving to Tickets tab (attempt {attempt + 1}): {e}")
-                if attempt < 2:
-                    time.sleep(2)
-                else:
-                    update.message.reply_text("❌ Error saving ticket. Please contact admin.")
-                    return ConversationHandler.END
+        # The write spool retries until the Sheets API accepts the row
+        queue_append_row(TAB_TICKETS, row_data, TICKET_SHEET_ID, headers=headers, header_mode="missing")
+        if upload_job and not row_data[5]:
+            upload_queue.backfill(upload_job, TAB_TICKETS, context.user_data["ticket_id"],
+                                  hash_column=7, link_column=6, spreadsheet_key=TICKET_SHEET_ID)
+        if image_hash:
+            image_index.add("ticket", context.user_data["outlet"], context.user_data["date"], image_hash,
+                            image_dhash_hex, context.user_data["ticket_id"],
+                            submitted_by=context.user_data["emp_name"].replace("_", " "))
+        print(f"Queued ticket {context.user_data['ticket_id']} for Tickets tab")
     except Exception as e:
         print(f"Failed to save ticket: {e}")
         update.message.reply_text("❌ Error saving ticket. Please contact admin.")
@@ -4368,17 +5606,14 @@ def allowance_handle_contact(update: Update, context):
     
     # Get employee ID
     emp_id = ""
+    short_name = emp_name
     try:
-        emp_sheet = client.open(SHEET_NAME).worksheet(TAB_NAME_EMP_REGISTER)
-        emp_records = emp_sheet.get_all_records()
-        for row in emp_records:
-            row_phone = normalize_number(str(row.get("Phone Number", "")))
-            if row_phone == phone:
-                emp_id = str(row.get("Employee ID", ""))
-                short_name = str(row.get("Short Name", ""))
-                break
+        row = employee_directory.by_phone(phone)
+        if row:
+            emp_id = str(row.get("Employee ID", ""))
+            short_name = str(row.get("Short Name", ""))
     except:
-        short_name = emp_name
+        pass
     
     context.user_data.update({
         "emp_name": emp_name,
@@ -4454,8 +5689,12 @@ def allowance_handle_image(update: Update, context):
             update.message.reply_text("❌ Image too large (max 10MB allowed).")
             return ALLOWANCE_ASK_IMAGE
 
-        file = photo.get_file()
-        image_bytes = file.download_as_bytearray()
+        image_buffer, _ = download_photo(photo.file_id)
+        if image_buffer is None:
+            processing_msg.edit_text("❌ Failed to download image. Please try again.")
+            return ALLOWANCE_ASK_IMAGE
+        # Decoded once; Gemini, Vision and the regex fallback all read from this
+        prepared = prepare_image(image_buffer)
         
         trip_type = context.user_data["trip_type"]
         
@@ -4463,8 +5702,11 @@ def allowance_handle_image(update: Update, context):
         if trip_type == "Blinkit":
             processing_msg.edit_text("⏳ Processing image with AI...")
             
+            # Vision and Gemini run together; the OCR text is only kept as a backup
+            extraction = ReceiptExtraction(prepared, [order_details_prompt(trip_type)])
+
             # Use AI extraction WITHOUT validation for Blinkit
-            result = extract_order_details_with_ai(bytes(image_bytes), trip_type, skip_validation=True)
+            result = extract_order_details_with_ai(extraction, trip_type, skip_validation=True)
             
             if not result or "total_amount" not in result:
                 processing_msg.edit_text(
@@ -4484,7 +5726,7 @@ def allowance_handle_image(update: Update, context):
             # No validation warnings for Blinkit - trust AI completely
             extracted_text_backup = ""
             try:
-                extracted_text_backup = extract_text_from_image(bytes(image_bytes))
+                extracted_text_backup = extraction.ocr_text()
             except:
                 pass
             
@@ -4533,8 +5775,11 @@ def allowance_handle_image(update: Update, context):
             # Travel allowance (Going/Coming) - Use AI WITH validation
             processing_msg.edit_text("⏳ Extracting amount from image...")
             
+            # OCR and the receipt prompt (amount, route and date in one call) start at once
+            extraction = ReceiptExtraction(prepared, [order_details_prompt("Travel")])
+
             # Try AI extraction first (with validation)
-            result = extract_order_details_with_ai(bytes(image_bytes), "Travel", skip_validation=False)
+            result = extract_order_details_with_ai(extraction, "Travel", skip_validation=False)
             
             amount = None
             amount_corrected = False
@@ -4551,7 +5796,7 @@ def allowance_handle_image(update: Update, context):
             else:
                 # Fallback to regex method
                 print("⚠️ AI extraction failed, falling back to regex method")
-                extracted_text = extract_text_from_image(bytes(image_bytes))
+                extracted_text = extraction.ocr_text()
                 
                 if not extracted_text:
                     processing_msg.edit_text(
@@ -4577,14 +5822,13 @@ def allowance_handle_image(update: Update, context):
                 )
                 return ALLOWANCE_ASK_IMAGE
             
-            # Extract locations and date using AI
-            processing_msg.edit_text("⏳ Extracting travel details...")
-            travel_details = extract_travel_locations_with_ai(bytes(image_bytes))
+            # Locations and date came back in the same Gemini reply as the amount
+            travel_details = None
+            if result and result.get("start_location") and result.get("end_location"):
+                travel_details = result
 
             # Get extracted date if available
-            extracted_date = None
-            if travel_details and "date" in travel_details:
-                extracted_date = travel_details["date"]
+            extracted_date = result.get("date") if result else None
 
             # Save to Travel Allowance sheet
             success = save_travel_allowance(
@@ -4612,7 +5856,7 @@ def allowance_handle_image(update: Update, context):
                 # Add travel details if extracted
                 if travel_details:
                     confirmation.append(f"\n📍 Travel Details:")
-                    if "date" in travel_details:
+                    if travel_details.get("date"):
                         confirmation.append(f"   Date: {travel_details['date']}")
                     confirmation.append(f"   From: {travel_details['start_location']}")
                     confirmation.append(f"   To: {travel_details['end_location']}")
@@ -4641,42 +5885,17 @@ def allowance_handle_image(update: Update, context):
         update.message.reply_text("❌ Error processing image. Please try again or contact admin.")
         return ConversationHandler.END
     
-def cleanup_file_safely(file_path):
-    """Safely delete a file with multiple attempts and proper error handling"""
-    if not file_path or not os.path.exists(file_path):
-        return
-    
-    for attempt in range(5):
-        try:
-            if attempt > 0:
-                time.sleep(0.5 * attempt)
-            
-            import gc
-            gc.collect()
-            
-            os.remove(file_path)
-            print(f"Successfully cleaned up file: {file_path}")
-            return
-            
-        except PermissionError as e:
-            print(f"File cleanup attempt {attempt + 1} failed (permission): {e}")
-            if attempt == 4:
-                print(f"Warning: Could not clean up file {file_path}. It will be cleaned up later.")
-        except Exception as e:
-            print(f"File cleanup attempt {attempt + 1} failed: {e}")
-            if attempt == 4:
-                print(f"Warning: Could not clean up file {file_path}. It will be cleaned up later.")
-
 def test_drive_connection():
     try:
+        drive = drive_service.get()
         file_list = drive.ListFile({
-            'q': f"'{DRIVE_FOLDER_ID}' in parents",
+            'q': f"'{drive_service.folder_id('checklist')}' in parents",
             'supportsAllDrives': True,
             'includeItemsFromAllDrives': True
         }).GetList()
         print(f"Drive connection successful. Found {len(file_list)} files in checklist folder.")
         file_list = drive.ListFile({
-            'q': f"'{TICKET_DRIVE_FOLDER_ID}' in parents",
+            'q': f"'{drive_service.folder_id('tickets')}' in parents",
             'supportsAllDrives': True,
             'includeItemsFromAllDrives': True
         }).GetList()
@@ -4695,10 +5914,69 @@ def reset(update: Update, context):
     return ConversationHandler.END
 
 # === Dispatcher & Webhook ===
+class UpdateLanes:
+    """Feeds updates to the dispatcher on worker lanes sharded by chat ID
+
+    Every update from a chat goes to the same lane, and a lane handles one update at a
+    time, so each conversation advances strictly in order while different employees are
+    served in parallel. Each lane has its own bounded queue, so one busy chat cannot
+    fill the space other chats need.
+    """
+
+    def __init__(self, dispatcher, lanes=UPDATE_LANES, queue_size=WEBHOOK_QUEUE_SIZE):
+        self.dispatcher = dispatcher
+        lane_size = max(1, -(-queue_size // lanes))
+        self._queues = [queue.Queue(maxsize=lane_size) for _ in range(lanes)]
+
+    def _lane_for(self, update):
+        if update.effective_chat:
+            key = update.effective_chat.id
+        elif update.effective_user:
+            key = update.effective_user.id
+        else:
+            key = update.update_id
+        return self._queues[key % len(self._queues)]
+
+    def submit(self, update):
+        """Queue an update on its chat's lane; returns False if that lane is full"""
+        try:
+            self._lane_for(update).put_nowait(update)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self, lane_queue):
+        while True:
+            update = lane_queue.get()
+            try:
+                self.dispatcher.process_update(update)
+            except Exception as e:
+                print(f"Error processing update {update.update_id}: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def start(self):
+        for index, lane_queue in enumerate(self._queues):
+            threading.Thread(target=self._run, args=(lane_queue,), name=f"update-lane-{index}", daemon=True).start()
+        print(f"Started {len(self._queues)} update lanes")
+
+    def pending(self):
+        return sum(lane_queue.qsize() for lane_queue in self._queues)
+
+update_lanes = UpdateLanes(dispatcher)
+
 @app.route(WEBHOOK_PATH, methods=["POST"])
 def webhook():
+    """Queue the update on its chat's lane and answer Telegram straight away
+
+    A full lane returns 503 and Telegram redelivers the update later.
+    """
     try:
-        update = Update.de_json(request.get_json(force=True), bot)
+        payload = request.get_json(force=True, silent=True)
+        if not isinstance(payload, dict) or "update_id" not in payload:
+            print("Rejected webhook call without a Telegram update")
+            return "Bad Request", 400
+        update = Update.de_json(payload, bot)
         # Log only essential info to avoid memory issues with large binary data
         update_type = "unknown"
         if update.message:
@@ -4710,7 +5988,9 @@ def webhook():
         elif update.callback_query:
             update_type = "callback_query"
         print(f"Received update type: {update_type}, update_id: {update.update_id}")
-        dispatcher.process_update(update)
+        if not update_lanes.submit(update):
+            print(f"Update lane full, asking Telegram to retry update {update.update_id}")
+            return "Busy", 503
         return "OK"
     except Exception as e:
         print(f"Error processing webhook: {e}")
@@ -4720,13 +6000,30 @@ def webhook():
 
 @app.route("/", methods=["GET"])
 def health_check():
+    """Liveness: the process is up and accepting requests"""
     return "AOD Bot is running with checklist reminders!"
 
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness: Sheets is authorized and the webhook is set"""
+    ready = startup_tasks.ready()
+    return {"ready": ready, "tasks": startup_tasks.status()}, 200 if ready else 503
+
+@app.route("/writequeue", methods=["GET"])
+def write_queue_status():
+    """Pending and set-aside Sheets writes, how far behind the writer is, background Drive uploads and queued updates"""
+    stats = write_spool.stats()
+    stats["uploads"] = upload_queue.stats()
+    stats["pending_updates"] = update_lanes.pending()
+    return stats
+
 def setup_dispatcher():
     """Setup conversation handler"""
     
     # Main conversation handler (Sign In/Out, Checklist, Ticket, Allowance, Power, Kitchen)
     dispatcher.add_handler(ConversationHandler(
+        name="main",
+        persistent=True,
         entry_points=[CommandHandler("start", start)],
         states={
             ASK_ACTION: [CallbackQueryHandler(action_selected)],
@@ -4771,35 +6068,94 @@ def setup_dispatcher():
     dispatcher.add_handler(CommandHandler("statusyesterday", statusyesterday))
     dispatcher.add_handler(CommandHandler("getroster", getroster))
 
-    # Set bot commands menu
-    try:
-        bot.set_my_commands([
-            ("start", "Start the bot and access main menu"),
-            ("reset", "Reset the current conversation"),
-            ("statustoday", "Show today's sign-in status report"),
-            ("statusyesterday", "Show yesterday's full attendance report"),
-            ("getroster", "Show today's roster for all outlets")
-        ])
-        print("Bot commands set successfully.")
-    except Exception as e:
-        print(f"Failed to set bot commands: {e}")
+def set_bot_commands():
+    """Set bot commands menu"""
+    bot.set_my_commands([
+        ("start", "Start the bot and access main menu"),
+        ("reset", "Reset the current conversation"),
+        ("statustoday", "Show today's sign-in status report"),
+        ("statusyesterday", "Show yesterday's full attendance report"),
+        ("getroster", "Show today's roster for all outlets")
+    ])
+    print("Bot commands set successfully.")
 
 def set_webhook():
-    try:
-        response = requests.get(f"https://api.telegram.org/bot{BOT_TOKEN}/getMe")
-        response_data = response.json()
-        print(f"getMe response: {response_data}")
-        if isinstance(response_data, dict) and response_data.get("ok"):
-            bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}")
-            print(f"Webhook set at {WEBHOOK_URL}{WEBHOOK_PATH}")
-        else:
-            print(f"Invalid BOT_TOKEN or API error: {response_data}")
-    except Exception as e:
-        print(f"Error setting webhook: {e}")
+    response = requests.get(f"https://api.telegram.org/bot{BOT_TOKEN}/getMe", timeout=10)
+    response_data = response.json()
+    print(f"getMe response: {response_data}")
+    if not (isinstance(response_data, dict) and response_data.get("ok")):
+        raise Exception(f"Invalid BOT_TOKEN or API error: {response_data}")
+    bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}")
+    print(f"Webhook set at {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+# === Startup ===
+STARTUP_TASK_ATTEMPTS = 3
+WARM_MEDIA_CLIENTS = os.getenv("WARM_MEDIA_CLIENTS", "0") == "1"  # Build Drive, Vision and Gemini at boot instead of on first photo
+
+class StartupTasks:
+    """Network setup run in background threads, so gunicorn can serve as soon as the module loads
+
+    Every task runs in its own thread, all at once, and a failed task is retried with a
+    short backoff. "/" answers 200 as long as the process is up; "/ready" answers 200
+    only once every required task has succeeded. Optional tasks just warm clients that
+    are built lazily on first use anyway. Drive, Vision and Gemini are only warmed when
+    WARM_MEDIA_CLIENTS=1, since building them loads pydrive2, gRPC and the Gemini SDK.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = {}  # Format: {name: {"state": "pending" | "ok" | "failed", "required": bool, "seconds": float, "error": str}}
+
+    def run(self, name, func, required=True):
+        with self._lock:
+            self._tasks[name] = {"state": "pending", "required": required}
+        threading.Thread(target=self._run, args=(name, func), name=f"startup-{name}", daemon=True).start()
+
+    def _run(self, name, func):
+        started = time.monotonic()
+        for attempt in range(STARTUP_TASK_ATTEMPTS):
+            try:
+                func()
+                state, error = "ok", None
+                break
+            except Exception as e:
+                state, error = "failed", str(e)
+                print(f"Startup task {name} attempt {attempt + 1} failed: {e}")
+                if attempt < STARTUP_TASK_ATTEMPTS - 1:
+                    time.sleep(5 * (attempt + 1))
+        seconds = round(time.monotonic() - started, 2)
+        with self._lock:
+            self._tasks[name].update(state=state, seconds=seconds, error=error)
+        print(f"Startup task {name}: {state} in {seconds}s")
+
+    def ready(self):
+        with self._lock:
+            return all(task["state"] == "ok" for task in self._tasks.values() if task["required"])
+
+    def status(self):
+        with self._lock:
+            return {name: dict(task) for name, task in self._tasks.items()}
+
+startup_tasks = StartupTasks()
 
 # === Main Entry Point ===
+if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    print("Warning: WEB_CONCURRENCY > 1. The bot must run as a single worker, or Sheets writes, uploads and reminders are repeated by every worker")
+index_refresh_thread = threading.Thread(target=index_refresh_worker, daemon=True)
+index_refresh_thread.start()
+write_spool_thread = threading.Thread(target=write_spool.run, daemon=True)
+write_spool_thread.start()
+threading.Thread(target=reminder_scheduler.run, daemon=True).start()
+upload_queue.resume()
 setup_dispatcher()
-set_webhook()
+update_lanes.start()
+startup_tasks.run("sheets", get_sheets_client)
+startup_tasks.run("webhook", set_webhook)
+startup_tasks.run("commands", set_bot_commands, required=False)
+if WARM_MEDIA_CLIENTS:
+    startup_tasks.run("drive", lambda: (drive_service.folder_id("tickets"), drive_service.folder_id("checklist")), required=False)
+    startup_tasks.run("vision", vision_client_provider.warm, required=False)
+    startup_tasks.run("gemini", gemini_model_provider.warm, required=False)
 print("Bot started with sign-in and checklist reminder systems active!")
 print("Checklist reminders will be sent to the following groups:")
 for outlet_name, chat_id in CHECKLIST_REMINDER_GROUPS.items():
@@ -0,0 +1,22 @@
+"""
+Google Vision and Gemini clients for aod-bot.py
+
+Imported on first use through get_vision_client() and get_gemini_model(), so gRPC and
+the Gemini SDK are only loaded by processes that read receipts or photos.
+"""
+import google.generativeai as genai
+from google.cloud import vision
+from google.oauth2 import service_account
+
+def build_vision_client(creds_file):
+    vision_creds = service_account.Credentials.from_service_account_file(creds_file)
+    return vision.ImageAnnotatorClient(credentials=vision_creds)
+
+def build_gemini_model(api_key, model_name):
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+def text_annotations(client, image_bytes):
+    """Vision text detection; the first annotation holds the full text"""
+    image = vision.Image(content=image_bytes)
+    return client.text_detection(image=image).text_annotations
@@ -0,0 +1,147 @@
+"""
+Google Drive client for aod-bot.py
+
+Imported on first use through drive_service, so pydrive2 and oauth2client are only
+loaded by processes that actually upload photos.
+"""
+import datetime
+import threading
+
+import httplib2
+from oauth2client.client import AccessTokenRefreshError
+from pydrive2.auth import AuthError, GoogleAuth
+from pydrive2.drive import GoogleDrive
+from pydrive2.files import ApiRequestError
+
+DRIVE_TOKEN_REFRESH_MARGIN_SECONDS = 300  # Refresh the access token this long before it expires
+
+class DriveService:
+    """One authenticated pydrive2 client shared by handlers and upload workers
+
+    pydrive2 keeps one authorized httplib2 connection per thread, so each worker reuses
+    its own connection. Everything that touches the shared GoogleAuth happens under a
+    lock: the access token is refreshed ahead of expiry, so concurrent calls never race
+    to re-authenticate, and the client is rebuilt from the key file only after an auth
+    error. Folder IDs are resolved and checked once per process.
+    """
+
+    def __init__(self, creds_file, checklist_folder_id, tickets_parent_id, tickets_folder_title):
+        self.creds_file = creds_file
+        self.checklist_folder_id = checklist_folder_id
+        self.tickets_parent_id = tickets_parent_id
+        self.tickets_folder_title = tickets_folder_title
+        self._drive = None
+        self._lock = threading.Lock()
+        self._folders = {}  # Format: {"checklist" | "tickets": folder_id}
+        self._folders_lock = threading.Lock()
+        self._public_folders = {}  # Format: {folder_id: True if anyone with the link can read it}
+
+    def _build(self):
+        gauth = GoogleAuth(settings={
+            "client_config_backend": "service",
+            "service_config": {
+                "client_json_file_path": self.creds_file,
+            }
+        })
+        gauth.ServiceAuth()
+        self._drive = GoogleDrive(gauth)
+
+    def get(self):
+        """Return the shared GoogleDrive, building it or refreshing its token as needed"""
+        with self._lock:
+            if self._drive is None:
+                self._build()
+                return self._drive
+            credentials = self._drive.auth.credentials
+            expiry = getattr(credentials, "token_expiry", None)
+            if expiry is None or expiry - datetime.datetime.utcnow() < datetime.timedelta(seconds=DRIVE_TOKEN_REFRESH_MARGIN_SECONDS):
+                try:
+                    credentials.refresh(httplib2.Http())
+                except Exception as e:
+                    print(f"Drive token refresh failed, rebuilding client: {e}")
+                    self._build()
+            return self._drive
+
+    def reset(self):
+        """Drop the client so the next get() re-authenticates from the key file"""
+        with self._lock:
+            self._drive = None
+
+    def note_error(self, error):
+        """Recover from a failed Drive call; returns True if a retry may now succeed"""
+        status = error.error.get("code") if isinstance(error, ApiRequestError) else None
+        if isinstance(error, (AuthError, AccessTokenRefreshError)) or status == 401:
+            print(f"Drive auth error, client will be rebuilt: {error}")
+            self.reset()
+            return True
+        return False
+
+    def folder_id(self, name):
+        """ID of the "checklist" or "tickets" upload folder, resolved once per process"""
+        with self._folders_lock:
+            if name not in self._folders:
+                self._folders[name] = self._resolve_folder(name)
+            return self._folders[name]
+
+    def folder_is_public(self, folder_id):
+        """Whether files in the folder inherit anyone-with-the-link access; checked once per folder"""
+        with self._folders_lock:
+            if folder_id in self._public_folders:
+                return self._public_folders[folder_id]
+            try:
+                permissions = self.get().CreateFile({'id': folder_id}).GetPermissions() or []
+            except Exception as e:
+                print(f"Could not read sharing of folder {folder_id}, files will be shared one by one: {e}")
+                return False
+            public = any(p.get("type") == "anyone" and p.get("role") in ("reader", "commenter", "writer") for p in permissions)
+            if not public:
+                print(f"Folder {folder_id} is not shared with anyone with the link; each upload will set its own permission")
+            self._public_folders[folder_id] = public
+            return public
+
+    def share_with_anyone(self, gfile):
+        """Give anyone with the link read access to an uploaded file in a single API call
+
+        GoogleDriveFile.InsertPermission() re-lists the file's permissions afterwards, so
+        the insert goes straight to the API on the connection the upload just used.
+        """
+        self.get().auth.service.permissions().insert(
+            fileId=gfile['id'],
+            body={'type': 'anyone', 'value': 'anyone', 'role': 'reader'},
+            supportsAllDrives=True
+        ).execute(http=gfile.http)
+
+    def _resolve_folder(self, name):
+        drive = self.get()
+        if name == "checklist":
+            try:
+                drive.ListFile({
+                    'q': f"'{self.checklist_folder_id}' in parents",
+                    'supportsAllDrives': True,
+                    'includeItemsFromAllDrives': True,
+                    'maxResults': 1
+                }).GetList()
+                print(f"Checklist folder {self.checklist_folder_id} is accessible")
+            except Exception as e:
+                print(f"Warning: Checklist folder {self.checklist_folder_id} not accessible: {e}")
+            return self.checklist_folder_id
+
+        # Check or create tickets folder in Shared Drive
+        folder_query = f"'{self.tickets_parent_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        folder_list = drive.ListFile({
+            'q': folder_query,
+            'supportsAllDrives': True,
+            'includeItemsFromAllDrives': True
+        }).GetList()
+        if folder_list:
+            print(f"Found existing tickets folder with ID: {self.tickets_parent_id}")
+            return self.tickets_parent_id
+        folder = drive.CreateFile({
+            'title': self.tickets_folder_title,
+            'mimeType': 'application/vnd.google-apps.folder',
+            'parents': [{'id': self.tickets_parent_id}],
+            'supportsAllDrives': True
+        })
+        folder.Upload(param={'supportsAllDrives': True})
+        print(f"Created tickets folder with ID: {folder['id']}")
+        return folder['id']
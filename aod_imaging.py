@@ -0,0 +1,63 @@
+"""
+Photo decoding for aod-bot.py
+
+Imported on first use by prepare_image() and image_dhash(), so Pillow is only loaded
+by processes that handle photos.
+"""
+import collections
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+IMAGE_MAX_DIMENSION = 1600  # Longest side of the JPEG that is archived, OCR'd and sent to Gemini
+IMAGE_JPEG_QUALITY = 85
+PreparedImage = collections.namedtuple("PreparedImage", "image jpeg ocr_bytes")
+
+def prepare_image(buffer):
+    """Decode a downloaded photo once into what every consumer needs
+
+    Returns PreparedImage(image, jpeg, ocr_bytes): the upright RGB image bounded to
+    IMAGE_MAX_DIMENSION (for Gemini and the dHash), a JPEG BytesIO of it for Drive, and a
+    grayscale JPEG for Vision OCR. A photo Pillow cannot decode is passed through as-is
+    with image=None.
+    """
+    try:
+        buffer.seek(0)
+        with Image.open(buffer) as original:
+            source_format = original.format
+            orientation = original.getexif().get(0x0112, 1)
+            image = ImageOps.exif_transpose(original).convert("RGB")
+    except Exception as e:
+        print(f"Could not decode image, using it unprocessed: {e}")
+        buffer.seek(0)
+        return PreparedImage(None, buffer, buffer.getvalue())
+
+    resized = max(image.size) > IMAGE_MAX_DIMENSION
+    if resized:
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    if source_format == "JPEG" and orientation == 1 and not resized:
+        # Already an upright JPEG within bounds; re-encoding would only lose quality
+        jpeg = buffer
+    else:
+        jpeg = BytesIO()
+        image.save(jpeg, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        print(f"Image prepared: {buffer.getbuffer().nbytes} -> {jpeg.getbuffer().nbytes} bytes, {image.size[0]}x{image.size[1]}")
+    jpeg.seek(0)
+
+    ocr = BytesIO()
+    image.convert("L").save(ocr, "JPEG", quality=IMAGE_JPEG_QUALITY)
+    return PreparedImage(image, jpeg, ocr.getvalue())
+
+def image_dhash(image):
+    """64-bit difference hash of a PIL image as 16 hex digits, or None without an image
+
+    The hash survives re-encoding and resizing.
+    """
+    if image is None:
+        return None
+    pixels = image.convert("L").resize((9, 8), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
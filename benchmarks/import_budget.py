@@ -0,0 +1,148 @@
+"""
+Import-time budget for aod-bot.py
+
+Runs the bot's top-level imports under `python -X importtime` in a fresh interpreter and
+reports what they cost, then does the same for each lazily imported integration module
+(aod_ai, aod_imaging, aod_drive) on top of them. It then loads the whole bot with a
+placeholder token and throwaway databases, lets the startup tasks run, and lists the
+modules the process holds afterwards. Exits with status 1 if the top-level imports go
+over the budget, or if either the imports or startup pull in one of the heavy SDKs that
+should only load on first use.
+
+Usage:
+    python benchmarks/import_budget.py [--budget-ms 1500] [--top 15] [--startup-seconds 10]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_FILE = os.path.join(REPO_DIR, "aod-bot.py")
+LAZY_MODULES = ["aod_ai", "aod_imaging", "aod_drive"]
+# Packages that must not be loaded by a plain sign-in or /getroster process
+DEFERRED_PACKAGES = ["google.cloud.vision", "google.generativeai", "grpc", "PIL", "pydrive2", "oauth2client"]
+
+def top_level_imports(path):
+    """Source of every import statement at module level in path, in file order"""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return [ast.get_source_segment(source, node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+def run_importtime(setup, code):
+    """Run setup then code under -X importtime; returns [(module, self_us, cumulative_us, depth)] for code only"""
+    marker = "__import_budget_marker__"
+    program = "\n".join(setup + [f"import sys; sys.stderr.write('{marker}\\n')"] + code)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", program],
+        cwd=REPO_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    _, _, measured = result.stderr.partition(marker + "\n")
+    entries = []
+    for line in measured.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def total_ms(entries):
+    """Cumulative time of the outermost imports, i.e. the whole cost of the measured code"""
+    return sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+
+def deferred_hits(entries):
+    return sorted({name for name, _, _, _ in entries
+                   for package in DEFERRED_PACKAGES if name == package or name.startswith(package + ".")})
+
+def startup_hits(wait_seconds):
+    """Deferred packages loaded by a full bot process once its startup tasks have had wait_seconds to run
+
+    The placeholder token makes every Telegram call fail, so nothing is sent, and the
+    databases live in a temporary directory.
+    """
+    program = (
+        "import importlib.util, json, os, sys, time\n"
+        f"spec = importlib.util.spec_from_file_location('aod_bot', {BOT_FILE!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        f"time.sleep({wait_seconds!r})\n"
+        "sys.stdout.write('__modules__' + json.dumps(sorted(sys.modules)) + '\\n')\n"
+        "sys.stdout.flush()\n"
+        "os._exit(0)\n"
+    )
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ)
+        env.pop("WARM_MEDIA_CLIENTS", None)
+        env.update({
+            "BOT_TOKEN": "123456:import-budget-placeholder",
+            "CONVERSATION_DB_PATH": os.path.join(data_dir, "conversations.db"),
+            "WRITE_SPOOL_PATH": os.path.join(data_dir, "write_spool.db"),
+        })
+        result = subprocess.run(
+            [sys.executable, "-c", program], cwd=REPO_DIR, env=env,
+            capture_output=True, text=True, timeout=wait_seconds + 120
+        )
+    for line in result.stdout.splitlines():
+        if line.startswith("__modules__"):
+            return deferred_hits([(name, 0, 0, 0) for name in json.loads(line[len("__modules__"):])])
+    raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "bot did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")),
+                        help="maximum cumulative time for aod-bot.py's top-level imports")
+    parser.add_argument("--top", type=int, default=15, help="how many of the slowest imports to list")
+    parser.add_argument("--startup-seconds", type=float, default=10,
+                        help="how long to let the startup tasks run before checking loaded modules")
+    args = parser.parse_args()
+
+    imports = top_level_imports(BOT_FILE)
+    try:
+        eager = run_importtime([], imports)
+    except RuntimeError as e:
+        print(f"Could not import aod-bot.py's dependencies: {e}")
+        return 2
+
+    eager_ms = total_ms(eager)
+    print(f"aod-bot.py top-level imports: {eager_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    outermost = sorted((entry for entry in eager if entry[3] == 0), key=lambda entry: -entry[2])
+    for name, _, cumulative, _ in outermost[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print("Deferred until first use:")
+    for module in LAZY_MODULES:
+        try:
+            print(f"  {total_ms(run_importtime(imports, [f'import {module}'])):8.1f} ms  {module}")
+        except RuntimeError as e:
+            print(f"       n/a  {module} ({e})")
+
+    failed = False
+    hits = deferred_hits(eager)
+    if hits:
+        print(f"FAIL: loaded at import time but should be deferred: {', '.join(hits)}")
+        failed = True
+    try:
+        late_hits = startup_hits(args.startup_seconds)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"Could not start the bot to check startup imports: {e}")
+        return 2
+    print(f"After {args.startup_seconds:.0f}s of startup: {', '.join(late_hits) if late_hits else 'no deferred packages loaded'}")
+    if late_hits:
+        print(f"FAIL: loaded by startup tasks but should be deferred: {', '.join(late_hits)}")
+        failed = True
+    if eager_ms > args.budget_ms:
+        print(f"FAIL: top-level imports take {eager_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
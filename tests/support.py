@@ -0,0 +1,30 @@
+"""Load pieces of aod-bot.py for tests without importing Telegram, Sheets or the Google SDKs
+
+aod-bot.py starts its threads and contacts Telegram and Sheets at import time, so tests
+execute only the top-level definitions they name, in a namespace holding the fakes and
+settings those definitions look up as globals.
+"""
+import ast
+import os
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aod-bot.py")
+
+def load(names, **namespace):
+    """Run the named functions, classes and assignments of aod-bot.py in namespace and return it"""
+    with open(BOT_FILE, encoding="utf-8") as f:
+        source = f.read()
+    found = set()
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            name = node.name
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+        else:
+            continue
+        if name in names:
+            exec(compile(ast.Module(body=[node], type_ignores=[]), BOT_FILE, "exec"), namespace)
+            found.add(name)
+    missing = set(names) - found
+    if missing:
+        raise LookupError(f"Not defined in aod-bot.py: {', '.join(sorted(missing))}")
+    return namespace
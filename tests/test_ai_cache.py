@@ -0,0 +1,76 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from support import load
+
+class FakeGeminiModel:
+    """Answers generate_content() with the queued replies, one per call"""
+
+    model_name = "fake-gemini"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        return type("Response", (), {"text": self.replies.pop(0)})()
+
+class FakePrepared:
+    def __init__(self, data=b"receipt"):
+        self.jpeg = io.BytesIO(data)
+        self.ocr_bytes = data
+        self.image = object()
+
+class ReceiptCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_dir.cleanup)
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+        self.model = None
+        self.bot = load(
+            ["AI_CACHE_MAX_ENTRIES", "AiResultCache", "gemini_prompt_key", "RECEIPT_EXTRACTION_DEADLINE_SECONDS",
+             "ReceiptExtraction", "BLINKIT_ORDER_PROMPT", "TRAVEL_RECEIPT_PROMPT", "order_details_prompt",
+             "extract_order_details_with_ai"],
+            hashlib=hashlib, json=json, sqlite3=sqlite3, threading=threading, time=time,
+            ai_executor=self.executor, get_gemini_model=lambda: self.model,
+            extract_text_from_image=lambda image_bytes: "",
+        )
+        self.bot["ai_cache"] = self.bot["AiResultCache"](os.path.join(self.data_dir.name, "ai.db"))
+
+    def extract(self):
+        bot = self.bot
+        extraction = bot["ReceiptExtraction"](FakePrepared(), [bot["order_details_prompt"]("Travel")])
+        return bot["extract_order_details_with_ai"](extraction, "Travel", skip_validation=True)
+
+    def test_error_reply_is_not_served_again(self):
+        self.model = FakeGeminiModel('{"error": "Could not extract amount"}', '{"total_amount": 94}')
+        self.assertIsNone(self.extract())
+        result = self.extract()
+        self.assertEqual(result["total_amount"], 94)
+        self.assertEqual(self.model.calls, 2)
+
+    def test_unparseable_reply_is_not_served_again(self):
+        self.model = FakeGeminiModel("Sorry, I can't read this", '{"total_amount": null}', '{"total_amount": 120}')
+        self.assertIsNone(self.extract())
+        self.assertIsNone(self.extract())
+        self.assertEqual(self.extract()["total_amount"], 120)
+        self.assertEqual(self.model.calls, 3)
+
+    def test_usable_reply_is_served_from_cache(self):
+        self.model = FakeGeminiModel('{"total_amount": 94}')
+        self.assertEqual(self.extract()["total_amount"], 94)
+        self.assertEqual(self.extract()["total_amount"], 94)
+        self.assertEqual(self.model.calls, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import re
+import unittest
+
+from support import load
+
+class FakeSheet:
+    """Just enough of a gspread Worksheet for apply_travel_allowance()"""
+
+    def __init__(self, rows):
+        self.rows = [list(row) for row in rows]
+
+    def get_all_values(self):
+        return copy.deepcopy(self.rows)
+
+    def append_row(self, values):
+        self.rows.append(list(values))
+
+    def batch_update(self, data):
+        for update in data:
+            col, row = re.fullmatch(r"([A-Z])(\d+)", update["range"]).groups()
+            cells = self.rows[int(row) - 1]
+            col = ord(col) - ord("A")
+            cells.extend([""] * (col + 1 - len(cells)))
+            cells[col] = update["values"][0][0]
+
+class TravelAllowanceReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = load(
+            ["TRAVEL_ALLOWANCE_HEADERS", "apply_travel_allowance"],
+            sheet_append_row=lambda sheet, values: sheet.append_row(values),
+            sheet_batch_update=lambda sheet, data: sheet.batch_update(data),
+        )
+        self.sheet = FakeSheet([self.bot["TRAVEL_ALLOWANCE_HEADERS"]])
+
+    def apply(self, trip_type, amount, timestamp):
+        self.bot["apply_travel_allowance"](self.sheet, "E1", "AOD001", trip_type, amount, "2026-10-17", timestamp)
+
+    def test_replayed_update_leaves_sheet_unchanged(self):
+        self.apply("Going", 80, "090000")
+        self.apply("Coming", 95, "190000")
+        written = copy.deepcopy(self.sheet.rows)
+        self.assertEqual(written[1][4:6], [80, 95])
+        # The first attempt landed but its response was lost, so the writer runs the op again
+        self.apply("Coming", 95, "190000")
+        self.assertEqual(self.sheet.rows, written)
+
+    def test_replayed_append_leaves_sheet_unchanged(self):
+        self.apply("Going", 80, "090000")
+        written = copy.deepcopy(self.sheet.rows)
+        self.apply("Going", 80, "090000")
+        self.assertEqual(self.sheet.rows, written)
+
+    def test_second_trip_still_gets_its_own_row(self):
+        self.apply("Going", 80, "090000")
+        self.apply("Going", 60, "130000")
+        self.assertEqual([row[4] for row in self.sheet.rows[1:]], [80, 60])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+from support import load
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"APIError {status_code}")
+        self.response = types.SimpleNamespace(status_code=status_code)
+
+class WorksheetNotFound(Exception):
+    pass
+
+class FakeSheet:
+    def __init__(self, title, fail_with=None):
+        self.title = title
+        self.fail_with = fail_with
+        self.updates = []
+
+    def batch_update(self, data, **kwargs):
+        if self.fail_with:
+            raise self.fail_with
+        self.updates.extend(data)
+
+class WriteSpoolFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.data_dir.cleanup)
+        self.sheets = {"Good": FakeSheet("Good"), "Other": FakeSheet("Other")}
+        self.sent = []
+        self.bot = load(
+            ["is_permanent_write_error", "WRITE_SPOOL_SCAN_LIMIT", "WRITE_SPOOL_MAX_APPEND_ROWS",
+             "WRITE_SPOOL_COALESCED_KINDS", "WRITE_SPOOL_MAX_ATTEMPTS", "WRITE_SPOOL_BARRIER_SECONDS",
+             "WriteSpool"],
+            json=json, sqlite3=sqlite3, threading=threading, time=time,
+            gspread=types.SimpleNamespace(exceptions=types.SimpleNamespace(APIError=APIError, WorksheetNotFound=WorksheetNotFound)),
+            sheets_client_provider=types.SimpleNamespace(note_error=lambda error, sheet=None: False),
+            get_worksheet=lambda tab, key=None: self.sheets[tab],
+            sheet_batch_update=lambda sheet, data, **kwargs: sheet.batch_update(data, **kwargs),
+            bot=types.SimpleNamespace(send_message=lambda chat_id, text: self.sent.append((chat_id, text))),
+            MANAGER_CHAT_ID=1,
+            WRITE_SPOOL_MAX_BACKOFF_SECONDS=0,
+        )
+        self.spool = self.bot["WriteSpool"](os.path.join(self.data_dir.name, "spool.db"))
+
+    def update(self, tab, value):
+        self.spool.enqueue("batch_update", tab, {"data": [{"range": "A1", "values": [[value]]}]})
+
+    def drain(self):
+        while self.spool.write_next():
+            pass
+
+    def test_bad_op_is_set_aside_and_later_ops_still_written(self):
+        self.spool.enqueue("no_such_kind", "Good", {})
+        self.update("Good", "after")
+        self.update("Other", "elsewhere")
+        self.drain()
+        self.assertEqual(self.sheets["Good"].updates, [{"range": "A1", "values": [["after"]]}])
+        self.assertEqual(len(self.sheets["Other"].updates), 1)
+        stats = self.spool.stats()
+        self.assertEqual((stats["depth"], stats["failed"]), (0, 1))
+        self.assertEqual(len(self.sent), 1)
+
+    def test_rejected_payload_is_set_aside_after_one_attempt(self):
+        self.sheets["Good"].fail_with = APIError(400)
+        self.update("Good", "rejected")
+        self.drain()
+        self.assertEqual(self.spool.stats()["failed"], 1)
+
+    def test_rate_limited_op_is_set_aside_only_after_max_attempts(self):
+        self.sheets["Good"].fail_with = APIError(429)
+        self.update("Good", "busy")
+        attempts = 0
+        while self.spool.write_next():
+            attempts += 1
+        self.assertEqual(attempts, self.bot["WRITE_SPOOL_MAX_ATTEMPTS"])
+        stats = self.spool.stats()
+        self.assertEqual((stats["depth"], stats["failed"]), (0, 1))
+
+if __name__ == "__main__":
+    unittest.main()